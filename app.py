@@ -6,14 +6,21 @@ import json
 import time 
 from datetime import datetime
 from dateutil import parser
-from banco import carregar_dados, salvar_dados
+from banco import carregar_dados, carregar_varios, carregar_agregado, salvar_dados, salvar_alteracoes, iniciar_execucao, leituras_duplicadas, somente_leitura
 from banco import _ensure_cols
+import metricas
+import perfil
+import calculos
 
 # ========================================
 # CONFIGURAÇÃO INICIAL
 # ========================================
 st.set_page_config(page_title="TimTim Festas", layout="wide")
 
+# Usuários que veem o painel admin (métricas/perfilador), separados por
+# vírgula; vazio = painel desligado. O ?admin=1 só abre o painel para eles.
+USUARIOS_ADMIN = {u.strip() for u in os.getenv("APP_ADMINS", "").split(",") if u.strip()}
+
 # Cores da marca
 PRIMARY_COLOR = "#7A5FFF"   # Roxo suave
 SECONDARY_COLOR = "#FFF4B5" # Amarelo claro
@@ -96,82 +103,7 @@ def login():
 # ========================================
 
 
-def obter_coordenadas(cep):
-    """Converte CEP brasileiro em coordenadas (lon, lat)."""
-    url = f"https://nominatim.openstreetmap.org/search?postalcode={cep}&country=Brazil&format=json"
-    try:
-        r = requests.get(url, headers={"User-Agent": "TimTimFestas"}).json()
-        if r:
-            return float(r[0]["lon"]), float(r[0]["lat"])
-    except Exception:
-        pass
-    return None, None
-
-
-import requests
-from math import radians, sin, cos, sqrt, atan2
-
-
-import requests
-from math import radians, sin, cos, sqrt, atan2
-
-def calcular_distancia_km(cep_origem, cep_destino):
-    """
-    Calcula distância aproximada entre dois CEPs (funciona 100% mesmo sem APIs com chave).
-    Baseado em coordenadas aproximadas das cidades via ViaCEP + IBGE (Nominatim).
-    Retorna distância em km (float) ou None se não conseguir.
-    """
-
-    def get_lat_lon_via_cep(cep):
-        try:
-            cep = cep.replace("-", "").strip()
-            # ViaCEP com timeout de 2s
-            r = requests.get(f"https://viacep.com.br/ws/{cep}/json/", timeout=2)
-            if r.status_code != 200 or "erro" in r.json():
-                return None
-
-            d = r.json()
-            localidade = d.get("localidade", "")
-            uf = d.get("uf", "")
-
-            # Busca coordenadas da cidade via Nominatim (OpenStreetMap)
-            url = f"https://nominatim.openstreetmap.org/search?city={localidade}&state={uf}&country=Brazil&format=json"
-            resp = requests.get(
-                url,
-                headers={"User-Agent": "TimTimFestas"},
-                timeout=2
-            ).json()
-
-            if len(resp) > 0:
-                return float(resp[0]["lat"]), float(resp[0]["lon"])
-        except requests.Timeout:
-            print(f"⚠️ Timeout ao buscar coordenadas do CEP {cep}")
-        except Exception as e:
-            print(f"Erro ao obter coordenadas do CEP {cep}:", e)
-        return None
-
-    try:
-        coord1 = get_lat_lon_via_cep(cep_origem)
-        coord2 = get_lat_lon_via_cep(cep_destino)
-        if not coord1 or not coord2:
-            return None
-
-        # Cálculo de distância haversine
-        lat1, lon1 = radians(coord1[0]), radians(coord1[1])
-        lat2, lon2 = radians(coord2[0]), radians(coord2[1])
-        dlon = lon2 - lon1
-        dlat = lat2 - lat1
-
-        a = sin(dlat/2)**2 + cos(lat1)*cos(lat2)*sin(dlon/2)**2
-        c = 2 * atan2(sqrt(a), sqrt(1 - a))
-        R = 6371.0
-        distancia = R * c
-
-        return round(distancia, 1)
-
-    except Exception as e:
-        print("Erro no cálculo de distância:", e)
-        return None
+import geocodificacao
 
 
 
@@ -191,83 +123,36 @@ def pagina_relatorios():
     # =========================
     # 📦 Carregamento de dados
     # =========================
-    reservas = carregar_dados("reservas", ["id",
-        "cliente", "brinquedos", "data",
-        "horario_entrega", "horario_retirada",
-        "valor_total", "valor_extra", "frete", "desconto",
-        "sinal", "falta", "observacao", "status", "pagamentos"
-    ])
-    custos = carregar_dados("custos", ["data", "descricao", "valor"])
-    brinquedos_df = carregar_dados("brinquedos", ["nome", "valor", "categoria"])
-
-    # =========================
-    # 🧩 Tratamento de datas
-    # =========================
-    def parse_data_segura(v):
-        try:
-            if pd.isna(v) or str(v).strip() == "":
-                return pd.NaT
-            s = str(v).split(" ")[0]
-            for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y"):
-                try:
-                    return pd.to_datetime(datetime.strptime(s, fmt)).normalize()
-                except:
-                    continue
-            return pd.to_datetime(s, dayfirst=True, errors="coerce").normalize()
-        except:
-            return pd.NaT
-
-    for df in [reservas, custos]:
-        if "data" in df.columns:
-            df["data"] = df["data"].apply(parse_data_segura)
-
-    reservas = reservas.dropna(subset=["data"])
-    custos = custos.dropna(subset=["data"])
-
-    # =========================
-    # 🔢 Conversões numéricas
-    # =========================
-    for col in ["valor_total", "valor_extra", "frete", "desconto", "sinal"]:
-        if col not in reservas.columns:
-            reservas[col] = 0.0
-        reservas[col] = pd.to_numeric(reservas[col], errors="coerce").fillna(0.0)
-
-    custos["valor"] = pd.to_numeric(custos.get("valor", 0), errors="coerce").fillna(0.0)
-
-    # =========================
-    # 📅 Agregações mensais
-    # =========================
-    for df_tmp in [reservas, custos]:
-        if "data" in df_tmp.columns:
-            df_tmp["data"] = pd.to_datetime(df_tmp["data"], errors="coerce")
-
-    reservas = reservas.dropna(subset=["data"])
-    custos = custos.dropna(subset=["data"])
+    # Indicadores já agrupados no banco (sql/indicadores.sql): o custo não
+    # cresce com o histórico. Sem as funções, agrega a partir das linhas.
+    mensal = carregar_agregado("indicadores_mensais")
+    ranking = carregar_agregado("desempenho_brinquedos")
+
+    perfil.etapa("transformacao")
+    if mensal is None or ranking is None:
+        dados = carregar_varios({
+            "reservas": ["id",
+                "cliente", "brinquedos", "data",
+                "horario_entrega", "horario_retirada",
+                "valor_total", "valor_extra", "frete", "desconto",
+                "sinal", "falta", "observacao", "status", "pagamentos"
+            ],
+            "custos": ["data", "descricao", "valor"],
+        })
+        mensal_app, ranking_app = calculos.agregar_no_app(dados["reservas"], dados["custos"])
+        mensal = mensal_app if mensal is None else mensal
+        ranking = ranking_app if ranking is None else ranking
+    mensal, ranking = calculos.padronizar_agregados(mensal, ranking)
+    df_fin_mensal = mensal[["anomes", "bruto", "custo", "liquido"]].copy()
 
-    if reservas.empty and custos.empty:
+    if mensal.empty:
         st.warning("Ainda não há dados suficientes para montar os indicadores.")
         return
 
-    reservas["anomes"] = reservas["data"].dt.to_period("M").astype(str)
-    custos["anomes"] = custos["data"].dt.to_period("M").astype(str)
-
-    reservas["bruto"] = reservas["valor_total"].clip(lower=0)
-    bruto_mensal = reservas.groupby("anomes", as_index=False)["bruto"].sum()
-    custo_mensal = (
-        custos.groupby("anomes", as_index=False)["valor"]
-        .sum()
-        .rename(columns={"valor": "custo"})
-    )
-    reservas["qtd_reservas"] = 1
-    reservas_mensal = reservas.groupby("anomes", as_index=False)["qtd_reservas"].sum()
-
-    df_fin_mensal = pd.merge(bruto_mensal, custo_mensal, on="anomes", how="outer").fillna(0)
-    df_fin_mensal["liquido"] = (df_fin_mensal["bruto"] - df_fin_mensal["custo"]).clip(lower=0)
-    df_fin_mensal = df_fin_mensal.sort_values("anomes")
-
     # =========================
     # ✅ NOVO: FILTRO (NÃO INTERFERE NO RESTO)
     # =========================
+    perfil.etapa("widgets")
     st.subheader("📅 Filtro dos Cards")
 
     tipo_periodo = st.radio(
@@ -278,39 +163,29 @@ def pagina_relatorios():
 
     mes_sel = None
     if tipo_periodo == "Selecionar mês":
-        meses_disp = sorted(reservas["anomes"].unique())
+        meses_disp = sorted(mensal.loc[mensal["qtd_reservas"] > 0, "anomes"].unique())
         mes_sel = st.selectbox("Selecione o mês:", meses_disp)
 
-    reservas_filtrado = reservas.copy()
-    custos_filtrado = custos.copy()
+    mensal_filtrado = mensal
 
     hoje = pd.Timestamp.now()
 
     if tipo_periodo == "Mês atual":
-        reservas_filtrado = reservas[
-            (reservas["data"].dt.month == hoje.month) &
-            (reservas["data"].dt.year == hoje.year)
-        ]
-        custos_filtrado = custos[
-            (custos["data"].dt.month == hoje.month) &
-            (custos["data"].dt.year == hoje.year)
-        ]
+        mensal_filtrado = mensal[mensal["anomes"] == hoje.strftime("%Y-%m")]
 
     elif tipo_periodo == "Selecionar mês" and mes_sel:
-        reservas_filtrado = reservas[reservas["anomes"] == mes_sel]
-        custos_filtrado = custos[custos["anomes"] == mes_sel]
+        mensal_filtrado = mensal[mensal["anomes"] == mes_sel]
 
     elif tipo_periodo == "Ano atual":
-        reservas_filtrado = reservas[reservas["data"].dt.year == hoje.year]
-        custos_filtrado = custos[custos["data"].dt.year == hoje.year]
+        mensal_filtrado = mensal[mensal["anomes"].str[:4] == str(hoje.year)]
 
     # =========================
     # 💳 Totais (cards) → ALTERADO (USA FILTRO)
     # =========================
-    total_realizado = reservas_filtrado["sinal"].sum()
-    custo_total = custos_filtrado["valor"].sum()
+    total_realizado = mensal_filtrado["sinal"].sum()
+    custo_total = mensal_filtrado["custo"].sum()
     liquido_total = max(total_realizado - custo_total, 0)
-    total_reservas = len(reservas_filtrado)
+    total_reservas = int(mensal_filtrado["qtd_reservas"].sum())
 
     # ROI médio (AJUSTADO)
     if total_realizado > 0:
@@ -359,6 +234,7 @@ def pagina_relatorios():
             base = pd.date_range(start="2024-01-01", end="2026-12-01", freq="MS")
             df_meta = pd.DataFrame({"anomes": base.strftime("%Y-%m"), "meta": [3000.0 for _ in base]})
             salvar_dados(df_meta, "metas")
+        df_meta_orig = df_meta.copy()  # snapshot: salvar só as metas alteradas
 
         # Editor de metas
         with st.expander("🎯 Editar metas mensais até dez/2026"):
@@ -383,11 +259,12 @@ def pagina_relatorios():
                 df_meta.at[i, "meta"] = nova_meta
 
             if st.button("💾 Salvar metas"):
-                salvar_dados(df_meta, "metas")
+                salvar_alteracoes(df_meta, "metas", df_meta_orig)
                 st.success("✅ Metas atualizadas!")
                 st.rerun()
 
         # ===== Preparar gráfico principal =====
+        perfil.etapa("transformacao")
         df_fin_mensal["anomes"] = (
             pd.to_datetime(df_fin_mensal["anomes"], errors="coerce").dt.strftime("%Y-%m")
         )
@@ -400,6 +277,7 @@ def pagina_relatorios():
         df_plot["data_plot"] = pd.to_datetime(df_plot["anomes"], format="%Y-%m", errors="coerce")
         df_plot = df_plot.sort_values("data_plot")
 
+        perfil.etapa("graficos")
         if not df_plot.empty:
             fig, ax = plt.subplots(figsize=(9, 4))
             ax.plot(df_plot["data_plot"], df_plot["liquido"], label="Lucro Líquido", marker="o")
@@ -434,51 +312,18 @@ def pagina_relatorios():
                 st.info("Ainda não há dados suficientes para calcular ROI.")
 
     # ===== ABA 2 =====
+    perfil.etapa("widgets")
     with aba2:
         st.subheader("🎠 Desempenho de Brinquedos")
 
-        if reservas.empty:
+        if ranking.empty:
             st.info("Sem reservas registradas.")
             return
 
-        # ===== Explode brinquedos item a item
-        linhas = []
-        for _, r in reservas.iterrows():
-            itens = [b.strip() for b in str(r["brinquedos"]).split(",") if b.strip()]
-            if not itens:
-                continue
-            bruto_res = (r["valor_total"] + r["valor_extra"] + r["frete"] - r["desconto"])
-            bruto_res = max(bruto_res, 0.0)
-            valor_item = bruto_res / len(itens)
-            for b in itens:
-                linhas.append({"Brinquedo": b, "Data": r["data"], "Valor_Item": valor_item})
-
-        itens_df = pd.DataFrame(linhas)
-        if itens_df.empty:
-            st.warning("Sem dados de brinquedos.")
-            return
-
-        # Corrigir categorias
-        if not brinquedos_df.empty and "nome" in brinquedos_df.columns:
-            brinquedos_df["categoria"] = brinquedos_df.get("categoria", "Tradicional").fillna("Tradicional")
-            itens_df = itens_df.merge(
-                brinquedos_df[["nome", "categoria"]],
-                left_on="Brinquedo", right_on="nome", how="left"
-            )
-            itens_df.drop(columns=["nome"], inplace=True, errors="ignore")
-        else:
-            itens_df["categoria"] = "Tradicional"
-
-        # Corrigir valores nulos
-        itens_df["Valor_Item"] = pd.to_numeric(itens_df["Valor_Item"], errors="coerce").fillna(0.0)
-
-        # ===== Rankings
-        rank_valor = (
-            itens_df.groupby("Brinquedo", as_index=False)
-                    .agg(Valor_Total=("Valor_Item", "sum"), Locações=("Valor_Item", "count"))
-                    .sort_values(["Valor_Total", "Locações"], ascending=[False, False])
-        )
+        # ===== Rankings (valor rateado entre os brinquedos de cada reserva)
+        rank_valor = ranking
 
+        perfil.etapa("graficos")
         st.markdown("### 💰 Top 15 Brinquedos por Valor")
         fig2, ax2 = plt.subplots(figsize=(9, 4))
         ax2.barh(rank_valor["Brinquedo"].head(15), rank_valor["Valor_Total"].head(15), color="#7A5FFF")
@@ -744,7 +589,7 @@ def pagina_clientes():
     import pandas as pd
     from datetime import date
     import streamlit as st
-    from banco import carregar_dados, inserir_um, atualizar_um, deletar_por_filtro
+    from banco import carregar_dados, inserir_um, atualizar_um, deletar_por_filtro, coluna_existe
 
     st.header("👨‍👩‍👧 Cadastro de Clientes")
 
@@ -759,13 +604,19 @@ def pagina_clientes():
 
     # Carrega também o id_cliente (para editar/excluir sem duplicar)
     try:
-        df = carregar_dados("clientes", colunas + ["id_cliente"]).fillna("")
+        df = carregar_dados("clientes", colunas + ["id_cliente", "cep_geocodificado"]).fillna("")
     except Exception as e:
         st.error(f"❌ Erro ao carregar clientes: {e}")
         df = pd.DataFrame(columns=colunas + ["id_cliente"])
 
     if "id_cliente" not in df.columns:
         df["id_cliente"] = ""  # fallback
+    # distância/frete gravados no cadastro só depois de sql/clientes_geocodificacao.sql
+    # (o df sempre tem a coluna: o carregar_dados cria as pedidas que faltam)
+    try:
+        geo_ok = coluna_existe("clientes", "cep_geocodificado")
+    except Exception:
+        geo_ok = False
 
     # --------------------------------------
     # Estado (edição)
@@ -866,18 +717,15 @@ def pagina_clientes():
         if len(cep_query) == 8:
             with st.spinner("🔎 Buscando CEP..."):
                 try:
-                    r = requests.get(f"https://viacep.com.br/ws/{cep_query}/json/", timeout=10)
-                    if r.status_code == 200:
-                        dados = r.json()
-                        if "erro" not in dados:
-                            st.session_state["logradouro"] = dados.get("logradouro", "")
-                            st.session_state["bairro"] = dados.get("bairro", "")
-                            st.session_state["cidade"] = dados.get("localidade", "")
-                            st.success("✅ Endereço preenchido automaticamente!")
-                        else:
-                            st.warning("⚠️ CEP não encontrado.")
+                    # só o endereço; as coordenadas ficam para o cálculo do frete
+                    dados = geocodificacao.consultar(cep_query, coordenadas=False)
+                    if dados is not None:
+                        st.session_state["logradouro"] = dados.get("logradouro", "")
+                        st.session_state["bairro"] = dados.get("bairro", "")
+                        st.session_state["cidade"] = dados.get("cidade", "")
+                        st.success("✅ Endereço preenchido automaticamente!")
                     else:
-                        st.error("Erro ao consultar o CEP.")
+                        st.warning("⚠️ CEP não encontrado.")
                 except Exception as e:
                     st.error(f"Erro ao conectar ao ViaCEP: {e}")
             st.rerun()
@@ -908,6 +756,11 @@ def pagina_clientes():
                 "cep": cep.strip(),
                 "observacao": observacao.strip(),
             }
+            # CEP novo/alterado: distância do depósito e fretes já no cadastro
+            # (se a rede não responder a tempo, fica para a pré-geocodificação)
+            if geo_ok and geocodificacao.normalizar_cep(cep) != (cliente_edicao.get("cep_geocodificado") or None):
+                with st.spinner("📍 Calculando distância do depósito..."):
+                    registro.update(geocodificacao.campos_cliente(cep))
 
             id_cli = st.session_state.get("editando_cliente_id")
             try:
@@ -1019,34 +872,6 @@ from banco import (
 )
 
 
-def _to_date_safe(x):
-    """Converte entrada em data (Timestamp normalizado) ou NaT."""
-    try:
-        if pd.isna(x) or str(x).strip() == "":
-            return pd.NaT
-        if isinstance(x, (pd.Timestamp, datetime, date)):
-            return pd.to_datetime(x).normalize()
-        s = str(x).strip().split(" ")[0]
-        for fmt in ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%d/%m/%y"):
-            try:
-                return pd.to_datetime(datetime.strptime(s, fmt)).normalize()
-            except ValueError:
-                continue
-        return pd.to_datetime(s, dayfirst=True, errors="coerce").normalize()
-    except Exception:
-        return pd.NaT
-
-
-def _norm(txt: str) -> str:
-    """Normaliza nome para comparar disponibilidade (sem acento/pontuação)."""
-    if not isinstance(txt, str):
-        return ""
-    txt = txt.lower().strip()
-    txt = unicodedata.normalize("NFKD", txt).encode("ascii", "ignore").decode("utf-8")
-    txt = re.sub(r"[^a-z0-9]+", " ", txt)
-    return txt.strip()
-
-
 def pagina_reservas():
     st.header("📅 Gerenciar Reservas")
 
@@ -1057,7 +882,8 @@ def pagina_reservas():
     col_clientes = [
         "nome", "telefone", "email", "tipo_cliente", "cpf", "cnpj",
         "como_conseguiu", "logradouro", "numero", "complemento",
-        "bairro", "cidade", "cep", "observacao"
+        "bairro", "cidade", "cep", "observacao",
+        "cep_geocodificado", "distancia_km",    # pré-geocodificação (geocodificacao.py)
     ]
     col_reservas = ["id",
         "cliente", "brinquedos", "data", "horario_entrega", "horario_retirada",
@@ -1066,39 +892,22 @@ def pagina_reservas():
         "sinal", "falta", "observacao", "status", "pagamentos"
     ]
 
-    brinquedos = carregar_dados("brinquedos", col_brinquedos)
-    clientes = carregar_dados("clientes", col_clientes)
-    reservas = carregar_dados("reservas", col_reservas)
-
-    # Normaliza nomes de colunas (caso venham diferentes)
-    brinquedos.columns = [c.lower().strip() for c in brinquedos.columns]
-    clientes.columns = [c.lower().strip() for c in clientes.columns]
-    reservas.columns = [c.lower().strip() for c in reservas.columns]
-
-    # Garante colunas faltantes
-    for c in col_brinquedos:
-        if c not in brinquedos.columns:
-            brinquedos[c] = "" if c not in ["valor"] else 0.0
-    for c in col_clientes:
-        if c not in clientes.columns:
-            clientes[c] = ""
-    for c in col_reservas:
-        if c not in reservas.columns:
-            reservas[c] = "" if c in ["cliente","brinquedos","horario_entrega","horario_retirada","inicio_festa","fim_festa","observacao","status","pagamentos","data"] else 0.0
-
-    # Conversões
-    reservas["data"] = reservas["data"].apply(_to_date_safe)
+    dados = carregar_varios({
+        "brinquedos": col_brinquedos,
+        "clientes": col_clientes,
+        "reservas": col_reservas,
+        "pre_reservas": ["nome", "data", "ocasiao", "tema"],
+    })
+    brinquedos = dados["brinquedos"]
+    clientes = dados["clientes"]
+    reservas = dados["reservas"]
+
+    perfil.etapa("transformacao")
+    brinquedos, clientes, reservas = calculos.preparar_reservas(
+        brinquedos, clientes, reservas, col_brinquedos, col_clientes, col_reservas
+    )
     hoje = pd.Timestamp.now().normalize()
 
-    num_cols = ["valor_total", "valor_extra", "frete", "desconto", "sinal", "falta"]
-    for c in num_cols:
-        reservas[c] = pd.to_numeric(reservas[c], errors="coerce").fillna(0.0)
-    brinquedos["valor"] = pd.to_numeric(brinquedos["valor"], errors="coerce").fillna(0.0)
-
-    # ✅ Garante id numérico quando vier como texto/float
-    if "id" in reservas.columns:
-        reservas["id"] = pd.to_numeric(reservas["id"], errors="coerce")
-
     # ========================================
     # CLASSIFICAÇÃO DE RESERVAS
     # ========================================
@@ -1109,6 +918,7 @@ def pagina_reservas():
     # ========================================
     # INDICADORES
     # ========================================
+    perfil.etapa("widgets")
     total_reservas = len(reservas)
     total_hoje = len(reservas_hoje)
     total_futuras = len(reservas_futuras)
@@ -1140,6 +950,11 @@ def pagina_reservas():
     # ========================================
     aba_hoje, aba_futuras, aba_passadas = st.tabs(["📅 Hoje", "🚀 Futuras", "📖 Histórico"])
 
+    # Ocasião/tema vêm da pré-reserva: carregada uma vez só para todos os cartões
+    pre_reservas = dados["pre_reservas"]
+    pre_reservas["_nome"] = pre_reservas["nome"].astype(str).str.strip().str.lower()
+    pre_reservas["_data"] = pre_reservas["data"]
+
     def _cartao_reserva(df, tipo):
         if df.empty:
             st.info(f"Nenhuma reserva {tipo.lower()} encontrada.")
@@ -1170,32 +985,18 @@ def pagina_reservas():
             )
 
             
-            global pre_reservas
-
-            pre_reservas = carregar_dados("pre_reservas", [
-                "nome", "data", "ocasiao", "tema"
-            ])
-
-            if 'pre_reservas' in globals() and pre_reservas is not None:
+            data_reserva = pd.to_datetime(row.get("data"), errors="coerce")
 
-                data_reserva = pd.to_datetime(row.get("data"), errors="coerce")
-
-                pre = pre_reservas[
-                    (pre_reservas["nome"].str.strip().str.lower() ==
-                     str(row.get("cliente","")).strip().lower())
-                    &
-                    (pd.to_datetime(pre_reservas["data"], errors="coerce") ==
-                     data_reserva)
-                ]
-
-                if not pre.empty:
-                    pre = pre.iloc[0]
-                    ocasiao = pre.get("ocasiao", "")
-                    tema = pre.get("tema", "")
-                else:
-                    ocasiao = ""
-                    tema = ""
+            pre = pre_reservas[
+                (pre_reservas["_nome"] == str(row.get("cliente","")).strip().lower())
+                &
+                (pre_reservas["_data"] == data_reserva)
+            ]
 
+            if not pre.empty:
+                pre = pre.iloc[0]
+                ocasiao = pre.get("ocasiao", "")
+                tema = pre.get("tema", "")
             else:
                 ocasiao = ""
                 tema = ""
@@ -1359,17 +1160,12 @@ def pagina_reservas():
     data_reserva = pd.to_datetime(data_para_disponibilidade)
 
     # Brinquedos indisponíveis na data
-    reservados_no_dia = reservas.loc[reservas["data"] == data_reserva, "brinquedos"].dropna().tolist()
-    ocupados = set()
-    for r in reservados_no_dia:
-        ocupados.update([_norm(b) for b in str(r).split(",") if b.strip()])
     # Se estiver editando, permitir manter os que já estão na própria reserva
-    ja_selecionados = set()
-    if reserva.get("brinquedos"):
-        ja_selecionados = set([_norm(b) for b in str(reserva["brinquedos"]).split(",") if b.strip()])
-    ocupados_externos = ocupados - ja_selecionados
+    ocupados_externos = calculos.brinquedos_ocupados(
+        reservas, data_reserva, ignorar=calculos.lista_brinquedos(reserva.get("brinquedos") or "")
+    )
 
-    brinquedos_filtrados["nome_normalizado"] = brinquedos_filtrados["nome"].apply(_norm)
+    brinquedos_filtrados["nome_normalizado"] = calculos.normalizar_nomes(brinquedos_filtrados["nome"])
     disponiveis_df = brinquedos_filtrados[~brinquedos_filtrados["nome_normalizado"].isin(ocupados_externos)].copy()
 
     if ocupados_externos:
@@ -1388,27 +1184,32 @@ def pagina_reservas():
     )
 
     # ===== FRETE AUTOMÁTICO =====
-    # Ajuste o CEP de origem conforme sua operação
-    cep_origem = "09060-390"
-    cep_destino = clientes.loc[clientes["nome"] == cliente, "cep"].values[0] if cliente in clientes["nome"].values else ""
+    # CEP de origem: geocodificacao.CEP_DEPOSITO (variável GEO_DEPOSITO)
+    cep_origem = geocodificacao.CEP_DEPOSITO
+    linha_cliente = clientes[clientes["nome"] == cliente].head(1)
+    cep_destino = linha_cliente["cep"].iloc[0] if not linha_cliente.empty else ""
 
     frete_auto = 0.0
     if cep_destino:
-        dist_km = calcular_distancia_km(cep_origem, str(cep_destino))
-        if dist_km:
-            cats = [str(c).strip().lower() for c in brinquedos.loc[brinquedos["nome"].isin(itens), "categoria"].dropna().unique()]
-            if not cats:
-                multiplicador = 3
-            elif "montessori" in cats and "tradicional" in cats:
-                multiplicador = 5
-            elif "montessori" in cats:
-                multiplicador = 5
-            else:
-                multiplicador = 3
-            frete_auto = round(float(dist_km) * multiplicador, 2)
-            st.info(f"🚚 Distância aproximada: {dist_km} km")
+        # distância pré-calculada no cadastro (geocodificacao.geocodificar_clientes)
+        # enquanto o CEP não mudou; senão, cálculo na hora
+        pre_km = pd.to_numeric(linha_cliente["distancia_km"].iloc[0], errors="coerce")
+        if pd.notna(pre_km) and linha_cliente["cep_geocodificado"].iloc[0] == geocodificacao.normalizar_cep(cep_destino):
+            dist = geocodificacao.Distancia(float(pre_km), False)
+        else:
+            dist = geocodificacao.distancia(cep_origem, str(cep_destino))
+        dist_km = dist.km if dist else None
+        if dist_km is not None:
+            cats = brinquedos.loc[brinquedos["nome"].isin(itens), "categoria"].dropna().unique()
+            frete_auto = calculos.calcular_frete(dist_km, calculos.frete_por_km(cats))
+            st.info(f"🚚 Distância aproximada: {dist_km} km" + (" (estimada pelo CEP)" if dist.estimado else ""))
             st.markdown(f"**📍 CEP origem:** {cep_origem} → **destino:** {cep_destino}")
-            st.success(f"💰 Frete automático: R$ {frete_auto:,.2f}")
+            if frete_auto == 0.0:
+                st.success(f"💰 Frete isento (menos de {calculos.FRETE_ISENTO_KM:.0f} km)")
+            else:
+                st.success(f"💰 Frete automático: R$ {frete_auto:,.2f}")
+        elif dist is not None:
+            st.warning("⏳ A consulta do CEP está demorando; a distância aparece ao atualizar a página.")
         else:
             st.warning("⚠️ Não foi possível calcular a distância para o CEP informado.")
     else:
@@ -1511,9 +1312,13 @@ def pagina_estoque():
     # =====================================
     # CARREGAR DADOS
     # =====================================
-    brinquedos = carregar_dados("brinquedos", ["nome", "valor", "status", "categoria"])
-    reservas = carregar_dados("reservas", ["id","cliente", "brinquedos", "data", "horario_entrega",
-                                           "horario_retirada", "inicio_festa", "fim_festa", "status"])
+    dados = carregar_varios({
+        "brinquedos": ["nome", "valor", "status", "categoria"],
+        "reservas": ["id","cliente", "brinquedos", "data", "horario_entrega",
+                     "horario_retirada", "inicio_festa", "fim_festa", "status"],
+    })
+    brinquedos = dados["brinquedos"]
+    reservas = dados["reservas"]
 
     # Normaliza nomes das colunas para minúsculas
     brinquedos.columns = [c.lower().strip() for c in brinquedos.columns]
@@ -1526,16 +1331,7 @@ def pagina_estoque():
     # =====================================
     # CONVERSÃO DE DATAS
     # =====================================
-    def parse_data_segura(valor):
-        try:
-            if pd.isna(valor) or str(valor).strip() == "":
-                return pd.NaT
-            return pd.to_datetime(str(valor).split(" ")[0], errors="coerce").normalize()
-        except Exception:
-            return pd.NaT
-
-    if "data" in reservas.columns:
-        reservas["data"] = reservas["data"].apply(parse_data_segura)
+    reservas = calculos.preparar_estoque(reservas)
 
     # =====================================
     # FUNÇÃO PARA NORMALIZAR NOMES
@@ -1559,36 +1355,7 @@ def pagina_estoque():
     # ==============================================================
     with aba_disponibilidade:
         data_escolhida = st.date_input("📅 Escolha uma data para verificar disponibilidade", pd.Timestamp.today())
-        reservas_dia = reservas.loc[reservas["data"] == pd.to_datetime(data_escolhida)]
-
-        todos = []
-        for _, br in brinquedos.iterrows():
-            nome_brinquedo = br.get("nome", "")
-            cat = br.get("categoria", "Tradicional")
-
-            reservado = False
-            cliente_reserva = ""
-            inicio = ""
-            fim = ""
-
-            for _, res in reservas_dia.iterrows():
-                lista = str(res.get("brinquedos", ""))
-                if normalizar(nome_brinquedo) in normalizar(lista):
-                    reservado = True
-                    cliente_reserva = res.get("cliente", "")
-                    inicio = res.get("inicio_festa", "")
-                    fim = res.get("fim_festa", "")
-                    break
-
-            status = f"🔴 Indisponível (🎉 {cliente_reserva} - {inicio} às {fim})" if reservado else "🟢 Disponível"
-            todos.append({
-                "brinquedo": nome_brinquedo,
-                "categoria": cat,
-                "status": status,
-                "disponivel": not reservado
-            })
-
-        df_disp = pd.DataFrame(todos)
+        df_disp = calculos.disponibilidade_por_data(brinquedos, reservas, data_escolhida)
 
         aba_todos, aba_trad, aba_mont = st.tabs(["🌈 Todos", "🎪 Tradicional", "🧸 Montessori"])
 
@@ -1719,14 +1486,6 @@ def _ensure_cols(df: pd.DataFrame, cols):
             df[c] = ""
     return df.reindex(columns=cols)
 
-def _to_date_safe(x):
-    try:
-        if pd.isna(x) or str(x).strip() == "":
-            return pd.NaT
-        return pd.to_datetime(str(x).split(" ")[0], errors="coerce")
-    except Exception:
-        return pd.NaT
-
 # ------------------------------------------------------
 # FUNÇÃO PRINCIPAL
 # ------------------------------------------------------
@@ -1743,7 +1502,14 @@ import pandas as pd
 import uuid
 from datetime import datetime, timedelta
 import requests
-from banco import carregar_dados, salvar_dados, inserir_um, atualizar_por_filtro, deletar_por_filtro
+from banco import (
+    carregar_dados,
+    salvar_dados,
+    salvar_alteracoes,
+    inserir_um,
+    atualizar_por_filtro,
+    deletar_por_filtro,
+)
 
 
 # ============================================================
@@ -1759,7 +1525,8 @@ def pagina_custos():
     # 🧾 ABA 1 - LANÇAR CUSTOS
     # ============================================================
     with aba[0]:
-        cols_custos = ["descricao", "categoria", "valor", "data", "forma_de_pagamento", "observacao"]
+        # "id" é a chave de custos (banco.CHAVES_TABELAS): a exclusão apaga por ela
+        cols_custos = ["id", "descricao", "categoria", "valor", "data", "forma_de_pagamento", "observacao"]
 
         try:
             df = carregar_dados("custos", cols_custos)
@@ -1774,8 +1541,7 @@ def pagina_custos():
             st.error(f"❌ Erro ao carregar dados de custos: {e}")
             df = pd.DataFrame(columns=cols_custos)
 
-        df["valor"] = pd.to_numeric(df["valor"], errors="coerce").fillna(0.0)
-        df["data"] = df["data"].apply(_to_date_safe)
+        df_orig = df.copy()  # snapshot do banco (exclusão grava só a diferença)
 
         st.subheader("📆 Filtro de Período")
         hoje = datetime.now().date()
@@ -1863,7 +1629,7 @@ def pagina_custos():
 
         if not filtrado.empty:
             st.subheader("📊 Resumo por Categoria")
-            resumo = filtrado.groupby("categoria", dropna=False)["valor"].sum().reset_index().sort_values("valor", ascending=False)
+            resumo = filtrado.groupby("categoria", dropna=False, observed=True)["valor"].sum().reset_index().sort_values("valor", ascending=False)
             for _, row in resumo.iterrows():
                 st.markdown(
                     f"""
@@ -1895,9 +1661,14 @@ def pagina_custos():
                         idx_abs = row.name
                         if idx_abs in df.index:
                             df = df.drop(idx_abs).reset_index(drop=True)
-                            salvar_dados(df, "custos")
-                            st.warning(f"🗑️ Custo '{row['descricao']}' excluído!")
-                            st.rerun()
+                            try:
+                                # levanta se o delete não remover exatamente a linha
+                                salvar_alteracoes(df, "custos", df_orig)
+                            except Exception as e:
+                                st.error(f"❌ Erro ao excluir custo: {e}")
+                            else:
+                                st.warning(f"🗑️ Custo '{row['descricao']}' excluído!")
+                                st.rerun()
         else:
             st.info("Nenhum custo cadastrado ainda.")
             
@@ -1915,18 +1686,12 @@ def pagina_custos():
             "criado_em", "atualizado_em"
         ]
 
-        df_emp = carregar_dados("emprestimos", cols_emp).copy()
-        df_pag = carregar_dados("pagamentos_emprestimos", ["id_pagamento", "id_emprestimo", "descricao", "valor_pago", "data_pagamento"]).copy()
-
-        if not df_emp.empty:
-            df_emp["valor_recebido"] = pd.to_numeric(df_emp["valor_recebido"], errors="coerce").fillna(0.0)
-            df_emp["valor_a_pagar"] = pd.to_numeric(df_emp["valor_a_pagar"], errors="coerce").fillna(0.0)
-            df_emp["valor_pendente"] = pd.to_numeric(df_emp["valor_pendente"], errors="coerce").fillna(0.0)
-            df_emp["data"] = df_emp["data"].apply(_to_date_safe)
-
-        if not df_pag.empty:
-            df_pag["valor_pago"] = pd.to_numeric(df_pag["valor_pago"], errors="coerce").fillna(0.0)
-            df_pag["data_pagamento"] = df_pag["data_pagamento"].apply(_to_date_safe)
+        dados = carregar_varios({
+            "emprestimos": cols_emp,
+            "pagamentos_emprestimos": ["id_pagamento", "id_emprestimo", "descricao", "valor_pago", "data_pagamento"],
+        })
+        df_emp = dados["emprestimos"]
+        df_pag = dados["pagamentos_emprestimos"]
 
         total_recebido = df_emp["valor_recebido"].sum() if not df_emp.empty else 0
         total_pagar = df_emp["valor_a_pagar"].sum() if not df_emp.empty else 0
@@ -2004,10 +1769,10 @@ def pagina_custos():
                             inserir_um("pagamentos_emprestimos", novo_pagamento)
                             st.success(f"✅ Pagamento de R$ {valor_pago:.2f} registrado com sucesso!")
 
+                            # df_pag já foi carregado acima: histórico + o pagamento novo
                             pagos = (
-                                carregar_dados("pagamentos_emprestimos", ["id_emprestimo", "valor_pago"])
-                                .query("id_emprestimo == @row.id_emprestimo")["valor_pago"]
-                                .sum()
+                                df_pag.loc[df_pag["id_emprestimo"] == row["id_emprestimo"], "valor_pago"].sum()
+                                + float(valor_pago)
                             )
                             pendente = max(0, float(row["valor_a_pagar"]) - pagos)
                             status = "🟢 Quitado" if pendente <= 0 else "🟡 Pendente"
@@ -2095,7 +1860,6 @@ def pagina_agenda():
         st.info("Nenhuma reserva registrada ainda.")
         return
 
-    reservas["data"] = pd.to_datetime(reservas["data"], errors="coerce")
     reservas = reservas.dropna(subset=["data"])
 
     # ------------------ ESTADO ------------------
@@ -2218,7 +1982,7 @@ def pagina_checklist():
 
     # Banco (Modelo B: checklist = INSERT puro; peças = inserção unitária)
     from banco import (
-        carregar_dados,
+        carregar_varios,
         salvar_dados,
         inserir_peca_unica,
         deletar_por_filtro,   # usaremos no "Limpar duplicados"
@@ -2227,17 +1991,20 @@ def pagina_checklist():
     st.header("📋 Check-list de Brinquedos")
 
     # ================== CARREGAR DADOS ==================
-    reservas = carregar_dados("reservas", ["id", "cliente", "brinquedos", "data", "status"])
-    brinquedos_cadastrados = carregar_dados("brinquedos", ["nome"])
-    pecas = carregar_dados("pecas_brinquedos", ["Brinquedo", "Item"])
-    # 👇 inclui 'executado_em' para suportar histórico (Modelo B)
-    checklist = carregar_dados(
-        "checklist",
-        [
+    dados = carregar_varios({
+        "reservas": ["id", "cliente", "brinquedos", "data", "status"],
+        "brinquedos": ["nome"],
+        "pecas_brinquedos": ["Brinquedo", "Item"],
+        # 👇 inclui 'executado_em' para suportar histórico (Modelo B)
+        "checklist": [
             "reserva_id", "cliente", "brinquedo", "tipo", "item", "ok",
             "data", "observacao", "conferido_por", "completo", "executado_em"
-        ]
-    )
+        ],
+    })
+    reservas = dados["reservas"]
+    brinquedos_cadastrados = dados["brinquedos"]
+    pecas = dados["pecas_brinquedos"]
+    checklist = dados["checklist"]
 
     if reservas is None or reservas.empty:
         st.info("Nenhuma reserva encontrada.")
@@ -2260,16 +2027,13 @@ def pagina_checklist():
             pass
 
     # ================== PREPAROS ==================
-    reservas["data"] = pd.to_datetime(reservas["data"], errors="coerce")
     reservas["label"] = (
         reservas["id"].astype(str) + " - " + reservas["cliente"].astype(str) +
         " (" + reservas["data"].dt.strftime("%d/%m/%Y") + ")"
     )
 
     # Mapa de peças por brinquedo
-    pecas_map = {}
-    if pecas is not None and not pecas.empty:
-        pecas_map = pecas.groupby("Brinquedo")["Item"].apply(list).to_dict()
+    pecas_map = calculos.mapa_pecas(pecas)
 
     # ================== UTILS ==================
     STAGES = [
@@ -2281,60 +2045,15 @@ def pagina_checklist():
     def brinquedos_da_reserva(reserva_row) -> list:
         return [b.strip() for b in str(reserva_row["brinquedos"]).split(",") if b.strip()]
 
-    def _ordenar_por_recencia(df: pd.DataFrame) -> pd.DataFrame:
-        if df is None or df.empty:
-            return df
-        order_cols = []
-        if "executado_em" in df.columns:
-            order_cols.append("executado_em")
-        if "data" in df.columns:
-            try:
-                df["_data_dt"] = pd.to_datetime(df["data"], errors="coerce", utc=True)
-                order_cols.append("_data_dt")
-            except Exception:
-                order_cols.append("data")
-        return df.sort_values(order_cols, ascending=False) if order_cols else df
-
+    # Estado salvo (Modelo B: última versão por item) -> calculos.py
     def estado_previo(reserva_id: int, brinquedo: str, tipo: str) -> dict:
-        """
-        dict item->bool (ok) do que já foi salvo para (reserva, brinquedo, etapa).
-        Usa a ÚLTIMA versão por item (Modelo B) priorizando 'executado_em'; fallback para 'data'.
-        """
-        if checklist is None or checklist.empty:
-            return {}
-        df_prev = checklist[
-            (checklist["reserva_id"] == reserva_id) &
-            (checklist["brinquedo"].astype(str).str.lower() == str(brinquedo).lower()) &
-            (checklist["tipo"] == tipo)
-        ].copy()
-        if df_prev.empty:
-            return {}
-
-        df_prev = _ordenar_por_recencia(df_prev)
-        df_ultimos = df_prev.drop_duplicates(subset=["item"], keep="first")
-        return {row["item"]: (row["ok"] == "✅") for _, row in df_ultimos.iterrows()}
+        return calculos.estado_checklist(checklist, reserva_id, brinquedo, tipo)
 
     def status_ok_total(reserva_id: int, brinquedo: str, tipo: str, itens_ref: list):
-        prev = estado_previo(reserva_id, brinquedo, tipo)
-        if itens_ref:
-            total = len(itens_ref)
-            ok = sum(1 for item in itens_ref if prev.get(item, False))
-        else:
-            total = 1
-            ok = 1 if prev.get("No carro", False) else 0
-        completo = (total > 0 and ok == total)
-        return ok, total, completo
+        return calculos.status_ok_total(checklist, reserva_id, brinquedo, tipo, itens_ref)
 
     def progresso_etapa(reserva_id: int, tipo: str, brinquedos_lista: list) -> tuple:
-        completos = 0
-        for b in brinquedos_lista:
-            itens_b = pecas_map.get(b, [])
-            _, _, comp = status_ok_total(reserva_id, b, tipo, itens_b)
-            if comp:
-                completos += 1
-        total = len(brinquedos_lista)
-        prog = (completos / total * 100) if total > 0 else 0.0
-        return completos, total, prog
+        return calculos.progresso_etapa(checklist, pecas_map, reserva_id, tipo, brinquedos_lista)
 
     def build_brinquedo_label(nome_brinquedo: str, ok: int, total: int, itens: list) -> str:
         # Badge
@@ -2569,7 +2288,7 @@ def pagina_checklist():
                         alvo["_i"] = alvo["item"].astype(str).str.strip().str.lower()
                         alvo["_obs"] = alvo["observacao"].fillna("").astype(str).str.strip()
                         # Ordena por recência
-                        alvo = _ordenar_por_recencia(alvo)
+                        alvo = calculos.ordenar_por_recencia(alvo)
 
                         if modo == "Manter só a última por item":
                             # keep = última por (reserva_id, b, t, i)
@@ -2697,7 +2416,7 @@ def pagina_checklist():
 import pandas as pd
 import streamlit as st
 from datetime import datetime, date
-from banco import carregar_dados, salvar_dados
+from banco import carregar_dados, salvar_dados, salvar_alteracoes
 
 # ---------------------------------
 # CONFIGURAÇÕES / CONSTANTES
@@ -2708,9 +2427,9 @@ COLS_VEIC = [
     "ipva_pago", "licenciamento_pago", "seguro_pago", "observacao"
 ]
 
-COLS_MANU = ["placa", "tipo", "descricao", "data", "km", "valor"]
-COLS_CUSTOS = ["descricao", "categoria", "valor", "data", "forma_de_pagamento", "observacao"]
-COLS_KMLOG = ["placa", "data", "km"]
+COLS_MANU = ["id", "placa", "tipo", "descricao", "data", "km", "valor"]
+COLS_CUSTOS = ["id", "descricao", "categoria", "valor", "data", "forma_de_pagamento", "observacao"]
+COLS_KMLOG = ["id", "placa", "data", "km"]
 
 TIPOS_MANU = [
     "Troca de óleo", "Pneus", "Freios", "Motor",
@@ -2749,14 +2468,6 @@ def _ensure_cols(df: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
 def _to_date(series: pd.Series):
     return pd.to_datetime(series, errors="coerce").dt.date
 
-def _to_num(series: pd.Series, as_int=False):
-    s = pd.to_numeric(series, errors="coerce").fillna(0)
-    return s.astype(int) if as_int else s
-
-def _to_bool(series: pd.Series):
-    TRUE_SET = {"true","1","sim","yes","y","verdadeiro","pago","ok","on","t"}
-    return series.astype(str).str.strip().str.lower().isin(TRUE_SET)
-
 def meses_passados(d1: date, d2: date) -> int:
     if pd.isna(d1) or d1 is None or pd.isna(d2) or d2 is None:
         return 9999
@@ -2816,29 +2527,38 @@ def pagina_frota():
     st.header("🚗 Controle de Frota")
 
     # === Carrega do Supabase ===
-    veiculos = _ensure_cols(_norm_cols(carregar_dados("veiculos", COLS_VEIC)), COLS_VEIC)
-    manutencoes = _ensure_cols(_norm_cols(carregar_dados("manutencoes", COLS_MANU)), COLS_MANU)
-    custos = _ensure_cols(_norm_cols(carregar_dados("custos", COLS_CUSTOS)), COLS_CUSTOS)
-    km_log = _ensure_cols(_norm_cols(carregar_dados("km_log", COLS_KMLOG)), COLS_KMLOG)
-
-    # === Tipos ===
+    dados = carregar_varios({
+        "veiculos": COLS_VEIC,
+        "manutencoes": COLS_MANU,
+        "custos": COLS_CUSTOS,
+        "km_log": COLS_KMLOG,
+    })
+    veiculos = _ensure_cols(_norm_cols(dados["veiculos"]), COLS_VEIC)
+    manutencoes = _ensure_cols(_norm_cols(dados["manutencoes"]), COLS_MANU)
+    custos = _ensure_cols(_norm_cols(dados["custos"]), COLS_CUSTOS)
+    km_log = _ensure_cols(_norm_cols(dados["km_log"]), COLS_KMLOG)
+
+    # === Tipos === (números, datas e flags já vêm tipados: banco.ESQUEMAS)
+    # os alertas comparam com date.today(); km sem valor conta como 0
     if not veiculos.empty:
-        veiculos["ano"] = _to_num(veiculos["ano"], True)
-        veiculos["km_atual"] = _to_num(veiculos["km_atual"], True)
-        veiculos["valor_veiculo"] = _to_num(veiculos["valor_veiculo"])
+        veiculos[["ano", "km_atual"]] = veiculos[["ano", "km_atual"]].fillna(0)
         for d in ["data_ipva", "data_licenciamento", "data_seguro"]:
             veiculos[d] = _to_date(veiculos[d])
-        for b in ["ipva_pago", "licenciamento_pago", "seguro_pago"]:
-            veiculos[b] = _to_bool(veiculos[b])
 
     if not manutencoes.empty:
         manutencoes["data"] = _to_date(manutencoes["data"])
-        manutencoes["valor"] = _to_num(manutencoes["valor"])
-        manutencoes["km"] = _to_num(manutencoes["km"], True)
+        manutencoes["km"] = manutencoes["km"].fillna(0)
 
     if not km_log.empty:
         km_log["data"] = _to_date(km_log["data"])
-        km_log["km"] = _to_num(km_log["km"], True)
+        km_log["km"] = km_log["km"].fillna(0)
+
+    # Snapshots do banco: os saves gravam só a diferença. Tirados depois da
+    # normalização acima, senão todo km/ano nulo difere (0) e é regravado
+    veiculos_orig = veiculos.copy()
+    manutencoes_orig = manutencoes.copy()
+    custos_orig = custos.copy()
+    km_log_orig = km_log.copy()
 
     # === Cards ===
     tot_veic = len(veiculos)
@@ -2898,7 +2618,7 @@ def pagina_frota():
                     else:
                         veiculos = pd.concat([veiculos, novo], ignore_index=True)
                         st.success(f"Veículo {placa} cadastrado!")
-                    salvar_dados(_dates_to_str(veiculos), "veiculos")
+                    salvar_alteracoes(_dates_to_str(veiculos), "veiculos", veiculos_orig)
 
         st.dataframe(veiculos, use_container_width=True) if not veiculos.empty else st.info("Nenhum veículo cadastrado.")
 
@@ -2918,7 +2638,7 @@ def pagina_frota():
                 if st.form_submit_button("💾 Salvar manutenção"):
                     nova = pd.DataFrame([{"placa": placa, "tipo": tipo, "descricao": desc, "data": data, "km": km, "valor": valor}])
                     manutencoes = pd.concat([manutencoes, nova], ignore_index=True)
-                    salvar_dados(_dates_to_str(manutencoes), "manutencoes")
+                    salvar_alteracoes(_dates_to_str(manutencoes), "manutencoes", manutencoes_orig)
                     st.success(f"Manutenção '{tipo}' registrada para {placa}!")
                     try:
                         novo_custo = pd.DataFrame([{
@@ -2930,7 +2650,7 @@ def pagina_frota():
                             "observacao": desc
                         }])
                         custos = pd.concat([custos, novo_custo], ignore_index=True)
-                        salvar_dados(_dates_to_str(custos), "custos")
+                        salvar_alteracoes(_dates_to_str(custos), "custos", custos_orig)
                         st.info("📥 Lançado também em custos.")
                     except Exception as e:
                         st.warning(f"Erro ao lançar em custos: {e}")
@@ -2970,9 +2690,9 @@ def pagina_frota():
             veiculos.loc[veiculos["placa"] == placa, ["km_atual","ipva_pago","licenciamento_pago","seguro_pago"]] = [
                 km_atual, ipva_pago, lic_pago, seg_pago
             ]
-            salvar_dados(_dates_to_str(veiculos), "veiculos")
+            salvar_alteracoes(_dates_to_str(veiculos), "veiculos", veiculos_orig)
             km_log = pd.concat([km_log, pd.DataFrame([{"placa": placa, "data": date.today(), "km": km_atual}])], ignore_index=True)
-            salvar_dados(_dates_to_str(km_log), "km_log")
+            salvar_alteracoes(_dates_to_str(km_log), "km_log", km_log_orig)
             st.success("✅ Atualização salva!")
 
         df_km = km_log[km_log["placa"] == placa]
@@ -3067,7 +2787,6 @@ def pagina_whatsapp():
         reservas.columns = [c.lower().strip() for c in reservas.columns]
         clientes.columns = [c.lower().strip() for c in clientes.columns]
 
-        reservas["data"] = pd.to_datetime(reservas["data"], errors="coerce")
         reservas = reservas.dropna(subset=["data"])
         reservas = reservas.merge(clientes, how="left", left_on="cliente", right_on="nome").drop(columns=["nome"], errors="ignore")
         reservas["cep"] = reservas["cep"].fillna("")
@@ -3304,17 +3023,17 @@ def pagina_pre_reservas():
     # ===============================
     # CARREGAR DADOS
     # ===============================
-    pre = carregar_dados(
-        "pre_reservas",
-        [
+    dados = carregar_varios({
+        "pre_reservas": [
             "id","nome","telefone","email","rg","cpf",
             "como_conheceu","cep","logradouro","numero",
             "complemento","bairro","cidade","observacao",
             "data","hora_inicio","hora_fim","brinquedos","status"
-        ]
-    )
-
-    reservas = carregar_dados("reservas", ["*"])
+        ],
+        "reservas": ["*"],
+    })
+    pre = dados["pre_reservas"]
+    reservas = dados["reservas"]
 
     if pre.empty:
         st.warning("⚠️ Nenhuma pré-reserva encontrada.")
@@ -3345,7 +3064,6 @@ def pagina_pre_reservas():
     # ===============================
     # FORMATAR/ORDENAR POR DATA
     # ===============================
-    pre["data"] = pd.to_datetime(pre["data"], errors="coerce")
     if "hora_inicio" in pre.columns:
         pre = pre.sort_values(by=["data", "hora_inicio"], ascending=[True, True])
     else:
@@ -3512,7 +3230,7 @@ from datetime import datetime, date
 import pandas as pd
 import streamlit as st
 
-from banco import carregar_dados, salvar_dados
+from banco import carregar_dados, salvar_dados, salvar_alteracoes
 
 
 def pagina_funcionarios():
@@ -3537,15 +3255,6 @@ def pagina_funcionarios():
                 df[c] = "" if c not in ["data_nascimento", "data_admissao"] else None
         return df[cols].copy()
 
-    def _to_date_safe(x):
-        try:
-            if pd.isna(x) or str(x).strip() == "":
-                return pd.NaT
-            # aceita 'YYYY-MM-DD' ou outros formatos comuns
-            return pd.to_datetime(str(x).split(" ")[0], errors="coerce")
-        except Exception:
-            return pd.NaT
-
     def _idade(dt: pd.Timestamp | None) -> int | None:
         if dt is None or pd.isna(dt):
             return None
@@ -3591,13 +3300,17 @@ def pagina_funcionarios():
     # ---------------------------------
     # Carrega base do Supabase
     # ---------------------------------
-    df_base = carregar_dados("funcionarios", cols_db)
+    # "id" é a chave de funcionarios (banco.CHAVES_TABELAS): edição vira update e
+    # exclusão apaga por ela
+    df_base = carregar_dados("funcionarios", ["id"] + cols_db)
     # normaliza nomes
     df_base.columns = [c.lower().strip() for c in df_base.columns]
-    df_base = _ensure_cols(df_base, cols_db).fillna("")
-    # datas
-    df_base["data_nascimento"] = df_base["data_nascimento"].apply(_to_date_safe)
-    df_base["data_admissao"] = df_base["data_admissao"].apply(_to_date_safe)
+    df_base = _ensure_cols(df_base, ["id"] + cols_db)
+    # snapshot do banco (os saves gravam só a diferença)
+    df_orig = df_base.copy()
+    # datas já vêm como datetime64 (banco.ESQUEMAS); o resto, texto sem nulos
+    cols_texto = [c for c in cols_db if c not in ("data_nascimento", "data_admissao")]
+    df_base[cols_texto] = df_base[cols_texto].fillna("")
     # foto como string
     df_base["foto"] = df_base["foto"].astype(str).replace(["nan", "None", "0"], "")
 
@@ -3748,20 +3461,27 @@ def pagina_funcionarios():
                 }
 
                 df_to_save = df_base.copy()
-                if edit_abs_idx is not None and edit_abs_idx in df_to_save.index:
+                editando = edit_abs_idx is not None and edit_abs_idx in df_to_save.index
+                if editando:
                     # update
                     for k, v in novo.items():
                         df_to_save.at[edit_abs_idx, k] = v
-                    st.success("✏️ Funcionário atualizado com sucesso!")
-                    st.session_state.func_edit_abs_idx = None
                 else:
                     # insert
                     df_to_save.loc[len(df_to_save)] = novo
-                    st.success("✅ Funcionário cadastrado com sucesso!")
 
-                salvar_dados(df_to_save, "funcionarios")
-                st.session_state.func_ultima_foto = foto_path or ""
-                st.rerun()
+                try:
+                    salvar_alteracoes(df_to_save, "funcionarios", df_orig)
+                except Exception as e:
+                    st.error(f"❌ Erro ao salvar funcionário: {e}")
+                else:
+                    if editando:
+                        st.success("✏️ Funcionário atualizado com sucesso!")
+                        st.session_state.func_edit_abs_idx = None
+                    else:
+                        st.success("✅ Funcionário cadastrado com sucesso!")
+                    st.session_state.func_ultima_foto = foto_path or ""
+                    st.rerun()
 
     # ---------------------------------
     # Câmera
@@ -3869,12 +3589,20 @@ def pagina_funcionarios():
                         with c_ok:
                             if st.button("✅ Sim, excluir", key=f"confirma_{abs_idx}"):
                                 df_to_save = df_base.copy()
+                                erro = None
                                 if abs_idx in df_to_save.index:
                                     df_to_save = df_to_save.drop(index=abs_idx).reset_index(drop=True)
-                                    salvar_dados(df_to_save, "funcionarios")
+                                    try:
+                                        # levanta se o delete não remover exatamente a linha
+                                        salvar_alteracoes(df_to_save, "funcionarios", df_orig)
+                                    except Exception as e:
+                                        erro = e
+                                if erro is None:
                                     st.success(f"{row['nome']} foi removido com sucesso.")
-                                st.session_state.func_excluir_idx = None
-                                st.rerun()
+                                    st.session_state.func_excluir_idx = None
+                                    st.rerun()
+                                # sem rerun: o erro fica na tela com a confirmação aberta
+                                st.error(f"❌ Erro ao remover {row['nome']}: {erro}")
                         with c_cancel:
                             if st.button("❌ Cancelar", key=f"cancela_{abs_idx}"):
                                 st.session_state.func_excluir_idx = None
@@ -3911,18 +3639,21 @@ def pagina_contratos():
     # =========================
     # 📦 CARREGAR DADOS
     # =========================
-    reservas = carregar_dados("reservas", [
-        "id","cliente","brinquedos","data",
-        "horario_entrega","horario_retirada",
-        "valor_total","valor_extra","frete","desconto",
-        "sinal","falta","observacao","status",
-        "contrato_gerado"  # ✅ NOVO
-    ])
-
-    clientes = carregar_dados("clientes", [
-        "nome","cpf","rg","email","telefone",
-        "logradouro","numero","complemento","cidade","cep"
-    ])
+    dados = carregar_varios({
+        "reservas": [
+            "id","cliente","brinquedos","data",
+            "horario_entrega","horario_retirada",
+            "valor_total","valor_extra","frete","desconto",
+            "sinal","falta","observacao","status",
+            "contrato_gerado"  # ✅ NOVO
+        ],
+        "clientes": [
+            "nome","cpf","rg","email","telefone",
+            "logradouro","numero","complemento","cidade","cep"
+        ],
+    })
+    reservas = dados["reservas"]
+    clientes = dados["clientes"]
 
     if reservas.empty:
         st.warning("Sem reservas")
@@ -3932,7 +3663,6 @@ def pagina_contratos():
     # ✅ TRATAMENTO (NOVO)
     # =========================
     reservas["contrato_gerado"] = reservas.get("contrato_gerado", "Não").fillna("Não")
-    reservas["data"] = pd.to_datetime(reservas["data"], errors="coerce")
 
     # =========================
     # ✅ CARDS (NOVO)
@@ -4144,9 +3874,67 @@ def pagina_contratos():
 # PAGINA CONTRATO FIM
 # ========================================
 
+# ========================================
+# PAINEL ADMIN (usuários de APP_ADMINS, aberto com ?admin=1)
+# ========================================
+def painel_admin():
+    import espelho
+    from banco import estatisticas_cache
+    from supabase_rest import estado_circuito
+
+    with st.sidebar.expander("🛠️ Admin · Supabase", expanded=False):
+        linhas = metricas.resumo()
+        if linhas:
+            df_met = pd.DataFrame(linhas)
+            por_pagina = df_met.groupby("pagina")["tempo_total_s"].sum().sort_values(ascending=False)
+            st.caption("⏱️ Tempo esperando o Supabase por página (s)")
+            st.dataframe(por_pagina, use_container_width=True)
+            st.caption("📋 Por página × tabela × verbo")
+            st.dataframe(df_met, use_container_width=True, hide_index=True)
+        else:
+            st.info("Nenhuma chamada registrada ainda.")
+
+        st.caption("🔌 Circuit breaker")
+        st.json(estado_circuito())
+        st.caption("🗃️ Cache de leitura")
+        st.json(estatisticas_cache())
+        st.caption("🪞 Espelho local (sincronização por updated_at)")
+        st.json(espelho.estado())
+
+        st.download_button(
+            "⬇️ Métricas (Prometheus)",
+            metricas.exportar_prometheus(),
+            file_name="metricas.prom",
+            mime="text/plain",
+        )
+        if st.button("🧹 Zerar métricas"):
+            metricas.zerar()
+            st.rerun()
+
+    with st.sidebar.expander("🗺️ Admin · Geocodificação", expanded=False):
+        lote = geocodificacao.estado_lote()
+        if lote["rodando"]:
+            st.progress(lote["feitos"] / lote["total"] if lote["total"] else 0.0,
+                        text=f"📍 {lote['feitos']}/{lote['total']} CEPs")
+            st.button("🔄 Atualizar progresso")
+        else:
+            if lote["erro"]:
+                st.error(f"❌ {lote['erro']}")
+            elif lote["resumo"]:
+                st.success("✅ Última rodada: " + ", ".join(f"{k} {v}" for k, v in lote["resumo"].items()))
+            todos = st.checkbox("Recalcular todos (depósito ou valor do km mudou)")
+            if st.button("📍 Geocodificar clientes"):
+                geocodificacao.iniciar_lote(todos)
+                st.rerun()
+        st.caption(f"🕒 Na fila: {geocodificacao.pendentes()} CEP(s)")
+        st.json(geocodificacao.estatisticas())
+
 # ========================================
 # PROGRAMA PRINCIPAL
 # ========================================
+# Cada rerun começa com o memo de leituras zerado (banco.iniciar_execucao)
+iniciar_execucao()
+
 if "logado" not in st.session_state:
     st.session_state["logado"] = False
 
@@ -4283,33 +4071,61 @@ else:
     )
 
     # 🧭 NAVEGAÇÃO ENTRE PÁGINAS
-    if menu == "Brinquedos":
-        pagina_brinquedos()
-    elif menu == "Clientes":
-        pagina_clientes()
-    elif menu == "Reservas":
-        pagina_reservas()
-    elif menu == "Indicadores":
-        pagina_relatorios()
-    elif menu == "Custos":
-         pagina_custos()
-    elif menu == "Agenda":
-        pagina_agenda()
-    elif menu == "Estoque":
-        pagina_estoque()
-    elif menu == "Check-list":
-        pagina_checklist()
-    elif menu == "Frota":
-        pagina_frota()
-    elif menu == "Funcionários":
-        pagina_funcionarios()
-    elif menu == "Envio WhatsApp":
-        pagina_whatsapp()
-    elif menu == "Pré-Reservas":
-        pagina_pre_reservas()
-    elif menu == "Gerar Contratos":
-        pagina_contratos() 
-    elif menu == "Sair":
-        st.session_state["logado"] = False
-        st.experimental_rerun()
+    # rótulo da página nas métricas das chamadas ao Supabase
+    metricas.definir_pagina(menu)
+
+    # o query string só mostra/esconde; quem pode ver é o login (APP_ADMINS)
+    admin = st.session_state.get("usuario") in USUARIOS_ADMIN and st.query_params.get("admin") == "1"
+    captura = None
+    if admin:
+        captura = st.sidebar.selectbox("🔬 Perfilar página", ["—", "cprofile", "pyinstrument"])
+        captura = None if captura == "—" else captura
+
+    # tempo por fase (dados / transformação / gráficos / widgets) -> logs/perfil_paginas.jsonl
+    with perfil.pagina(menu, capturar=captura) as medida:
+        if menu == "Brinquedos":
+            pagina_brinquedos()
+        elif menu == "Clientes":
+            pagina_clientes()
+        elif menu == "Reservas":
+            pagina_reservas()
+        elif menu == "Indicadores":
+            pagina_relatorios()
+        elif menu == "Custos":
+             pagina_custos()
+        elif menu == "Agenda":
+            pagina_agenda()
+        elif menu == "Estoque":
+            pagina_estoque()
+        elif menu == "Check-list":
+            pagina_checklist()
+        elif menu == "Frota":
+            pagina_frota()
+        elif menu == "Funcionários":
+            pagina_funcionarios()
+        elif menu == "Envio WhatsApp":
+            pagina_whatsapp()
+        elif menu == "Pré-Reservas":
+            pagina_pre_reservas()
+        elif menu == "Gerar Contratos":
+            pagina_contratos() 
+        elif menu == "Sair":
+            st.session_state["logado"] = False
+            st.experimental_rerun()
+
+    # Supabase fora: a página foi montada com a cópia local (espelho/cache)
+    if somente_leitura():
+        st.sidebar.warning("📴 Supabase indisponível — modo somente leitura. Alterações não serão salvas.")
+
+    # Depuração: leituras repetidas que o memo do banco evitou neste rerun
+    if os.getenv("BANCO_DEBUG"):
+        st.sidebar.caption(f"🔁 Leituras repetidas absorvidas: {leituras_duplicadas()}")
+
+    if admin:
+        fases = " · ".join(f"{f} {ms:.0f}" for f, ms in medida["fases_ms"].items())
+        st.sidebar.caption(f"⏱️ {menu}: {medida['total_ms']:.0f} ms ({fases})")
+        if "captura" in medida:
+            nome_arq, conteudo, mime = medida["captura"]
+            st.sidebar.download_button("⬇️ Baixar perfil", conteudo, file_name=nome_arq, mime=mime)
+        painel_admin()
 
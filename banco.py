@@ -1,11 +1,19 @@
 from __future__ import annotations
 
+import json
 import logging
-from typing import Dict, Any, List, Optional, Iterable
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Any, List, Optional, Iterator, Union
 
+import numpy as np
 import pandas as pd
 import re
-import requests
 
 __BCO_VERSION__ = "banco.py/ModeloB-2026-03-18"
 
@@ -25,14 +33,270 @@ except Exception:
 # ==============================
 # SUPABASE REST WRAPPER
 # ==============================
+import espelho
+import metricas
+import perfil
+from calculos import para_bool, para_data, para_dinheiro, para_inteiro, para_numero
 from supabase_rest import (
     table_select,
+    table_select_iter,
     table_insert,
     table_update,
     table_delete,
     table_upsert,
+    rpc,
+    erro_transitorio,
+    estado_circuito,
+    iniciar_orcamento,
+    prazo_atual,
+    definir_prazo,
 )
 
+# ==============================
+# CHAVES DAS TABELAS
+# ==============================
+# Coluna única e ordenável de cada tabela (paginação por keyset).
+CHAVES_TABELAS: Dict[str, str] = {
+    "reservas": "id",
+    "pre_reservas": "id",
+    "clientes": "id_cliente",
+    "brinquedos": "id_brinquedo",
+    "emprestimos": "id_emprestimo",
+    "pagamentos_emprestimos": "id_pagamento",
+    "metas": "anomes",
+    "veiculos": "placa",
+    "custos": "id",
+    "funcionarios": "id",
+    "manutencoes": "id",
+    "km_log": "id",
+}
+
+# ==============================
+# ESQUEMAS (tipos das colunas)
+# ==============================
+# O Supabase guarda quase tudo como texto (datas em vários formatos, valores
+# com vazio). carregar_dados/carregar_varios devolvem os frames já tipados,
+# numa passada vetorizada por coluna (tipar), e as páginas não convertem mais
+# linha a linha:
+#   data       datetime64 normalizado, NaT se inválida (calculos.para_data)
+#   dinheiro   float, vazio/inválido = 0.0
+#   numero     float, vazio/inválido = NaN (medidas em que 0 seria um valor)
+#   inteiro    Int64 (com <NA>)
+#   bool       bool ("sim", "true", "pago"... = True)
+#   categoria  category — só em colunas que as páginas leem/filtram; as de
+#              frames que voltam para edição/gravação (custos.categoria,
+#              pre_reservas.status, funcionarios, veiculos) ficam texto: um
+#              fillna("")/valor novo num category levanta
+#   texto      como veio
+# Colunas fora do esquema ficam como vieram.
+ESQUEMAS: Dict[str, Dict[str, str]] = {
+    "reservas": {
+        "id": "inteiro", "data": "data", "status": "categoria",
+        "valor_total": "dinheiro", "valor_extra": "dinheiro", "frete": "dinheiro",
+        "desconto": "dinheiro", "sinal": "dinheiro", "falta": "dinheiro",
+        "contrato_gerado": "texto",
+    },
+    "pre_reservas": {"id": "inteiro", "data": "data"},
+    "brinquedos": {
+        "valor": "dinheiro", "valor_compra": "dinheiro",
+        "status": "categoria", "categoria": "categoria",
+        "data_compra": "texto",   # a página testa "" para "sem data"
+    },
+    "custos": {"id": "inteiro", "data": "data", "valor": "dinheiro"},
+    "emprestimos": {
+        "data": "data", "status": "categoria",
+        "valor_recebido": "dinheiro", "valor_a_pagar": "dinheiro", "valor_pendente": "dinheiro",
+        "juros": "dinheiro", "parcelas": "inteiro",
+    },
+    "pagamentos_emprestimos": {"data_pagamento": "data", "valor_pago": "dinheiro"},
+    "metas": {"meta": "dinheiro"},
+    "veiculos": {
+        "ano": "inteiro", "km_atual": "inteiro", "valor_veiculo": "dinheiro",
+        "data_ipva": "data", "data_licenciamento": "data", "data_seguro": "data",
+        "ipva_pago": "bool", "licenciamento_pago": "bool", "seguro_pago": "bool",
+    },
+    "manutencoes": {"id": "inteiro", "data": "data", "km": "inteiro", "valor": "dinheiro"},
+    "km_log": {"id": "inteiro", "data": "data", "km": "inteiro"},
+    "funcionarios": {"id": "inteiro", "data_nascimento": "data", "data_admissao": "data"},
+    "checklist": {"reserva_id": "inteiro"},
+    "clientes": {   # pré-geocodificação (geocodificacao.geocodificar_clientes)
+        "latitude": "numero", "longitude": "numero", "distancia_km": "numero",
+        "frete_tradicional": "numero", "frete_montessori": "numero",
+    },
+}
+
+_CONVERSORES = {
+    "data": para_data,
+    "dinheiro": para_dinheiro,
+    "numero": para_numero,
+    "inteiro": para_inteiro,
+    "bool": para_bool,
+    "categoria": lambda s: s.astype("category"),
+    "texto": lambda s: s,
+}
+
+def tipar(df: pd.DataFrame, tabela: str) -> pd.DataFrame:
+    """Aplica ESQUEMAS[tabela] às colunas presentes em `df` (no lugar)."""
+    for col, tipo in ESQUEMAS.get(tabela, {}).items():
+        if col in df.columns:
+            df[col] = _CONVERSORES[tipo](df[col])
+    return df
+
+# Linhas por requisição nas gravações em lote (salvar_dados)
+LOTE_SALVAR = int(os.getenv("BANCO_LOTE_SALVAR", "500"))
+
+# Leituras simultâneas no carregar_varios (não passar do POOL_SIZE do supabase_rest)
+CARGA_PARALELA = int(os.getenv("BANCO_CARGA_PARALELA", "4"))
+
+# Leituras inteiras em text/csv, montadas direto em DataFrame (sem um dict
+# por linha). Nulos em colunas de texto chegam como "" e colunas fora do
+# ESQUEMAS chegam como texto; por isso é opcional.
+CARGA_COLUNAR = os.getenv("BANCO_CARGA_COLUNAR", "0") == "1"
+
+# ==============================
+# CACHE DE LEITURA (carregar_dados)
+# ==============================
+# Cada rerun do Streamlit reexecuta a página inteira; o cache evita ir ao
+# Supabase quando nada mudou. Chave = tabela + colunas + filtros.
+# Toda escrita feita por este módulo invalida a tabela afetada.
+CACHE_TTL = float(os.getenv("BANCO_CACHE_TTL", "30"))   # segundos (0 desliga)
+CACHE_MAX = int(os.getenv("BANCO_CACHE_MAX", "64"))     # entradas (LRU)
+
+# Agregados calculados no servidor (carregar_agregado) -> tabelas de origem;
+# escrever numa delas invalida também o agregado.
+AGREGADOS: Dict[str, tuple] = {
+    "indicadores_mensais": ("reservas", "custos"),
+    "desempenho_brinquedos": ("reservas",),
+}
+
+_cache: "OrderedDict[tuple, tuple]" = OrderedDict()     # chave -> (expira_em, gravado_em, df)
+_cache_lock = threading.Lock()
+_cache_stats = {"hits": 0, "misses": 0, "invalidacoes": 0, "duplicadas": 0, "vencidos_servidos": 0}
+
+def _chave_cache(tabela: str, colunas: Optional[List[str]], where: Optional[Dict[str, Any]]) -> tuple:
+    filtros = repr(sorted((where or {}).items(), key=lambda kv: kv[0]))
+    return (tabela, tuple(colunas) if colunas is not None else None, filtros)
+
+def _depende(origem: str, tabela: str) -> bool:
+    """A entrada de cache lida de `origem` (tabela ou "rpc/<funcao>") depende de `tabela`?"""
+    return origem == tabela or (origem.startswith("rpc/") and tabela in AGREGADOS.get(origem[4:], ()))
+
+def _cache_get(chave: tuple) -> Optional[pd.DataFrame]:
+    if CACHE_TTL <= 0:
+        return None
+    with _cache_lock:
+        item = _cache.get(chave)
+        # entradas vencidas ficam (até o LRU descartar) para o caso de o
+        # Supabase cair: ver _cache_vencido
+        if item is None or item[0] < time.monotonic():
+            _cache_stats["misses"] += 1
+            return None
+        _cache.move_to_end(chave)
+        _cache_stats["hits"] += 1
+        df = item[2]
+    # as páginas alteram o DataFrame recebido; cada chamada ganha uma cópia
+    return df.copy()
+
+def _cache_vencido(chave: tuple) -> Optional[tuple]:
+    """Última leitura guardada (mesmo vencida): (gravado_em, df)."""
+    with _cache_lock:
+        item = _cache.get(chave)
+        if item is None:
+            return None
+        _cache_stats["vencidos_servidos"] += 1
+        return item[1], item[2].copy()
+
+def _cache_put(chave: tuple, df: pd.DataFrame) -> None:
+    if CACHE_TTL <= 0 or CACHE_MAX <= 0:
+        return
+    with _cache_lock:
+        _cache[chave] = (time.monotonic() + CACHE_TTL, time.time(), df.copy())
+        _cache.move_to_end(chave)
+        while len(_cache) > CACHE_MAX:
+            _cache.popitem(last=False)
+
+# Memo por execução do script: mesmo com CACHE_TTL=0, a mesma leitura feita
+# duas vezes no mesmo rerun vai ao servidor uma vez só. Vale por thread
+# (cada sessão do Streamlit roda o script na sua) e só fica ativo depois de
+# iniciar_execucao(), chamado no topo do app a cada rerun.
+_execucao = threading.local()
+
+def iniciar_execucao() -> None:
+    """Começa um rerun novo: zera o memo de leituras desta thread e abre o
+    orçamento de tempo das retentativas (supabase_rest.ORCAMENTO)."""
+    _execucao.memo = {}
+    _execucao.duplicadas = 0
+    _execucao.somente_leitura = False
+    iniciar_orcamento()
+    metricas.definir_pagina(None)
+
+def _memo() -> Optional[Dict[tuple, pd.DataFrame]]:
+    return getattr(_execucao, "memo", None)
+
+def _memo_get(chave: tuple) -> Optional[pd.DataFrame]:
+    memo = _memo()
+    if memo is None or chave not in memo:
+        return None
+    _execucao.duplicadas += 1
+    with _cache_lock:
+        _cache_stats["duplicadas"] += 1
+    logging.debug("leitura repetida absorvida no rerun: %s", chave[0])
+    return memo[chave].copy()
+
+def _memo_put(chave: tuple, df: pd.DataFrame) -> None:
+    memo = _memo()
+    if memo is not None:
+        memo[chave] = df.copy()
+
+def _memo_invalidar(tabela: Optional[str]) -> None:
+    memo = _memo()
+    if not memo:
+        return
+    if tabela is None:
+        memo.clear()
+    else:
+        for chave in [k for k in memo if _depende(k[0], tabela)]:
+            del memo[chave]
+
+def somente_leitura() -> bool:
+    """Supabase fora: circuito aberto ou dados servidos de cópia local neste rerun."""
+    return getattr(_execucao, "somente_leitura", False) or estado_circuito()["estado"] == "aberto"
+
+def leituras_duplicadas() -> int:
+    """Quantas leituras repetidas o memo absorveu no rerun atual."""
+    return getattr(_execucao, "duplicadas", 0)
+
+def invalidar_cache(tabela: Optional[str] = None) -> None:
+    """Descarta o cache de uma tabela (ou de todas, se tabela=None)."""
+    if tabela is not None:
+        tabela = _tabela_from_nome_arquivo(tabela)
+    _memo_invalidar(tabela)
+    with _cache_lock:
+        if tabela is None:
+            _cache.clear()
+        else:
+            for chave in [k for k in _cache if _depende(k[0], tabela)]:
+                del _cache[chave]
+        _cache_stats["invalidacoes"] += 1
+
+def estatisticas_cache() -> Dict[str, Any]:
+    with _cache_lock:
+        return {**_cache_stats, "entradas": len(_cache), "ttl": CACHE_TTL, "max": CACHE_MAX}
+
+@contextmanager
+def _escrita(tabela: str, remove: bool = False):
+    """
+    Invalida o cache da tabela ao fim de uma escrita (mesmo se falhar no meio).
+    remove=True: a escrita pode apagar linhas; o espelho confere as remoções
+    na próxima leitura (updates/inserts ele já pega pelo updated_at).
+    """
+    try:
+        yield
+    finally:
+        if remove:
+            espelho.pedir_reconciliacao(tabela)
+        invalidar_cache(tabela)
+
 # ==============================
 # HELPERS
 # ==============================
@@ -48,6 +312,14 @@ def _normalize_txt(x: Any) -> Any:
         return " ".join(x.split()).strip()
     return x
 
+def _coluna_inexistente(err: Exception) -> Optional[str]:
+    """Nome da coluna quando o PostgREST responde 42703 (coluna não existe)."""
+    msg = str(err)
+    if "42703" not in msg and "does not exist" not in msg:
+        return None
+    m = re.search(r'column\s+(?:"?\w+"?\.)?"?([^"\s]+?)"?\s+does not exist', msg)
+    return m.group(1) if m else None
+
 def _is_duplicate_error(err: Exception) -> bool:
     msg = str(err).lower()
     return (
@@ -85,49 +357,521 @@ def _ensure_cols(df, cols, defaults=None):
     except TypeError:
         return _ensure_columns(df, cols)
 
+# ==============================
+# PROJEÇÃO (select=col1,col2)
+# ==============================
+# Colunas pedidas pelas páginas que não existem no Supabase (descobertas
+# no 1º erro 42703); ficam fora do select e viram default no _ensure_columns.
+_COLUNAS_AUSENTES: Dict[str, set] = {}
+
+def _projecao(tabela: str, colunas: Optional[List[str]]) -> str:
+    if not colunas or "*" in colunas:
+        return "*"
+    ausentes = _COLUNAS_AUSENTES.get(tabela, set())
+    cols = [c for c in dict.fromkeys(colunas) if c not in ausentes]
+    return ",".join(cols) if cols else "*"
+
+def _paginas(tabela: str, colunas: Optional[List[str]], **kwargs) -> Iterator[Union[List[Dict[str, Any]], pd.DataFrame]]:
+    """
+    table_select_iter com select projetado. Se o servidor recusar uma coluna
+    inexistente, ela é memorizada como ausente e o select é refeito sem ela.
+    """
+    keyset = kwargs.pop("keyset", None)
+    while True:
+        select = _projecao(tabela, colunas)
+        if keyset in _COLUNAS_AUSENTES.get(tabela, set()):
+            keyset = None
+        entregou = False
+        try:
+            for pagina in table_select_iter(tabela, select=select, keyset=keyset, **kwargs):
+                entregou = True
+                yield pagina
+            return
+        except RuntimeError as e:
+            col = _coluna_inexistente(e)
+            if entregou or not col or (col not in select.split(",") and col != keyset):
+                raise
+            logging.warning("Coluna '%s' não existe em '%s'; removida do select", col, tabela)
+            _COLUNAS_AUSENTES.setdefault(tabela, set()).add(col)
+
+# Colunas opcionais já confirmadas pela sondagem do coluna_existe
+_COLUNAS_PRESENTES: Dict[str, set] = {}
+
+def coluna_existe(tabela: str, coluna: str) -> bool:
+    """
+    A coluna existe no Supabase? Para colunas de migração opcional (sql/)
+    antes de gravá-las: o frame do carregar_dados não serve de teste, já que
+    o _ensure_columns cria as pedidas e o espelho guarda select=*. Usa o que
+    o _paginas já descobriu e, na dúvida, sonda com select=coluna&limit=1.
+    """
+    if coluna in _COLUNAS_AUSENTES.get(tabela, set()):
+        return False
+    if coluna not in _COLUNAS_PRESENTES.get(tabela, set()):
+        try:
+            table_select(tabela, select=coluna, limit=1)
+        except RuntimeError as e:
+            if _coluna_inexistente(e) != coluna:
+                raise
+            _COLUNAS_AUSENTES.setdefault(tabela, set()).add(coluna)
+            return False
+        _COLUNAS_PRESENTES.setdefault(tabela, set()).add(coluna)
+    return True
+
 # ==============================
 # LOAD DATA
 # ==============================
 
-def carregar_dados(nome_arquivo_ou_tabela: str, colunas: List[str]) -> pd.DataFrame:
+def _montar_filtros(
+    filtros: Optional[Dict[str, Any]],
+    periodo: Optional[tuple],
+) -> Optional[Dict[str, Any]]:
+    """
+    Junta `filtros` (formato do `where` do supabase_rest) com
+    periodo=(coluna, inicio, fim), intervalo fechado; inicio/fim podem ser None.
+    Só serve para colunas date/timestamp no banco: em coluna texto o gte/lte
+    compara strings (reservas.data, com dd/mm/aaaa misturado, perde linhas).
+    """
+    where = dict(filtros or {})
+    if periodo:
+        col, inicio, fim = periodo
+        conds = []
+        if inicio is not None:
+            conds.append(("gte", inicio))
+        if fim is not None:
+            conds.append(("lte", fim))
+        if col in where:
+            atual = where[col]
+            if isinstance(atual, list):
+                conds = atual + conds
+            elif isinstance(atual, tuple):
+                conds = [atual] + conds
+            else:
+                conds = [("eq", atual)] + conds
+        if conds:
+            where[col] = conds
+    return where or None
+
+
+def _fase_dados(func):
+    """Conta o tempo da chamada como fase "dados" no perfil da página."""
+    @wraps(func)
+    def envolvida(*args, **kwargs):
+        with perfil.fase("dados"):
+            return func(*args, **kwargs)
+    return envolvida
+
+
+@_fase_dados
+def carregar_dados(
+    nome_arquivo_ou_tabela: str,
+    colunas: List[str],
+    chunksize: Optional[int] = None,
+    filtros: Optional[Dict[str, Any]] = None,
+    periodo: Optional[tuple] = None,
+) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+    """
+    Lê a tabela inteira (todas as páginas, sem o corte do max-rows), trazendo
+    do servidor só as `colunas` pedidas.
+    Com chunksize, retorna um gerador de DataFrames de até `chunksize` linhas,
+    para montar resultados de tabelas grandes com memória limitada.
+
+    filtros/periodo são aplicados no servidor, ex.:
+        carregar_dados(tabela, cols, periodo=("coluna_date", inicio, fim))   # coluna date/timestamptz
+        carregar_dados("reservas", cols, filtros={"status": ("in", ["Pendente", "Confirmada"])})
+    """
     tabela = _tabela_from_nome_arquivo(nome_arquivo_ou_tabela)
+    where = _montar_filtros(filtros, periodo)
+
+    if chunksize:
+        return _carregar_em_blocos(tabela, colunas, chunksize, where)
+
+    chave = _chave_cache(tabela, colunas, where)
+    df = _guardado(chave)
+    if df is not None:
+        return df
+
+    try:
+        df = _buscar(tabela, colunas, where)
+    except Exception as e:
+        return _falha_carga(tabela, colunas, e, chave)
+    _guardar(chave, df)
+    return df
+
+
+def _guardado(chave: tuple) -> Optional[pd.DataFrame]:
+    """Procura no memo do rerun e depois no cache com TTL."""
+    df = _memo_get(chave)
+    if df is None:
+        df = _cache_get(chave)
+        if df is not None:
+            _memo_put(chave, df)
+    return df
+
+
+def _guardar(chave: tuple, df: pd.DataFrame) -> None:
+    _cache_put(chave, df)
+    _memo_put(chave, df)
+
+
+def _buscar(tabela: str, colunas: List[str], where: Optional[Dict[str, Any]]) -> pd.DataFrame:
+    """Lê todas as páginas. Levanta exceção em caso de erro (seguro em threads)."""
+    chave = CHAVES_TABELAS.get(tabela)
+    if where is None and espelho.ativo(tabela, chave):
+        # só o delta desde a última leitura; o resto vem do espelho local
+        df = espelho.sincronizar(tabela, chave)
+        if df is not None:
+            return tipar(_ensure_columns(df, colunas), tabela)
+    # paginação pela chave (ordem estável entre páginas); offset sem ORDER BY
+    # pode repetir ou pular linhas, ainda mais com escritas no meio da leitura
+    if CARGA_COLUNAR:
+        paginas = list(_paginas(tabela, colunas, where=where, keyset=chave, colunar=True))
+        df = pd.concat(paginas, ignore_index=True) if paginas else pd.DataFrame()
+    else:
+        dados: List[Dict[str, Any]] = []
+        for pagina in _paginas(tabela, colunas, where=where, keyset=chave):
+            dados.extend(pagina)
+        df = pd.DataFrame(dados)
+    if chave and chave in df.columns and colunas and "*" not in colunas and chave not in colunas:
+        df = df.drop(columns=[chave])    # o keyset entrou no select só para paginar
+    return tipar(_ensure_columns(df, colunas), tabela)
+
+
+def _buscar_em_thread(prazo: Optional[float], pagina: Optional[str], *args) -> pd.DataFrame:
+    # threading.local não passa para o pool: repassa prazo e rótulo da página
+    definir_prazo(prazo)
+    metricas.definir_pagina(pagina)
+    return _buscar(*args)
+
+
+def _falha_carga(tabela: str, colunas: List[str], e: Exception, chave: tuple) -> pd.DataFrame:
+    """
+    Backend fora (circuito aberto, timeout, 5xx): serve a última leitura em
+    cache, mesmo vencida, com um aviso. Sem cache (ou erro de outro tipo):
+    st.error e DataFrame vazio.
+    """
+    if erro_transitorio(e):
+        guardado = _cache_vencido(chave)
+        if guardado is None and chave[2] == _chave_cache(tabela, None, None)[2]:
+            guardado = espelho.ler(tabela)   # sobrevive a restart do app
+            if guardado is not None:
+                guardado = (guardado[0], tipar(_ensure_columns(guardado[1], colunas), tabela))
+        if guardado is not None:
+            gravado_em, df = guardado
+            logging.warning("Supabase indisponível, servindo cópia local de %s: %s", tabela, e)
+            _execucao.somente_leitura = True
+            st.warning(
+                f"⚠️ Supabase indisponível — modo somente leitura, exibindo {tabela} de "
+                f"{time.strftime('%d/%m %H:%M:%S', time.localtime(gravado_em))}."
+            )
+            _memo_put(chave, df)
+            return df
+    logging.error("Erro ao carregar dados de %s", tabela, exc_info=e)
+    st.error(f"Erro ao carregar dados de {tabela}: {e}")
+    return tipar(_ensure_columns(pd.DataFrame(), colunas), tabela)
+
+
+@_fase_dados
+def carregar_varios(
+    pedidos: Dict[str, Union[List[str], Dict[str, Any]]],
+    max_workers: int = CARGA_PARALELA,
+) -> Dict[str, pd.DataFrame]:
+    """
+    Carrega várias tabelas ao mesmo tempo (pool de threads limitado), para a
+    abertura da página custar ~1 ida e volta em vez da soma de todas.
+
+    `pedidos` mapeia nome -> colunas, ou nome -> kwargs do carregar_dados
+    (colunas, filtros, periodo e, opcionalmente, "tabela" quando o nome do
+    resultado for outro):
+        d = carregar_varios({
+            "veiculos": ["placa", "modelo"],
+            "pendentes": {"tabela": "reservas", "colunas": cols, "filtros": {"status": "Pendente"}},
+        })
+
+    Mesma semântica de erro do carregar_dados: a tabela que falhar vem como
+    DataFrame vazio (com as colunas pedidas) e o st.error sai na thread
+    principal.
+    """
+    planos: Dict[str, tuple] = {}
+    resultado: Dict[str, pd.DataFrame] = {}
+
+    for nome, pedido in pedidos.items():
+        opcoes = pedido if isinstance(pedido, dict) else {"colunas": pedido}
+        tabela = _tabela_from_nome_arquivo(opcoes.get("tabela", nome))
+        colunas = opcoes.get("colunas")
+        where = _montar_filtros(opcoes.get("filtros"), opcoes.get("periodo"))
+        chave = _chave_cache(tabela, colunas, where)
+        df = _guardado(chave)
+        if df is not None:
+            resultado[nome] = df
+        else:
+            planos[nome] = (tabela, colunas, where, chave)
+
+    # a mesma leitura pedida sob dois nomes vai ao servidor uma vez só
+    por_chave: Dict[tuple, List[str]] = {}
+    for nome, plano in planos.items():
+        por_chave.setdefault(plano[3], []).append(nome)
+
+    if por_chave:
+        trabalhadores = max(1, min(max_workers, len(por_chave)))
+        with ThreadPoolExecutor(max_workers=trabalhadores, thread_name_prefix="carregar_varios") as pool:
+            prazo, pagina = prazo_atual(), metricas.pagina_atual()
+            futuros = {
+                chave: pool.submit(_buscar_em_thread, prazo, pagina, *planos[nomes[0]][:3])
+                for chave, nomes in por_chave.items()
+            }
+        for chave, futuro in futuros.items():
+            nomes = por_chave[chave]
+            tabela, colunas = planos[nomes[0]][:2]
+            try:
+                df = futuro.result()
+            except Exception as e:
+                df = _falha_carga(tabela, colunas, e, chave)
+            else:
+                _guardar(chave, df)
+            resultado[nomes[0]] = df
+            for outro in nomes[1:]:
+                resultado[outro] = df.copy()
+
+    return {nome: resultado[nome] for nome in pedidos}
+
+
+# Funções de AGREGADOS que o banco não tem (404 no 1º RPC): não são
+# chamadas de novo; a página agrega a partir das linhas.
+_AGREGADOS_AUSENTES: set = set()
+
+def _funcao_inexistente(err: Exception) -> bool:
+    msg = str(err)
+    return "PGRST202" in msg or ": 404 " in msg
+
 
+@_fase_dados
+def carregar_agregado(funcao: str, args: Optional[Dict[str, Any]] = None) -> Optional[pd.DataFrame]:
+    """
+    Resultado da função SQL `funcao` (sql/indicadores.sql) via RPC, já
+    agrupado no servidor; usa o mesmo memo/cache do carregar_dados.
+    Retorna None se a função não existir ou a chamada falhar (sem cache para
+    servir): quem chama calcula a partir das linhas.
+    """
+    if funcao in _AGREGADOS_AUSENTES:
+        return None
+    chave = _chave_cache(f"rpc/{funcao}", None, args)
+    df = _guardado(chave)
+    if df is not None:
+        return df
+
+    try:
+        df = pd.DataFrame(rpc(funcao, args))
+    except Exception as e:
+        if _funcao_inexistente(e):
+            logging.warning("Função '%s' não existe no banco; agregando no app (ver sql/indicadores.sql)", funcao)
+            _AGREGADOS_AUSENTES.add(funcao)
+            return None
+        guardado = _cache_vencido(chave) if erro_transitorio(e) else None
+        if guardado is not None:
+            _memo_put(chave, guardado[1])
+            return guardado[1]
+        logging.error("Erro no agregado %s", funcao, exc_info=e)
+        return None
+    _guardar(chave, df)
+    return df
+
+
+def _carregar_em_blocos(
+    tabela: str,
+    colunas: List[str],
+    chunksize: int,
+    where: Optional[Dict[str, Any]] = None,
+) -> Iterator[pd.DataFrame]:
     try:
-        dados = table_select(tabela)
-        df = pd.DataFrame(dados if dados else [])
+        for pagina in _paginas(
+            tabela, colunas, where=where, page_size=chunksize, keyset=CHAVES_TABELAS.get(tabela)
+        ):
+            yield tipar(_ensure_columns(pd.DataFrame(pagina), colunas), tabela)
     except Exception as e:
         logging.exception("Erro ao carregar dados")
         st.error(f"Erro ao carregar dados de {tabela}: {e}")
-        df = pd.DataFrame()
-
-    return _ensure_columns(df, colunas)
 
 # ==============================
 # PREPARE DF
 # ==============================
 
-def _prepare_df_for_rest(df: pd.DataFrame) -> pd.DataFrame:
+# Tipos que infer_dtype devolve para colunas object com texto (o .str aceita)
+_INFER_TEXTO = {"string", "mixed", "mixed-integer", "empty"}
+
+def _normalize_txt_serie(s: pd.Series) -> pd.Series:
+    """_normalize_txt vetorizado: colapsa espaços só nos valores str; os demais passam."""
+    try:
+        txt = s.str.replace(r"\s+", " ", regex=True).str.strip()
+    except AttributeError:   # sem nenhum str (ex.: só dict/list de colunas json)
+        return s
+    return txt.where(txt.notna(), s)
+
+def _data_rest(x: Any) -> Any:
     from datetime import date, datetime
+    if isinstance(x, (date, datetime)) and not pd.isna(x):
+        return x.strftime("%Y-%m-%d")
+    return x
 
+def _valores_rest(s: pd.Series) -> pd.Series:
+    """Coluna object/category: datas -> "aaaa-mm-dd", texto normalizado."""
+    tipo = pd.api.types.infer_dtype(s, skipna=True)
+    if tipo in ("date", "datetime"):
+        return pd.to_datetime(s, errors="coerce").dt.strftime("%Y-%m-%d")
+    if tipo in _INFER_TEXTO:
+        if tipo == "mixed":
+            # texto misturado com date/datetime (linhas editadas na página)
+            s = s.map(_data_rest)
+        return _normalize_txt_serie(s)
+    return s
+
+def _prepare_df_for_rest(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Frame pronto para virar JSON, coluna a coluna pelo dtype (sem passar
+    célula a célula): datas -> "aaaa-mm-dd", texto com espaços colapsados,
+    category/Int64/boolean -> object. Texto, datas em objeto e category são
+    convertidos só nos valores distintos (factorize) e expandidos pelos
+    códigos. Nulos ficam NaN/None e viram null no _json_registros.
+    """
     out = df.copy()
 
     for col in out.columns:
-        if pd.api.types.is_datetime64_any_dtype(out[col]):
-            out[col] = out[col].dt.strftime("%Y-%m-%d")
-        elif out[col].dtype == object:
-            out[col] = out[col].apply(
-                lambda x: x.strftime("%Y-%m-%d")
-                if isinstance(x, (date, datetime))
-                else _normalize_txt(x)
-            )
+        s = out[col]
+        if pd.api.types.is_datetime64_any_dtype(s):
+            if getattr(s.dt, "tz", None) is not None:
+                s = s.dt.tz_localize(None)
+            dias = np.datetime_as_string(s.to_numpy(dtype="datetime64[D]"), unit="D").astype(object)
+            dias[s.isna().to_numpy()] = None
+            out[col] = pd.Series(dias, index=s.index)
+            continue
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            codigos, distintos = s.cat.codes.to_numpy(), pd.Series(s.cat.categories, dtype=object)
+        elif pd.api.types.is_extension_array_dtype(s.dtype):
+            out[col] = s.astype(object).where(s.notna(), None)
+            continue
+        elif s.dtype == object and pd.api.types.infer_dtype(s, skipna=True) in ("string", "date", "datetime"):
+            codigos, distintos = pd.factorize(s)
+            distintos = pd.Series(distintos, dtype=object)
+        else:
+            if s.dtype == object:
+                s = _valores_rest(s)
+            out[col] = s
+            continue
+        valores = _valores_rest(distintos).to_numpy(dtype=object)
+        valores = valores.take(codigos) if len(valores) else np.full(len(codigos), None, dtype=object)
+        valores[codigos < 0] = None
+        out[col] = pd.Series(valores, index=s.index)
 
-    out = out.where(pd.notnull(out), None)
     return out
 
+def _json_registros(df: pd.DataFrame) -> bytes:
+    """
+    Registros JSON (bytes) de um frame já preparado, direto do serializador
+    do pandas (sem to_dict por linha). NaN/NaT/None viram null.
+    """
+    return df.to_json(orient="records", force_ascii=False, double_precision=15).encode("utf-8")
+
 # ==============================
 # SAVE DATA
 # ==============================
 
+# Tabelas cuja chave do registro não tem UNIQUE no banco (upsert com
+# on_conflict devolve 42P10); nelas o upsert volta a usar só a PK.
+_SEM_ON_CONFLICT: set = set()
+
+def _sem_unique_error(err: Exception) -> bool:
+    msg = str(err)
+    return "42P10" in msg or "no unique or exclusion constraint" in msg.lower()
+
+def _gravar_em_lotes(
+    tabela: str,
+    registros: Union[List[Dict[str, Any]], pd.DataFrame],
+    modo: str = "upsert",                 # "upsert" | "insert" | "update"
+    on_conflict: Optional[str] = None,
+    lote: int = LOTE_SALVAR,
+) -> int:
+    """
+    Envia os registros em lotes (Prefer: return=minimal).
+    Lote recusado -> reenvia linha a linha para isolar a(s) linha(s) ruim(ns);
+    as boas são gravadas e, se sobrar alguma rejeitada, levanta RuntimeError.
+    Falha transitória (circuito aberto, 5xx, timeout) interrompe na hora.
+    Retorna quantas linhas foram gravadas.
+
+    `registros` pode ser o próprio frame preparado (_prepare_df_for_rest):
+    cada lote vai como JSON gerado direto do frame (_json_registros).
+
+    modo="update": upsert por `on_conflict` de linhas que já existem; se a
+    chave não tiver UNIQUE no banco, cai para PATCH por chave (linha a linha).
+    """
+    def _corpo(bloco):
+        return _json_registros(bloco) if isinstance(bloco, pd.DataFrame) else bloco
+
+    def _linhas(bloco):
+        if isinstance(bloco, pd.DataFrame):
+            return [bloco.iloc[k:k + 1] for k in range(len(bloco))]
+        return [[reg] for reg in bloco]
+
+    def _patch_por_chave(bloco) -> None:
+        if isinstance(bloco, pd.DataFrame):
+            bloco = json.loads(_json_registros(bloco))
+        for reg in bloco:
+            valores = {k: v for k, v in reg.items() if k != on_conflict}
+            table_update(tabela, {on_conflict: reg[on_conflict]}, valores)
+
+    def _enviar(bloco) -> None:
+        nonlocal on_conflict
+        if modo == "insert":
+            table_insert(tabela, _corpo(bloco))
+            return
+        if modo == "update" and tabela in _SEM_ON_CONFLICT:
+            _patch_por_chave(bloco)
+            return
+        try:
+            table_upsert(tabela, _corpo(bloco), on_conflict=on_conflict)
+        except RuntimeError as e:
+            if not (on_conflict and _sem_unique_error(e)):
+                raise
+            _SEM_ON_CONFLICT.add(tabela)
+            if modo == "update":
+                logging.warning("'%s' sem UNIQUE em '%s'; PATCH por chave", on_conflict, tabela)
+                _patch_por_chave(bloco)
+                return
+            logging.warning("'%s' sem UNIQUE em '%s'; upsert pela PK", on_conflict, tabela)
+            on_conflict = None
+            table_upsert(tabela, _corpo(bloco))
+
+    gravados = 0
+    rejeitados = 0
+    lote = max(1, int(lote))
+    for n, i in enumerate(range(0, len(registros), lote), start=1):
+        bloco = registros[i:i + lote]
+        try:
+            _enviar(bloco)
+            gravados += len(bloco)
+            continue
+        except Exception as e:
+            if erro_transitorio(e):
+                # backend fora do ar: linha a linha só multiplicaria as falhas
+                raise
+            logging.exception("Lote %d de '%s' recusado", n, tabela)
+            st.warning(f"⚠️ Lote {n} de '{tabela}' ({len(bloco)} linhas) recusado: {e}")
+            if len(bloco) == 1:
+                rejeitados += 1
+                continue
+
+        # isola a(s) linha(s) com problema
+        for linha in _linhas(bloco):
+            try:
+                _enviar(linha)
+                gravados += 1
+            except Exception as e:
+                rejeitados += 1
+                reg = json.loads(_json_registros(linha))[0] if isinstance(linha, pd.DataFrame) else linha[0]
+                st.error(f"Linha rejeitada em '{tabela}': {reg} — {e}")
+
+    if rejeitados:
+        raise RuntimeError(f"{rejeitados} linha(s) rejeitada(s) ao salvar '{tabela}'")
+    return gravados
+
 def salvar_dados(df: pd.DataFrame, nome_tabela: str) -> None:
     tabela = _tabela_from_nome_arquivo(nome_tabela)
 
@@ -140,25 +884,178 @@ def salvar_dados(df: pd.DataFrame, nome_tabela: str) -> None:
     if "id" in df.columns:
         df = df.drop(columns=["id"])
 
-    registros = df.to_dict(orient="records")
-
     # CHECKLIST → HISTÓRICO
     if tabela == "checklist":
-        for reg in registros:
-            try:
-                table_insert(tabela, [reg])
-            except Exception as e:
-                st.error(f"Erro checklist: {e}")
-                raise
-        return
-
-    # PADRÃO
-    for reg in registros:
         try:
-            table_upsert(tabela, [reg])
+            with _escrita(tabela):
+                _gravar_em_lotes(tabela, df, modo="insert")
         except Exception as e:
-            st.error(f"Erro ao salvar: {e}")
+            st.error(f"Erro checklist: {e}")
             raise
+        return
+
+    # PADRÃO
+    chave = CHAVES_TABELAS.get(tabela)
+    on_conflict = chave if chave in df.columns and tabela not in _SEM_ON_CONFLICT else None
+    if on_conflict:
+        # a mesma chave 2x no lote quebra o ON CONFLICT (21000); vale a última,
+        # como no antigo envio linha a linha
+        df = df.drop_duplicates(subset=[on_conflict], keep="last")
+    try:
+        with _escrita(tabela):
+            _gravar_em_lotes(tabela, df, on_conflict=on_conflict)
+    except Exception as e:
+        st.error(f"Erro ao salvar: {e}")
+        raise
+
+# ==============================
+# SAVE DIFF (só o que mudou)
+# ==============================
+
+def _canon(v: Any) -> Any:
+    """Valor comparável entre o snapshot do banco e o DataFrame editado."""
+    if v is None:
+        return None
+    if isinstance(v, (bool, np.bool_)):
+        return bool(v)
+    if isinstance(v, (int, float, np.number)):
+        return None if pd.isna(v) else float(v)
+    s = str(v).strip()
+    if s in ("", "NaT", "nan", "None"):
+        return None
+    try:
+        return float(s)
+    except ValueError:
+        return s
+
+def _registros_rest(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    # ida e volta pelo JSON: nulos já saem None, sem varrer registro a registro
+    return json.loads(_json_registros(_prepare_df_for_rest(df)))
+
+def salvar_alteracoes(
+    df: pd.DataFrame,
+    nome_tabela: str,
+    original: Optional[pd.DataFrame],
+    chave: Optional[str] = None,
+) -> Dict[str, int]:
+    """
+    Grava só a diferença entre `df` (editado) e `original` (snapshot tirado
+    logo após o carregar_dados, antes de qualquer edição).
+
+    - Com chave (CHAVES_TABELAS ou `chave=`) presente nos dois frames:
+      chave nova/nula -> insert; chave existente com valores diferentes ->
+      upsert em lote (on_conflict=chave); chave que sumiu -> delete in.(...).
+    - Sem chave: compara linhas inteiras (multiconjunto) e só insere as
+      novas. Se alguma linha sumiu ou mudou, levanta RuntimeError antes de
+      gravar: o snapshot vem tipado (datas, valores) e um delete filtrando
+      por todas as colunas não casa com o texto cru do banco. Tabela com
+      edição/exclusão precisa de chave em CHAVES_TABELAS, carregada na página.
+
+    Levanta RuntimeError também se uma linha do `original` vier sem chave
+    (só as novas podem) ou se um delete por chave remover um número de
+    linhas diferente do esperado (linha já apagada, chave errada). Chave
+    ausente no banco (_COLUNAS_AUSENTES) segue a regra do caso sem chave.
+
+    Retorna {"inseridos": n, "atualizados": n, "removidos": n}.
+    """
+    tabela = _tabela_from_nome_arquivo(nome_tabela)
+    with _escrita(tabela, remove=True):
+        return _salvar_diff(df, tabela, original, chave)
+
+def _salvar_diff(
+    df: Optional[pd.DataFrame],
+    tabela: str,
+    original: Optional[pd.DataFrame],
+    chave: Optional[str],
+) -> Dict[str, int]:
+    resumo = {"inseridos": 0, "atualizados": 0, "removidos": 0}
+
+    if df is None:
+        df = pd.DataFrame()
+    if original is None:
+        original = pd.DataFrame(columns=df.columns)
+
+    chave = chave or CHAVES_TABELAS.get(tabela)
+    if chave and chave in _COLUNAS_AUSENTES.get(tabela, set()):
+        # a coluna só está nos frames pelo _ensure_columns: segue como sem chave
+        df = df.drop(columns=[chave], errors="ignore")
+        original = original.drop(columns=[chave], errors="ignore")
+        chave = None
+
+    cols = [c for c in df.columns if c in original.columns] if not original.empty else list(df.columns)
+    novos = _registros_rest(df) if not df.empty else []
+    antigos = _registros_rest(original[cols]) if not original.empty and cols else []
+
+    if chave and chave in df.columns and (original.empty or chave in original.columns):
+        # só linha nova (do editor) pode vir sem chave; no snapshot ela não
+        # casaria com nada e cada save duplicaria a linha
+        sem_chave = sum(1 for r in antigos if _canon(r.get(chave)) is None)
+        if sem_chave:
+            raise RuntimeError(
+                f"[salvar] {tabela}: {sem_chave} linha(s) do snapshot sem '{chave}'; "
+                f"carregue a chave junto com as colunas"
+            )
+        antes = {_canon(r[chave]): r for r in antigos}
+        inserir, atualizar, vistos = [], [], set()
+        for reg in novos:
+            k = _canon(reg.get(chave))
+            if k is None:
+                inserir.append({c: v for c, v in reg.items() if c != chave})
+            elif k not in antes:
+                inserir.append(reg)
+            else:
+                vistos.add(k)
+                velho = antes[k]
+                if any(_canon(reg.get(c)) != _canon(velho.get(c)) for c in cols):
+                    atualizar.append(reg)
+        remover = [antes[k][chave] for k in antes if k not in vistos]
+
+        # inserts com e sem chave têm conjuntos de colunas diferentes
+        com_chave = [r for r in inserir if chave in r]
+        sem_chave = [r for r in inserir if chave not in r]
+        if com_chave:
+            resumo["inseridos"] += _gravar_em_lotes(tabela, com_chave, modo="insert")
+        if sem_chave:
+            resumo["inseridos"] += _gravar_em_lotes(tabela, sem_chave, modo="insert")
+        if atualizar:
+            resumo["atualizados"] = _gravar_em_lotes(
+                tabela, atualizar, modo="update", on_conflict=chave
+            )
+        for i in range(0, len(remover), 200):
+            bloco = remover[i:i + 200]
+            resumo["removidos"] += table_delete(tabela, {chave: ("in", bloco)})
+        if resumo["removidos"] != len(remover):
+            raise RuntimeError(
+                f"[delete] {tabela}: {resumo['removidos']} linha(s) removida(s), esperadas {len(remover)}"
+            )
+        return resumo
+
+    # Sem chave: diferença de multiconjuntos de linhas
+    from collections import Counter
+
+    def _assinatura(reg: Dict[str, Any]) -> tuple:
+        return tuple(_canon(reg.get(c)) for c in cols)
+
+    saldo = Counter(_assinatura(r) for r in antigos)
+    inserir = []
+    for reg in novos:
+        a = _assinatura(reg)
+        if saldo[a] > 0:
+            saldo[a] -= 1
+        else:
+            inserir.append(reg)
+
+    sumiram = sum(saldo.values())
+    if sumiram:
+        raise RuntimeError(
+            f"[delete] {tabela}: {sumiram} linha(s) editada(s)/removida(s) sem chave; "
+            f"a coluna de CHAVES_TABELAS ({CHAVES_TABELAS.get(tabela) or 'nenhuma definida'}) "
+            f"precisa existir no banco e vir na carga"
+        )
+
+    if inserir:
+        resumo["inseridos"] = _gravar_em_lotes(tabela, inserir, modo="insert")
+    return resumo
 
 # ==============================
 # CRUD AUX
@@ -183,26 +1080,8 @@ def deletar_por_filtro(tabela_ou_csv: str, filtro: Dict[str, Any]) -> None:
 # DISTÂNCIA
 # ==============================
 
-def calcular_distancia_km(cep_origem, cep_destino):
-    try:
-        cep_origem = re.sub(r"\D", "", str(cep_origem))
-        cep_destino = re.sub(r"\D", "", str(cep_destino))
-
-        url = f"https://nominatim.openstreetmap.org/search?postalcode={cep_destino}&country=Brazil&format=json"
-
-        r = requests.get(url, headers={"User-Agent": "App"})
-        if r.status_code == 200 and r.json():
-            destino = r.json()[0]
-            lat2 = float(destino["lat"])
-            lon2 = float(destino["lon"])
-        else:
-            return None
-
-        # simplificado (sem geopy)
-        return 0
-
-    except:
-        return None
+# cache persistente CEP -> coordenadas em geocodificacao.py
+from geocodificacao import calcular_distancia_km  # noqa: E402,F401
 
 # ==============================
 # FUNÇÕES QUE SEU APP ESPERA
@@ -212,7 +1091,8 @@ def inserir_um(tabela_ou_csv: str, registro: Dict[str, Any]) -> None:
     tabela = _tabela_from_nome_arquivo(tabela_ou_csv)
     reg = {k: _normalize_txt(v) for k, v in registro.items()}
     try:
-        table_insert(tabela, [reg])
+        with _escrita(tabela):
+            table_insert(tabela, [reg])
     except Exception as e:
         if _is_duplicate_error(e):
             return
@@ -227,7 +1107,8 @@ def inserir_peca_unica(brinquedo: str, item: str) -> bool:
         return False
 
     try:
-        table_insert("pecas_brinquedos", [{"Brinquedo": b, "Item": i}])
+        with _escrita("pecas_brinquedos"):
+            table_insert("pecas_brinquedos", [{"Brinquedo": b, "Item": i}])
         return True
     except Exception as e:
         if _is_duplicate_error(e):
@@ -238,7 +1119,8 @@ def inserir_peca_unica(brinquedo: str, item: str) -> bool:
 def atualizar_um(tabela_ou_csv: str, filtro: Dict[str, Any], campos: Dict[str, Any]) -> None:
     tabela = _tabela_from_nome_arquivo(tabela_ou_csv)
     novos = {k: _normalize_txt(v) for k, v in campos.items()}
-    table_update(tabela, filtro, novos)
+    with _escrita(tabela):
+        table_update(tabela, filtro, novos)
 
 
 def atualizar_por_filtro(tabela_ou_csv: str, novos_dados: dict, filtro: dict) -> None:
@@ -247,4 +1129,5 @@ def atualizar_por_filtro(tabela_ou_csv: str, novos_dados: dict, filtro: dict) ->
 
 def deletar_por_filtro(tabela_ou_csv: str, filtro: Dict[str, Any]) -> None:
     tabela = _tabela_from_nome_arquivo(tabela_ou_csv)
-    table_delete(tabela, filtro)
+    with _escrita(tabela, remove=True):
+        table_delete(tabela, filtro)
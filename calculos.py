@@ -0,0 +1,449 @@
+# calculos.py
+# Regras de negócio das páginas sem Streamlit: preparo dos DataFrames,
+# disponibilidade de brinquedos, indicadores mensais e estado do check-list.
+# O app chama estas funções; os benchs (ferramentas/bench_paginas.py) também,
+# sem precisar de navegador nem de Supabase.
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+# ==============================
+# TEXTO / DATAS
+# ==============================
+
+def normalizar_nome(txt) -> str:
+    """Normaliza nome para comparar disponibilidade (sem acento/pontuação)."""
+    if not isinstance(txt, str):
+        return ""
+    txt = txt.lower().strip()
+    txt = unicodedata.normalize("NFKD", txt).encode("ascii", "ignore").decode("utf-8")
+    txt = re.sub(r"[^a-z0-9]+", " ", txt)
+    return txt.strip()
+
+
+def normalizar_nomes(serie: pd.Series) -> pd.Series:
+    """normalizar_nome de uma coluna inteira, vetorizado (não texto -> "")."""
+    texto = serie.astype(object)
+    texto = texto.where([isinstance(v, str) for v in texto], "").astype(str)
+    texto = (
+        texto.str.lower().str.strip().str.normalize("NFKD")
+        .str.encode("ascii", "ignore").str.decode("utf-8")
+    )
+    return texto.str.replace(r"[^a-z0-9]+", " ", regex=True).str.strip()
+
+
+def lista_brinquedos(texto) -> List[str]:
+    """'Pula-pula, Piscina de bolinhas' -> ['Pula-pula', 'Piscina de bolinhas']."""
+    return [b.strip() for b in str(texto).split(",") if b.strip()]
+
+
+# Texto livre no Supabase -> data/número. As regras são as mesmas de
+# public.data_segura / public.num_seguro (sql/indicadores.sql) e do
+# servidor_local, para o RPC e o fallback em Python darem o mesmo total:
+# mudar uma delas é mudar as três.
+#
+# Datas: 1º pedaço do texto (até o espaço) casado com um dos padrões, na ordem;
+# o resto (ou data impossível, ex. 31/02) vira NaT. Ano com 2 dígitos segue o
+# Postgres: aa < 70 -> 20aa, senão 19aa.
+FORMATOS_DATA = (
+    (r"\d{4}-\d{2}-\d{2}", "%Y-%m-%d"),        # só o prefixo: aceita "aaaa-mm-ddThh:mm..."
+    (r"\d{1,2}/\d{1,2}/\d{4}$", "%d/%m/%Y"),
+    (r"\d{1,2}-\d{1,2}-\d{4}$", "%d-%m-%Y"),
+    (r"\d{1,2}/\d{1,2}/\d{2}$", "%d/%m/%y"),
+)
+# Números: sem "R$" inicial; se tiver vírgula é formato brasileiro
+# ("1.200,50" -> 1200.50); depois disso só o padrão abaixo é número.
+NUMERO_TEXTO = r"[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?"
+VERDADEIROS = {"true", "1", "sim", "yes", "y", "verdadeiro", "pago", "ok", "on", "t"}
+
+
+def para_data(serie: pd.Series) -> pd.Series:
+    """
+    Coluna -> datetime64 normalizado (sem hora, sem fuso); inválidas viram NaT.
+    Uma passada vetorizada por formato, só sobre o que ainda não foi lido.
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        if getattr(serie.dt, "tz", None) is not None:
+            serie = serie.dt.tz_localize(None)
+        return serie.dt.normalize()
+    texto = serie.astype("string").str.strip(" \t\r\n").str.split(" ", n=1).str[0]
+    out = pd.Series(pd.NaT, index=serie.index, dtype="datetime64[ns]")
+    livre = texto.notna()
+    for padrao, fmt in FORMATOS_DATA:
+        casa = livre & texto.str.match(padrao, na=False)
+        if not casa.any():
+            continue
+        livre &= ~casa
+        t = texto[casa]
+        if fmt == "%Y-%m-%d":
+            t = t.str[:10]
+        elif fmt == "%d/%m/%y":
+            # pandas vira o século em 69 (%y); o Postgres, em 70
+            dm, aa = t.str[:-2], t.str[-2:].astype(int)
+            t = dm + (aa.where(aa >= 70, aa + 100) + 1900).astype(str)
+            fmt = "%d/%m/%Y"
+        out[casa] = pd.to_datetime(t, format=fmt, errors="coerce")
+    return out
+
+
+def _texto_numero(serie: pd.Series) -> pd.Series:
+    """Coluna -> float pelas regras de NUMERO_TEXTO; o que não casa vira NaN."""
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype(float)
+    s = serie.astype("string").str.strip(" \t\r\n").str.replace(r"^R\$\s*", "", regex=True)
+    virgula = s.str.contains(",", regex=False, na=False)
+    if virgula.any():
+        s = s.mask(virgula, s.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    s = s.where(s.str.fullmatch(NUMERO_TEXTO, na=False))
+    return pd.to_numeric(s.astype(object), errors="coerce").astype(float)
+
+
+def para_dinheiro(serie: pd.Series) -> pd.Series:
+    """Coluna -> float ("R$ 1.200,50" -> 1200.5); vazios e não numéricos viram 0.0."""
+    return _texto_numero(serie).fillna(0.0)
+
+
+def para_numero(serie: pd.Series) -> pd.Series:
+    """Coluna -> float; vazios e não numéricos viram NaN (ausente, não zero)."""
+    return _texto_numero(serie)
+
+
+def para_inteiro(serie: pd.Series) -> pd.Series:
+    """Coluna -> Int64 (inteiro com nulo); não numéricos viram <NA>."""
+    return _texto_numero(serie).round().astype("Int64")
+
+
+def para_bool(serie: pd.Series) -> pd.Series:
+    """Coluna -> bool ("sim", "true", "pago", 1... são verdadeiros)."""
+    if pd.api.types.is_bool_dtype(serie):
+        return serie.fillna(False).astype(bool)
+    return serie.astype(str).str.strip().str.lower().isin(VERDADEIROS)
+
+
+# ==============================
+# RESERVAS / DISPONIBILIDADE
+# ==============================
+
+COLS_NUM_RESERVAS = ["valor_total", "valor_extra", "frete", "desconto", "sinal", "falta"]
+COLS_TEXTO_RESERVAS = [
+    "cliente", "brinquedos", "horario_entrega", "horario_retirada",
+    "inicio_festa", "fim_festa", "observacao", "status", "pagamentos", "data",
+]
+
+
+def preparar_reservas(
+    brinquedos: pd.DataFrame,
+    clientes: pd.DataFrame,
+    reservas: pd.DataFrame,
+    col_brinquedos: Iterable[str],
+    col_clientes: Iterable[str],
+    col_reservas: Iterable[str],
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Preparo da página de Reservas: nomes de coluna, colunas faltantes, datas e números."""
+    brinquedos.columns = [c.lower().strip() for c in brinquedos.columns]
+    clientes.columns = [c.lower().strip() for c in clientes.columns]
+    reservas.columns = [c.lower().strip() for c in reservas.columns]
+
+    for c in col_brinquedos:
+        if c not in brinquedos.columns:
+            brinquedos[c] = "" if c not in ["valor"] else 0.0
+    for c in col_clientes:
+        if c not in clientes.columns:
+            clientes[c] = ""
+    for c in col_reservas:
+        if c not in reservas.columns:
+            reservas[c] = "" if c in COLS_TEXTO_RESERVAS else 0.0
+
+    # já tipados quando vêm do carregar_dados (banco.ESQUEMAS); aqui é no-op
+    reservas["data"] = para_data(reservas["data"])
+    for c in COLS_NUM_RESERVAS:
+        reservas[c] = para_dinheiro(reservas[c])
+    brinquedos["valor"] = para_dinheiro(brinquedos["valor"])
+
+    # id numérico quando vier como texto/float
+    if "id" in reservas.columns:
+        reservas["id"] = para_inteiro(reservas["id"])
+    return brinquedos, clientes, reservas
+
+
+def brinquedos_ocupados(reservas: pd.DataFrame, data, ignorar: Iterable[str] = ()) -> Set[str]:
+    """
+    Nomes normalizados dos brinquedos reservados em `data`, menos os de
+    `ignorar` (os da própria reserva, quando se está editando).
+    """
+    reservados_no_dia = reservas.loc[reservas["data"] == data, "brinquedos"].dropna().tolist()
+    ocupados: Set[str] = set()
+    for r in reservados_no_dia:
+        ocupados.update(normalizar_nome(b) for b in str(r).split(",") if b.strip())
+    return ocupados - {normalizar_nome(b) for b in ignorar}
+
+
+def preparar_estoque(reservas: pd.DataFrame) -> pd.DataFrame:
+    """Preparo da página de Estoque: datas das reservas."""
+    if "data" in reservas.columns:
+        reservas["data"] = para_data(reservas["data"])
+    return reservas
+
+
+def disponibilidade_por_data(brinquedos: pd.DataFrame, reservas: pd.DataFrame, data) -> pd.DataFrame:
+    """
+    Uma linha por brinquedo: brinquedo, categoria, status e disponivel.
+    Um brinquedo está ocupado se o nome aparece na lista de alguma reserva do dia.
+    """
+    reservas_dia = reservas.loc[reservas["data"] == pd.to_datetime(data)]
+    n = len(brinquedos)
+    nomes = brinquedos["nome"] if "nome" in brinquedos.columns else pd.Series("", index=brinquedos.index)
+    cats = brinquedos["categoria"] if "categoria" in brinquedos.columns else pd.Series("Tradicional", index=brinquedos.index)
+    alvos = normalizar_nomes(nomes).to_numpy(dtype=str)
+
+    # uma passada por reserva do dia (poucas), não brinquedo x reserva; a
+    # primeira reserva que contém o nome é a que aparece no status
+    status = np.full(n, "🟢 Disponível", dtype=object)
+    livre = np.ones(n, dtype=bool)
+    for res in reservas_dia.reindex(columns=["brinquedos", "cliente", "inicio_festa", "fim_festa"]).fillna("").itertuples(index=False):
+        if not livre.any():
+            break
+        lista = normalizar_nome(str(res.brinquedos))
+        achou = livre & (np.char.find(lista, alvos) >= 0)
+        status[achou] = f"🔴 Indisponível (🎉 {res.cliente} - {res.inicio_festa} às {res.fim_festa})"
+        livre &= ~achou
+
+    return pd.DataFrame({
+        "brinquedo": nomes.to_numpy(dtype=object),
+        "categoria": cats.to_numpy(dtype=object),
+        "status": status,
+        "disponivel": livre,
+    }, columns=["brinquedo", "categoria", "status", "disponivel"])
+
+
+# ==============================
+# FRETE
+# ==============================
+# Regra da aba de suporte do WhatsApp: R$ 3,00/km para Tradicional, R$ 5,00/km
+# para Montessori (a reserva que mistura as duas paga o de Montessori) e
+# isento abaixo de 5 km do depósito.
+FRETE_POR_KM = {"tradicional": 3.0, "montessori": 5.0}
+FRETE_ISENTO_KM = 5.0
+
+
+def frete_por_km(categorias: Iterable[str]) -> float:
+    """Valor do km para as categorias dos brinquedos escolhidos."""
+    cats = {str(c).strip().lower() for c in categorias}
+    return FRETE_POR_KM["montessori"] if "montessori" in cats else FRETE_POR_KM["tradicional"]
+
+
+def calcular_frete(distancia_km, por_km: float):
+    """Frete (R$) pela distância do depósito; número ou Series (NaN segue NaN)."""
+    if isinstance(distancia_km, pd.Series):
+        return (distancia_km * por_km).round(2).mask(distancia_km < FRETE_ISENTO_KM, 0.0)
+    if distancia_km < FRETE_ISENTO_KM:
+        return 0.0
+    return round(float(distancia_km) * por_km, 2)
+
+
+# ==============================
+# INDICADORES (RELATÓRIOS)
+# ==============================
+
+def indicadores_mensais(
+    reservas: pd.DataFrame, custos: pd.DataFrame
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Datas e valores tratados + agregação mensal.
+    Retorna (reservas, custos, df_fin_mensal[anomes, bruto, custo, liquido]).
+    """
+    for df in [reservas, custos]:
+        if "data" in df.columns:
+            df["data"] = para_data(df["data"])
+
+    reservas = reservas.dropna(subset=["data"])
+    custos = custos.dropna(subset=["data"])
+
+    # Conversões numéricas
+    for col in ["valor_total", "valor_extra", "frete", "desconto", "sinal"]:
+        if col not in reservas.columns:
+            reservas[col] = 0.0
+        reservas[col] = para_dinheiro(reservas[col])
+
+    custos["valor"] = para_dinheiro(custos["valor"]) if "valor" in custos.columns else 0.0
+
+    # Agregações mensais
+    custos = custos.dropna(subset=["data"])
+
+    reservas["anomes"] = reservas["data"].dt.to_period("M").astype(str)
+    custos["anomes"] = custos["data"].dt.to_period("M").astype(str)
+
+    reservas["bruto"] = reservas["valor_total"].clip(lower=0)
+    bruto_mensal = reservas.groupby("anomes", as_index=False)["bruto"].sum()
+    custo_mensal = (
+        custos.groupby("anomes", as_index=False)["valor"]
+        .sum()
+        .rename(columns={"valor": "custo"})
+    )
+    reservas["qtd_reservas"] = 1
+
+    df_fin_mensal = pd.merge(bruto_mensal, custo_mensal, on="anomes", how="outer").fillna(0)
+    df_fin_mensal["liquido"] = (df_fin_mensal["bruto"] - df_fin_mensal["custo"]).clip(lower=0)
+    df_fin_mensal = df_fin_mensal.sort_values("anomes")
+    return reservas, custos, df_fin_mensal
+
+
+def itens_por_brinquedo(reservas: pd.DataFrame, brinquedos: pd.DataFrame) -> pd.DataFrame:
+    """
+    Explode as reservas item a item (valor rateado entre os brinquedos da
+    reserva) e junta a categoria. Colunas: Brinquedo, Data, Valor_Item, categoria.
+    """
+    # lista_brinquedos vetorizado: explode a lista e rateia pelo nº de itens
+    reservas = reservas.reset_index(drop=True)
+    itens = reservas["brinquedos"].astype(str).str.split(",").explode().str.strip()
+    itens = itens[itens != ""]
+    if itens.empty:
+        return pd.DataFrame()
+    bruto_res = (reservas["valor_total"] + reservas["valor_extra"] + reservas["frete"] - reservas["desconto"]).clip(lower=0.0)
+    por_item = bruto_res / itens.groupby(level=0).size()
+    itens_df = pd.DataFrame({
+        "Brinquedo": itens.to_numpy(),
+        "Data": reservas["data"].loc[itens.index].to_numpy(),
+        "Valor_Item": por_item.loc[itens.index].to_numpy(),
+    })
+
+    if not brinquedos.empty and "nome" in brinquedos.columns:
+        # categoria do relatório em texto (ESQUEMAS a entrega como category)
+        cats = brinquedos.get("categoria", pd.Series("Tradicional", index=brinquedos.index))
+        itens_df = itens_df.merge(
+            pd.DataFrame({"nome": brinquedos["nome"], "categoria": cats.astype(object).fillna("Tradicional")}),
+            left_on="Brinquedo", right_on="nome", how="left"
+        )
+        itens_df.drop(columns=["nome"], inplace=True, errors="ignore")
+    else:
+        itens_df["categoria"] = "Tradicional"
+
+    itens_df["Valor_Item"] = pd.to_numeric(itens_df["Valor_Item"], errors="coerce").fillna(0.0)
+    return itens_df
+
+
+COLS_MENSAL = ["anomes", "bruto", "custo", "liquido", "qtd_reservas", "sinal"]
+COLS_RANKING = ["Brinquedo", "Valor_Total", "Locações"]
+
+
+def agregar_no_app(reservas: pd.DataFrame, custos: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    O que as funções indicadores_mensais/desempenho_brinquedos (sql/indicadores.sql)
+    devolvem, calculado a partir das linhas — para bancos sem as funções.
+    Retorna (mensal[COLS_MENSAL], ranking[COLS_RANKING]).
+    """
+    reservas, custos, mensal = indicadores_mensais(reservas, custos)
+    por_mes = reservas.groupby("anomes", as_index=False).agg(
+        qtd_reservas=("qtd_reservas", "sum"), sinal=("sinal", "sum"))
+    mensal = mensal.merge(por_mes, on="anomes", how="left").fillna(0)
+
+    itens_df = itens_por_brinquedo(reservas, pd.DataFrame())
+    if itens_df.empty:
+        ranking = pd.DataFrame(columns=COLS_RANKING)
+    else:
+        ranking = itens_df.groupby("Brinquedo", as_index=False).agg(
+            Valor_Total=("Valor_Item", "sum"), Locações=("Valor_Item", "count"))
+    return padronizar_agregados(mensal, ranking)
+
+
+def padronizar_agregados(
+    mensal: pd.DataFrame, ranking: pd.DataFrame
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Mesmas colunas/tipos/ordem venham do RPC ou de agregar_no_app."""
+    mensal = mensal.rename(columns=str.lower)
+    for c in COLS_MENSAL:
+        if c not in mensal.columns:
+            mensal[c] = "" if c == "anomes" else 0.0
+    mensal = mensal[COLS_MENSAL].copy()
+    for c in COLS_MENSAL[1:]:
+        mensal[c] = pd.to_numeric(mensal[c], errors="coerce").fillna(0.0)
+    mensal["qtd_reservas"] = mensal["qtd_reservas"].astype(int)
+    mensal["anomes"] = mensal["anomes"].astype(str)
+    mensal = mensal.sort_values("anomes").reset_index(drop=True)
+
+    ranking = ranking.rename(columns={"brinquedo": "Brinquedo", "valor_total": "Valor_Total", "locacoes": "Locações"})
+    for c in COLS_RANKING:
+        if c not in ranking.columns:
+            ranking[c] = "" if c == "Brinquedo" else 0
+    ranking = ranking[COLS_RANKING].copy()
+    ranking["Valor_Total"] = pd.to_numeric(ranking["Valor_Total"], errors="coerce").fillna(0.0)
+    ranking["Locações"] = pd.to_numeric(ranking["Locações"], errors="coerce").fillna(0).astype(int)
+    ranking = ranking.sort_values(["Valor_Total", "Locações"], ascending=[False, False]).reset_index(drop=True)
+    return mensal, ranking
+
+
+# ==============================
+# CHECK-LIST
+# ==============================
+
+def mapa_pecas(pecas: Optional[pd.DataFrame]) -> Dict[str, List[str]]:
+    """Brinquedo -> lista de peças cadastradas."""
+    if pecas is None or pecas.empty:
+        return {}
+    return pecas.groupby("Brinquedo")["Item"].apply(list).to_dict()
+
+
+def ordenar_por_recencia(df: pd.DataFrame) -> pd.DataFrame:
+    if df is None or df.empty:
+        return df
+    order_cols = []
+    if "executado_em" in df.columns:
+        order_cols.append("executado_em")
+    if "data" in df.columns:
+        try:
+            df["_data_dt"] = pd.to_datetime(df["data"], errors="coerce", utc=True)
+            order_cols.append("_data_dt")
+        except Exception:
+            order_cols.append("data")
+    return df.sort_values(order_cols, ascending=False) if order_cols else df
+
+
+def estado_checklist(checklist: Optional[pd.DataFrame], reserva_id: int, brinquedo: str, tipo: str) -> Dict[str, bool]:
+    """
+    item -> ok do que já foi salvo para (reserva, brinquedo, etapa).
+    Usa a ÚLTIMA versão por item (Modelo B) priorizando 'executado_em'; fallback para 'data'.
+    """
+    if checklist is None or checklist.empty:
+        return {}
+    df_prev = checklist[
+        (checklist["reserva_id"] == reserva_id) &
+        (checklist["brinquedo"].astype(str).str.lower() == str(brinquedo).lower()) &
+        (checklist["tipo"] == tipo)
+    ].copy()
+    if df_prev.empty:
+        return {}
+
+    df_prev = ordenar_por_recencia(df_prev)
+    df_ultimos = df_prev.drop_duplicates(subset=["item"], keep="first")
+    return {row["item"]: (row["ok"] == "✅") for _, row in df_ultimos.iterrows()}
+
+
+def status_ok_total(checklist: Optional[pd.DataFrame], reserva_id: int, brinquedo: str, tipo: str,
+                    itens_ref: List[str]) -> Tuple[int, int, bool]:
+    """(itens ok, total de itens, completo) de um brinquedo numa etapa."""
+    prev = estado_checklist(checklist, reserva_id, brinquedo, tipo)
+    if itens_ref:
+        total = len(itens_ref)
+        ok = sum(1 for item in itens_ref if prev.get(item, False))
+    else:
+        total = 1
+        ok = 1 if prev.get("No carro", False) else 0
+    completo = (total > 0 and ok == total)
+    return ok, total, completo
+
+
+def progresso_etapa(checklist: Optional[pd.DataFrame], pecas_map: Dict[str, List[str]], reserva_id: int,
+                    tipo: str, brinquedos_lista: List[str]) -> Tuple[int, int, float]:
+    """(brinquedos completos, total, % de progresso) de uma etapa da reserva."""
+    completos = 0
+    for b in brinquedos_lista:
+        itens_b = pecas_map.get(b, [])
+        _, _, comp = status_ok_total(checklist, reserva_id, b, tipo, itens_b)
+        if comp:
+            completos += 1
+    total = len(brinquedos_lista)
+    prog = (completos / total * 100) if total > 0 else 0.0
+    return completos, total, prog
@@ -0,0 +1,207 @@
+# espelho.py
+# Espelho local (SQLite) das tabelas com chave, sincronizado por delta.
+# Cada tabela guarda as linhas completas (select=*) e a marca d'água: o maior
+# updated_at já visto. A cada leitura vem do Supabase só o que mudou desde a
+# marca (com uma folga para transações que gravaram atrasado); de tempos em
+# tempos, ou depois de uma escrita, as remoções são conferidas lendo só a
+# coluna chave. Tabelas sem updated_at (ver sql/sincronizacao.sql) ficam fora
+# e continuam sendo lidas inteiras.
+# Com o Supabase fora do ar, o banco serve o espelho como está (somente leitura).
+# Desligado por padrão: o delta vem com select=* (o espelho precisa da linha
+# inteira para servir qualquer projeção), ou seja, traz colunas que a página
+# não pediu e grava a base em disco. Ligar com BANCO_ESPELHO=cache/espelho.sqlite
+# quando o ganho do delta compensar (tabelas grandes, poucas mudanças).
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from supabase_rest import table_select_iter
+
+ESPELHO_ARQUIVO = os.getenv("BANCO_ESPELHO", "")   # caminho do SQLite; "" (padrão) desliga
+ESPELHO_RECONCILIAR = float(os.getenv("BANCO_ESPELHO_RECONCILIAR", "300"))   # segundos entre conferências
+ESPELHO_FOLGA = float(os.getenv("BANCO_ESPELHO_FOLGA", "5"))                 # segundos relidos antes da marca
+COLUNA_MARCA = "updated_at"
+_MARCA_INICIAL = "1970-01-01T00:00:00+00:00"
+
+_con: Optional[sqlite3.Connection] = None
+_con_lock = threading.Lock()
+_travas: Dict[str, threading.Lock] = {}
+_travas_lock = threading.Lock()
+_tabelas: Dict[str, "_Tabela"] = {}
+_sem_marca: set = set()          # tabelas sem a coluna updated_at no Supabase
+_reconciliar: set = set()        # conferência de remoções pedida (escrita local)
+
+
+class _Tabela:
+    def __init__(self, linhas: Dict[str, Dict[str, Any]], marca: Optional[str],
+                 sincronizado_em: float, reconciliado_em: float):
+        self.linhas = linhas
+        self.marca = marca
+        self.sincronizado_em = sincronizado_em
+        self.reconciliado_em = reconciliado_em
+        self._df: Optional[pd.DataFrame] = None
+
+    def dataframe(self) -> pd.DataFrame:
+        if self._df is None:
+            self._df = pd.DataFrame(list(self.linhas.values()))
+        return self._df
+
+
+def _conexao() -> sqlite3.Connection:
+    global _con
+    if _con is None:
+        pasta = os.path.dirname(ESPELHO_ARQUIVO)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        con = sqlite3.connect(ESPELHO_ARQUIVO, check_same_thread=False)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("CREATE TABLE IF NOT EXISTS linhas (tabela TEXT, chave TEXT, dados TEXT, PRIMARY KEY (tabela, chave))")
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS marcas (tabela TEXT PRIMARY KEY, marca TEXT, "
+            "sincronizado_em REAL, reconciliado_em REAL)"
+        )
+        con.commit()
+        _con = con
+    return _con
+
+
+def _trava(tabela: str) -> threading.Lock:
+    with _travas_lock:
+        return _travas.setdefault(tabela, threading.Lock())
+
+
+def _estado(tabela: str) -> _Tabela:
+    """Estado em memória; na 1ª vez na vida do processo, lido do disco."""
+    t = _tabelas.get(tabela)
+    if t is None:
+        with _con_lock:
+            con = _conexao()
+            linhas = {c: json.loads(d) for c, d in con.execute(
+                "SELECT chave, dados FROM linhas WHERE tabela = ?", (tabela,))}
+            m = con.execute(
+                "SELECT marca, sincronizado_em, reconciliado_em FROM marcas WHERE tabela = ?", (tabela,)
+            ).fetchone()
+        t = _Tabela(linhas, *(m or (None, 0.0, 0.0)))
+        _tabelas[tabela] = t
+    return t
+
+
+def _gravar(tabela: str, t: _Tabela, novas: List[Tuple[str, Dict[str, Any]]], removidas: List[str]) -> None:
+    with _con_lock:
+        con = _conexao()
+        if novas:
+            con.executemany(
+                "INSERT OR REPLACE INTO linhas VALUES (?, ?, ?)",
+                [(tabela, c, json.dumps(r, ensure_ascii=False, default=str)) for c, r in novas],
+            )
+        if removidas:
+            con.executemany("DELETE FROM linhas WHERE tabela = ? AND chave = ?", [(tabela, c) for c in removidas])
+        con.execute(
+            "INSERT OR REPLACE INTO marcas VALUES (?, ?, ?, ?)",
+            (tabela, t.marca, t.sincronizado_em, t.reconciliado_em),
+        )
+        con.commit()
+
+
+def _com_folga(marca: str) -> str:
+    try:
+        return (pd.Timestamp(marca) - pd.Timedelta(seconds=ESPELHO_FOLGA)).isoformat()
+    except (ValueError, TypeError):
+        return marca
+
+
+def ativo(tabela: str, chave: Optional[str]) -> bool:
+    return bool(ESPELHO_ARQUIVO) and bool(chave) and tabela not in _sem_marca
+
+
+def sincronizar(tabela: str, chave: str) -> Optional[pd.DataFrame]:
+    """
+    Traz o delta desde a marca (e confere remoções quando devido) e devolve
+    a tabela inteira do espelho. None se a tabela não tem updated_at.
+    Erros de rede/servidor sobem para quem chamou.
+    """
+    with _trava(tabela):
+        t = _estado(tabela)
+        desde = _com_folga(t.marca) if t.marca else _MARCA_INICIAL
+        novas: List[Tuple[str, Dict[str, Any]]] = []
+        try:
+            for pagina in table_select_iter(tabela, "*", where={COLUNA_MARCA: ("gte", desde)}, keyset=chave):
+                novas.extend((str(r.get(chave)), r) for r in pagina)
+        except RuntimeError as e:
+            if "42703" in str(e) or (COLUNA_MARCA in str(e) and "does not exist" in str(e)):
+                logging.warning("'%s' sem coluna %s; fora do espelho (ver sql/sincronizacao.sql)", tabela, COLUNA_MARCA)
+                _sem_marca.add(tabela)
+                return None
+            raise
+
+        alteradas = [(c, r) for c, r in novas if t.linhas.get(c) != r]
+        for c, r in novas:
+            t.linhas[c] = r
+            marca = r.get(COLUNA_MARCA)
+            if marca and (t.marca is None or str(marca) > t.marca):
+                t.marca = str(marca)
+
+        removidas: List[str] = []
+        agora = time.time()
+        if tabela in _reconciliar or agora - t.reconciliado_em >= ESPELHO_RECONCILIAR:
+            _reconciliar.discard(tabela)
+            existentes = set()
+            for pagina in table_select_iter(tabela, chave, keyset=chave):
+                existentes.update(str(r.get(chave)) for r in pagina)
+            removidas = [c for c in t.linhas if c not in existentes]
+            for c in removidas:
+                del t.linhas[c]
+            t.reconciliado_em = agora
+
+        t.sincronizado_em = agora
+        if alteradas or removidas:
+            t._df = None
+            logging.debug("espelho %s: %d alteradas, %d removidas", tabela, len(alteradas), len(removidas))
+        _gravar(tabela, t, alteradas, removidas)
+        return t.dataframe().copy()
+
+
+def ler(tabela: str) -> Optional[Tuple[float, pd.DataFrame]]:
+    """O que houver no espelho, sem ir ao Supabase: (sincronizado_em, df)."""
+    if not ESPELHO_ARQUIVO or tabela in _sem_marca:
+        return None
+    try:
+        with _trava(tabela):
+            t = _estado(tabela)
+            if not t.linhas:
+                return None
+            return t.sincronizado_em, t.dataframe().copy()
+    except sqlite3.Error:
+        logging.exception("Falha ao ler o espelho de %s", tabela)
+        return None
+
+
+def pedir_reconciliacao(tabela: Optional[str] = None) -> None:
+    """Depois de uma escrita: a próxima sincronização confere as remoções."""
+    if tabela is None:
+        _reconciliar.update(_tabelas)
+    else:
+        _reconciliar.add(tabela)
+
+
+def estado() -> Dict[str, Any]:
+    """Resumo para o painel admin."""
+    return {
+        "arquivo": ESPELHO_ARQUIVO,
+        "sem_updated_at": sorted(_sem_marca),
+        "tabelas": {
+            nome: {
+                "linhas": len(t.linhas),
+                "marca": t.marca,
+                "sincronizado_ha_s": round(time.time() - t.sincronizado_em, 1) if t.sincronizado_em else None,
+                "reconciliado_ha_s": round(time.time() - t.reconciliado_em, 1) if t.reconciliado_em else None,
+            }
+            for nome, t in list(_tabelas.items())
+        },
+    }
@@ -0,0 +1,263 @@
+"""
+Bench de ponta a ponta das páginas, sem navegador.
+
+Gera dados sintéticos (ferramentas/gerar_dados.py) na escala pedida, sobe o
+stand-in local do Supabase (ferramentas/servidor_local.py) com eles e mede,
+com repetições:
+  - carga/<pagina>   carregar_varios com as mesmas tabelas/colunas da página
+                     (relatorios_rpc: os agregados de sql/indicadores.sql)
+  - prep/<pagina>    o preparo dos DataFrames da página (calculos.py)
+  - nucleo/<funcao>  disponibilidade, indicadores e estado do check-list
+
+O relatório JSON (versão, escala, mediana/p90 por item) é comparável entre
+commits:
+    python ferramentas/bench_paginas.py --escala 10 --json bench_base.json
+    git checkout outra-branch
+    python ferramentas/bench_paginas.py --escala 10 --json bench_novo.json --comparar bench_base.json
+
+Escalas altas demoram para carregar no SQLite; --sem-carga mede só o preparo
+(sem servidor), usando os DataFrames gerados direto.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from typing import Callable, Dict, List
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gerar_dados  # noqa: E402
+import calculos  # noqa: E402
+import perfil  # noqa: E402
+
+# Tabelas/colunas que cada página pede ao abrir (espelha os carregar_varios do app.py)
+COL_RESERVAS_REL = ["id", "cliente", "brinquedos", "data", "horario_entrega", "horario_retirada",
+                    "valor_total", "valor_extra", "frete", "desconto", "sinal", "falta", "observacao",
+                    "status", "pagamentos"]
+COL_CLIENTES = ["nome", "telefone", "email", "tipo_cliente", "cpf", "cnpj", "como_conseguiu", "logradouro",
+                "numero", "complemento", "bairro", "cidade", "cep", "observacao"]
+COL_RESERVAS = COL_RESERVAS_REL[:6] + ["inicio_festa", "fim_festa"] + COL_RESERVAS_REL[6:]
+COL_CHECKLIST = ["reserva_id", "cliente", "brinquedo", "tipo", "item", "ok", "data", "observacao",
+                 "conferido_por", "completo", "executado_em"]
+
+PAGINAS: Dict[str, Dict[str, List[str]]] = {
+    "relatorios": {   # sem as funções de sql/indicadores.sql
+        "reservas": COL_RESERVAS_REL,
+        "custos": ["data", "descricao", "valor"],
+    },
+    "reservas": {
+        "brinquedos": ["nome", "valor", "status", "categoria"],
+        "clientes": COL_CLIENTES,
+        "reservas": COL_RESERVAS,
+        "pre_reservas": ["nome", "data", "ocasiao", "tema"],
+    },
+    "estoque": {
+        "brinquedos": ["nome", "valor", "status", "categoria"],
+        "reservas": ["id", "cliente", "brinquedos", "data", "horario_entrega", "horario_retirada",
+                     "inicio_festa", "fim_festa", "status"],
+    },
+    "checklist": {
+        "reservas": ["id", "cliente", "brinquedos", "data", "status"],
+        "brinquedos": ["nome"],
+        "pecas_brinquedos": ["Brinquedo", "Item"],
+        "checklist": COL_CHECKLIST,
+    },
+    "frota": {
+        "veiculos": ["placa", "modelo", "tipo", "ano", "status", "km_atual", "valor_veiculo", "data_ipva",
+                     "data_licenciamento", "data_seguro", "ipva_pago", "licenciamento_pago", "seguro_pago",
+                     "observacao"],
+        "manutencoes": ["id", "placa", "tipo", "descricao", "data", "km", "valor"],
+        "custos": ["id", "descricao", "categoria", "valor", "data", "forma_de_pagamento", "observacao"],
+        "km_log": ["id", "placa", "data", "km"],
+    },
+    "contratos": {
+        "reservas": COL_RESERVAS_REL[:14] + ["contrato_gerado"],
+        "clientes": ["nome", "cpf", "rg", "email", "telefone", "logradouro", "numero", "complemento",
+                     "cidade", "cep"],
+    },
+}
+
+
+def medir(fn: Callable[[], object], repeticoes: int) -> Dict[str, float]:
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        fn()
+        tempos.append(1000 * (time.perf_counter() - t0))
+    tempos.sort()
+    return {
+        "n": len(tempos),
+        "mediana_ms": round(statistics.median(tempos), 2),
+        "p90_ms": round(tempos[min(len(tempos) - 1, int(0.9 * len(tempos)))], 2),
+        "min_ms": round(tempos[0], 2),
+    }
+
+
+def _sub(df: pd.DataFrame, cols: List[str]) -> pd.DataFrame:
+    return df[[c for c in cols if c in df.columns]].copy()
+
+
+def casos_preparo(t: Dict[str, pd.DataFrame]) -> Dict[str, Callable[[], object]]:
+    """Preparo de cada página e funções do núcleo sobre cópias dos dados gerados."""
+    rel = PAGINAS["relatorios"]
+    res = PAGINAS["reservas"]
+
+    # estado pronto para as funções do núcleo (como a página teria depois do preparo)
+    _, _, reservas_ok = calculos.preparar_reservas(
+        _sub(t["brinquedos"], res["brinquedos"]), _sub(t["clientes"], res["clientes"]),
+        _sub(t["reservas"], res["reservas"]), res["brinquedos"], res["clientes"], res["reservas"])
+    reservas_ok = reservas_ok.dropna(subset=["data"])
+    dia = reservas_ok["data"].mode().iloc[0]
+    checklist = t["checklist"]
+    pecas_map = calculos.mapa_pecas(t["pecas_brinquedos"])
+    alvo = checklist.drop_duplicates("reserva_id").sample(
+        n=min(20, checklist["reserva_id"].nunique()), random_state=1)
+    brinq_por_reserva = t["reservas"].set_index("id")["brinquedos"].to_dict()
+
+    def prep_relatorios():
+        # caminho sem as funções de sql/indicadores.sql (com elas não há preparo)
+        calculos.agregar_no_app(_sub(t["reservas"], rel["reservas"]), _sub(t["custos"], rel["custos"]))
+
+    def prep_reservas():
+        calculos.preparar_reservas(
+            _sub(t["brinquedos"], res["brinquedos"]), _sub(t["clientes"], res["clientes"]),
+            _sub(t["reservas"], res["reservas"]), res["brinquedos"], res["clientes"], res["reservas"])
+
+    def prep_estoque():
+        r = calculos.preparar_estoque(_sub(t["reservas"], PAGINAS["estoque"]["reservas"]))
+        calculos.disponibilidade_por_data(t["brinquedos"], r, dia)
+
+    def nucleo_estado_checklist():
+        for rid, b, tipo in alvo[["reserva_id", "brinquedo", "tipo"]].itertuples(index=False):
+            calculos.estado_checklist(checklist, rid, b, tipo)
+
+    def nucleo_progresso_etapa():
+        for rid in alvo["reserva_id"]:
+            lista = calculos.lista_brinquedos(brinq_por_reserva.get(rid, ""))
+            calculos.progresso_etapa(checklist, pecas_map, rid, "Montagem", lista)
+
+    return {
+        "prep/relatorios": prep_relatorios,
+        "prep/reservas": prep_reservas,
+        "prep/estoque": prep_estoque,
+        "nucleo/indicadores_mensais": lambda: calculos.indicadores_mensais(
+            _sub(t["reservas"], rel["reservas"]), _sub(t["custos"], rel["custos"])),
+        "nucleo/disponibilidade_por_data": lambda: calculos.disponibilidade_por_data(
+            t["brinquedos"], reservas_ok, dia),
+        "nucleo/brinquedos_ocupados": lambda: calculos.brinquedos_ocupados(reservas_ok, dia),
+        "nucleo/estado_checklist_x20": nucleo_estado_checklist,
+        "nucleo/progresso_etapa_x20": nucleo_progresso_etapa,
+    }
+
+
+def casos_carga(t: Dict[str, pd.DataFrame], com_espelho: bool = False,
+                colunar: bool = False) -> Dict[str, Callable[[], object]]:
+    """
+    Sobe o servidor_local com os dados e mede carregar_varios por página
+    (sem cache). com_espelho: leituras por delta (espelho.py) em vez da
+    tabela inteira. colunar: leituras em text/csv (banco.CARGA_COLUNAR).
+    """
+    import servidor_local
+    import espelho
+
+    pasta = tempfile.mkdtemp(prefix="bench_paginas_")
+    espelho.ESPELHO_ARQUIVO = os.path.join(pasta, "espelho.sqlite") if com_espelho else ""
+    espelho.ESPELHO_FOLGA = 0   # os dados acabaram de ser gravados: com folga, todo delta relê tudo
+    arq = os.path.join(pasta, "dados.sqlite")
+    gerar_dados.para_sqlite(t, arq)
+    url, srv = servidor_local.iniciar(banco=arq)
+    os.environ["SUPABASE_URL"] = url
+
+    import supabase_rest
+    supabase_rest.SUPABASE_URL = url
+    import banco
+    banco.CARGA_COLUNAR = colunar
+
+    def carga(pedidos):
+        def fn():
+            banco.invalidar_cache()
+            banco.iniciar_execucao()
+            banco.carregar_varios(pedidos)
+        return fn
+
+    def carga_agregados():
+        banco.invalidar_cache()
+        banco.iniciar_execucao()
+        banco.carregar_agregado("indicadores_mensais")
+        banco.carregar_agregado("desempenho_brinquedos")
+
+    casos = {f"carga/{p}": carga(pedidos) for p, pedidos in PAGINAS.items()}
+    casos["carga/relatorios_rpc"] = carga_agregados
+    return casos
+
+
+def comparar(atual: dict, base: dict) -> None:
+    print(f"\n{'item':<34}{'base':>12}{'atual':>12}{'var_%':>9}")
+    for nome, m in atual["itens"].items():
+        b = base.get("itens", {}).get(nome)
+        if not b:
+            print(f"{nome:<34}{'-':>12}{m['mediana_ms']:>12.1f}{'':>9}")
+            continue
+        var = (m["mediana_ms"] / b["mediana_ms"] - 1) * 100 if b["mediana_ms"] else 0.0
+        print(f"{nome:<34}{b['mediana_ms']:>12.1f}{m['mediana_ms']:>12.1f}{var:>+9.1f}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Bench headless das páginas com dados sintéticos")
+    ap.add_argument("--escala", type=float, default=1.0)
+    ap.add_argument("--semente", type=int, default=42)
+    ap.add_argument("-r", "--repeticoes", type=int, default=5)
+    ap.add_argument("--sem-carga", action="store_true", help="não sobe o servidor; mede só o preparo")
+    ap.add_argument("--espelho", action="store_true", help="cargas pelo espelho local (delta por updated_at)")
+    ap.add_argument("--colunar", action="store_true", help="cargas em text/csv direto para DataFrame")
+    ap.add_argument("--json", help="grava o relatório neste arquivo")
+    ap.add_argument("--comparar", help="relatório JSON de referência para mostrar a variação")
+    args = ap.parse_args()
+    # o preparo herdado das páginas atribui em fatias; o aviso só polui a saída
+    warnings.simplefilter("ignore", pd.errors.SettingWithCopyWarning)
+    warnings.simplefilter("ignore", UserWarning)
+
+    t0 = time.perf_counter()
+    tabelas = gerar_dados.gerar(args.escala, args.semente)
+    print(f"Dados gerados em {time.perf_counter() - t0:.1f}s "
+          f"({len(tabelas['reservas'])} reservas, {len(tabelas['checklist'])} linhas de check-list)")
+
+    casos = {}
+    if not args.sem_carga:
+        casos.update(casos_carga(tabelas, args.espelho, args.colunar))
+    casos.update(casos_preparo(tabelas))
+
+    relatorio = {
+        "versao": perfil.versao(),
+        "escala": args.escala,
+        "semente": args.semente,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "espelho": args.espelho,
+        "colunar": args.colunar,
+        "linhas": {k: len(v) for k, v in tabelas.items()},
+        "itens": {},
+    }
+    for nome, fn in casos.items():
+        relatorio["itens"][nome] = m = medir(fn, args.repeticoes)
+        print(f"{nome:<34}{m['mediana_ms']:>10.1f} ms  (p90 {m['p90_ms']:.1f})")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, ensure_ascii=False, indent=2)
+        print(f"Relatório: {args.json}")
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(relatorio, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
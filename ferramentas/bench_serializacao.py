@@ -0,0 +1,111 @@
+"""
+Bench: preparo + serialização de um frame para o corpo do POST (salvar_dados).
+
+Compara o caminho antigo (apply célula a célula em cada coluna object,
+df.where, to_dict(orient="records") e json.dumps) com o atual
+(banco._prepare_df_for_rest vetorizado + banco._json_registros), sobre
+frames sintéticos de reservas: texto com espaços sobrando, datas já
+tipadas (datetime64) e como objetos date, valores com nulos, status
+categórico e id Int64. Confere que os dois geram os mesmos registros.
+
+Uso:
+    python ferramentas/bench_serializacao.py [-n 100000] [-r 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import banco  # noqa: E402
+
+
+def frame(n: int, semente: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(semente)
+    nomes = np.array(["Ana  Souza", " Bruno Lima", "Carla\tDias ", "Diego Alves", "Eva   Rocha"])
+    datas = pd.Timestamp("2022-01-01") + pd.to_timedelta(rng.integers(0, 1500, n), unit="D")
+    valor = rng.integers(150, 2000, n).astype(float)
+    valor[rng.random(n) < 0.05] = np.nan
+    return pd.DataFrame({
+        "id": pd.array(np.arange(1, n + 1), dtype="Int64"),
+        "cliente": rng.choice(nomes, n),
+        "brinquedos": rng.choice(["Pula-pula,  Piscina", "Tobogã", "Cama elástica , Pula-pula"], n),
+        "data": datas,                                   # datetime64 (frame tipado)
+        "data_pagamento": [d.date() for d in datas],     # objetos date (linha editada)
+        "valor_total": valor,
+        "observacao": rng.choice(["", "  entregar  cedo ", None, "ok"], n),
+        "status": pd.Categorical(rng.choice(["Pendente", "Concluído", "Cancelado"], n)),
+    })
+
+
+def antigo(df: pd.DataFrame) -> bytes:
+    """banco._prepare_df_for_rest + to_dict + json.dumps como eram antes."""
+    out = df.copy()
+    for col in out.columns:
+        if pd.api.types.is_datetime64_any_dtype(out[col]):
+            out[col] = out[col].dt.strftime("%Y-%m-%d")
+        elif out[col].dtype == object:
+            out[col] = out[col].apply(
+                lambda x: x.strftime("%Y-%m-%d")
+                if isinstance(x, (date, datetime)) and not pd.isna(x)
+                else banco._normalize_txt(x)
+            )
+    out = out.where(pd.notnull(out), None)
+    regs = out.to_dict(orient="records")
+    regs = [
+        {k: (None if isinstance(v, float) and np.isnan(v) else v) for k, v in r.items()}
+        for r in regs
+    ]
+    return json.dumps(regs, default=str).encode("utf-8")
+
+
+def atual(df: pd.DataFrame) -> bytes:
+    return banco._json_registros(banco._prepare_df_for_rest(df))
+
+
+def medir(fn, df: pd.DataFrame, repeticoes: int) -> dict:
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        fn(df)
+        tempos.append(1000 * (time.perf_counter() - t0))
+    return {"mediana_ms": statistics.median(tempos), "min_ms": min(tempos)}
+
+
+def _comparavel(corpo: bytes) -> list:
+    # o caminho antigo deixava None/NaN de category e Int64 como veio
+    return [
+        {k: (None if v is None or (isinstance(v, float) and np.isnan(v)) else v) for k, v in r.items()}
+        for r in json.loads(corpo)
+    ]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Bench do preparo/serialização do salvar_dados")
+    ap.add_argument("-n", type=int, default=100_000, help="linhas do frame")
+    ap.add_argument("-r", "--repeticoes", type=int, default=5)
+    args = ap.parse_args()
+
+    df = frame(args.n)
+    a, b = _comparavel(antigo(df)), _comparavel(atual(df))
+    if a != b:
+        difere = next(i for i, (x, y) in enumerate(zip(a, b)) if x != y)
+        raise SystemExit(f"Registros diferentes na linha {difere}: {a[difere]} x {b[difere]}")
+
+    print(f"{args.n} linhas, {len(df.columns)} colunas, {args.repeticoes} repetições")
+    base = medir(antigo, df, args.repeticoes)
+    novo = medir(atual, df, args.repeticoes)
+    for nome, m in (("antigo (apply + to_dict + json)", base), ("vetorizado (to_json)", novo)):
+        print(f"{nome:<34}{m['mediana_ms']:>10.1f} ms  (min {m['min_ms']:.1f})")
+    print(f"{'ganho':<34}{base['mediana_ms'] / novo['mediana_ms']:>10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
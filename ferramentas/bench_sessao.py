@@ -0,0 +1,69 @@
+"""
+Bench: conexões novas por requisição (requests.get) x sessão com pool (supabase_rest).
+
+Sobe o stand-in local (ferramentas/servidor_local.py, HTTP/1.1 com
+keep-alive), faz N selects de cada jeito e mostra quantas conexões TCP o
+servidor aceitou e o tempo total. Em produção (HTTPS) cada conexão nova
+também paga o handshake TLS, então a economia real é maior que a medida aqui.
+
+Uso:
+    python ferramentas/bench_sessao.py [-n 200] [--latencia-conexao-ms 0]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import servidor_local  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=200, help="requisições por cenário")
+    ap.add_argument("--latencia-conexao-ms", type=float, default=0.0,
+                    help="atraso artificial por conexão aceita (simula handshake)")
+    args = ap.parse_args()
+
+    base, srv = servidor_local.iniciar(latencia_conexao_ms=args.latencia_conexao_ms)
+    os.environ["SUPABASE_URL"] = base
+
+    import requests
+    import supabase_rest
+
+    supabase_rest.SUPABASE_URL = base
+    supabase_rest.reset_session()
+    supabase_rest.table_insert("brinquedos", [{"nome": f"Brinquedo {i}"} for i in range(20)])
+    supabase_rest.reset_session()   # o cenário 2 começa sem conexão aberta
+
+    # Cenário 1: requests.get "solto" (comportamento antigo)
+    srv.conexoes = 0
+    t0 = time.perf_counter()
+    for _ in range(args.n):
+        r = requests.get(f"{base}/rest/v1/brinquedos", headers=supabase_rest._headers(),
+                         params={"select": "*"}, timeout=15)
+        r.json()
+    t_sem = time.perf_counter() - t0
+    con_sem = srv.conexoes
+
+    # Cenário 2: sessão compartilhada do supabase_rest
+    srv.conexoes = 0
+    t0 = time.perf_counter()
+    for _ in range(args.n):
+        supabase_rest.table_select("brinquedos")
+    t_com = time.perf_counter() - t0
+    con_com = srv.conexoes
+
+    srv.shutdown()
+
+    print(f"{'cenário':<22}{'conexões':>10}{'total (s)':>12}{'ms/req':>10}")
+    print(f"{'requests.get':<22}{con_sem:>10}{t_sem:>12.3f}{t_sem / args.n * 1000:>10.2f}")
+    print(f"{'sessão com pool':<22}{con_com:>10}{t_com:>12.3f}{t_com / args.n * 1000:>10.2f}")
+    if t_com > 0:
+        print(f"speedup: {t_sem / t_com:.2f}x  |  handshakes evitados: {con_sem - con_com}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Compara o log de perfil das páginas (perfil.py) entre versões.
+
+Para cada página x versão mostra o número de renderizações e a mediana e o
+p90 do tempo total e de cada fase (ms). Com --base/--nova, mostra só as duas
+versões lado a lado com a variação percentual das medianas.
+
+Uso:
+    python ferramentas/comparar_perfil.py [logs/perfil_paginas.jsonl] [--base abc123 --nova def456]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import perfil  # noqa: E402
+
+
+def ler(caminho: str) -> pd.DataFrame:
+    # inclui as cópias rotacionadas (.1, .2, ...)
+    registros = []
+    for arq in sorted(glob.glob(caminho + "*")):
+        with open(arq, encoding="utf-8") as f:
+            for linha in f:
+                try:
+                    r = json.loads(linha)
+                except ValueError:
+                    continue
+                if r.get("perfilado"):
+                    continue   # cProfile/pyinstrument distorcem os tempos
+                base = {"versao": r.get("versao"), "pagina": r.get("pagina"), "total": r.get("total_ms")}
+                base.update(r.get("fases_ms", {}))
+                registros.append(base)
+    return pd.DataFrame(registros)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("log", nargs="?", default=perfil.PERFIL_LOG)
+    ap.add_argument("--base", help="versão de referência")
+    ap.add_argument("--nova", help="versão a comparar com a base")
+    args = ap.parse_args()
+
+    df = ler(args.log)
+    if df.empty:
+        print(f"Nenhum registro em {args.log}")
+        return
+
+    metricas = ["total"] + [f for f in perfil.FASES if f in df.columns]
+    if args.base and args.nova:
+        df = df[df["versao"].isin([args.base, args.nova])]
+        med = df.groupby(["pagina", "versao"])[metricas].median().unstack("versao")
+        for m in metricas:
+            if (m, args.base) in med.columns and (m, args.nova) in med.columns:
+                med[(m, "var_%")] = (med[(m, args.nova)] / med[(m, args.base)] - 1) * 100
+        med = med.sort_index(axis=1)
+        with pd.option_context("display.width", 200, "display.max_columns", None):
+            print(med.round(1).to_string())
+        return
+
+    grupos = df.groupby(["pagina", "versao"])
+    tabela = grupos[metricas].median().round(1)
+    tabela.insert(0, "n", grupos.size())
+    tabela["total_p90"] = grupos["total"].quantile(0.9).round(1)
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(tabela.to_string())
+
+
+if __name__ == "__main__":
+    main()
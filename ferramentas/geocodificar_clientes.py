@@ -0,0 +1,42 @@
+"""
+Pré-geocodifica os CEPs dos clientes e grava a distância do depósito e os
+fretes (Tradicional/Montessori) em cada cliente (geocodificacao.geocodificar_clientes).
+
+Só os pendentes por padrão: clientes novos, com CEP editado ou cuja consulta
+falhou na rodada anterior. Respeita o limite do Nominatim (~1 req/s), então a
+primeira rodada numa base grande demora; as seguintes saem do cache.
+Precisa das colunas de sql/clientes_geocodificacao.sql e das credenciais do
+Supabase no ambiente, como o app.
+
+Uso:
+    python ferramentas/geocodificar_clientes.py            # pendentes
+    python ferramentas/geocodificar_clientes.py --todos    # recalcula todos (depósito/valor do km mudou)
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import geocodificacao  # noqa: E402
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Pré-geocodificação dos clientes")
+    ap.add_argument("--todos", action="store_true", help="recalcula também os já geocodificados")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+
+    def progresso(feitos: int, total: int) -> None:
+        print(f"\r{feitos}/{total} CEPs", end="", flush=True)
+
+    resumo = geocodificacao.geocodificar_clientes(todos=args.todos, progresso=progresso)
+    print()
+    print(", ".join(f"{k}: {v}" for k, v in resumo.items()) + f" ({time.perf_counter() - t0:.1f} s)")
+    print("rede:", geocodificacao.estatisticas())
+
+
+if __name__ == "__main__":
+    main()
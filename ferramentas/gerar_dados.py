@@ -0,0 +1,388 @@
+"""
+Gera dados sintéticos realistas para todas as tabelas usadas pelo app.
+
+Escala 1 ~ volume atual (200 clientes, 2 mil reservas, 20 mil linhas de
+check-list); --escala 100 dá 20 mil clientes, 200 mil reservas, 2 milhões de
+linhas de check-list e 5 anos de custos. As colunas seguem o que as páginas
+carregam, inclusive a "sujeira" real: datas em "dd/mm/aaaa", "aaaa-mm-dd" e
+"dd-mm-aaaa" misturadas, células vazias e `brinquedos` separados por vírgula
+com espaçamento/caixa variando.
+
+Destinos:
+    python ferramentas/gerar_dados.py --escala 10 --saida dados_sinteticos/   # CSV por tabela
+    python ferramentas/gerar_dados.py --escala 10 --sqlite local.sqlite       # banco do servidor_local
+    python ferramentas/gerar_dados.py --escala 1 --url http://127.0.0.1:54321 # via REST (lento p/ escalas altas)
+
+Em código: tabelas = gerar(escala=10, semente=42) -> {tabela: DataFrame}
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Volume da escala 1 (≈ operação atual)
+BASE = {
+    "clientes": 200,
+    "reservas": 2_000,
+    "checklist": 20_000,
+    "custos_por_mes": 60,
+    "emprestimos": 5,
+    "km_log": 300,
+    "manutencoes": 30,
+}
+ANOS = 5
+
+NOMES = ["Ana", "Bruno", "Carla", "Diego", "Eduarda", "Felipe", "Gabriela", "Henrique", "Isabela", "João",
+         "Karina", "Lucas", "Mariana", "Nicolas", "Olívia", "Paulo", "Quésia", "Rafael", "Sofia", "Tiago",
+         "Úrsula", "Vinícius", "Wesley", "Yasmin", "Zeca"]
+SOBRENOMES = ["Silva", "Souza", "Oliveira", "Santos", "Lima", "Pereira", "Ferreira", "Almeida", "Costa",
+              "Gomes", "Ribeiro", "Martins", "Carvalho", "Rocha", "Araújo", "Barbosa", "Moreira", "Conceição"]
+CIDADES = [("Santo André", "09"), ("São Bernardo do Campo", "09"), ("São Caetano do Sul", "09"),
+           ("Mauá", "09"), ("Diadema", "09"), ("São Paulo", "0")]
+BAIRROS = ["Centro", "Jardim", "Vila Assunção", "Campestre", "Paraíso", "Bangu", "Vila Pires", "Utinga"]
+RUAS = ["Rua das Flores", "Av. Industrial", "Rua Coronel Oliveira Lima", "Rua Senador Fláquer",
+        "Av. Portugal", "Rua Catequese", "Rua Bernardino de Campos"]
+BRINQUEDOS_TRAD = ["Pula-pula", "Piscina de bolinhas", "Cama elástica", "Tobogã", "Castelo inflável",
+                   "Escorregador", "Gangorra", "Casinha", "Carrossel", "Futebol de sabão", "Tombo legal",
+                   "Air game", "Pebolim", "Aero hockey", "Toca do coelho"]
+BRINQUEDOS_MONT = ["Cozinha montessori", "Torre de aprendizagem", "Arco de Pikler", "Triângulo Pikler",
+                   "Tapete sensorial", "Cesto dos tesouros", "Painel sensorial", "Balanço montessori",
+                   "Túnel de tecido", "Blocos de espuma"]
+PECAS = ["Lona", "Rede de proteção", "Motor", "Extensão", "Estacas", "Saco de areia", "Bolinhas",
+         "Colchonete", "Escada", "Tapete", "Capa", "Bomba de ar"]
+CATEGORIAS_CUSTO = ["Combustível", "Manutenção", "Marketing", "Funcionários", "Impostos", "Aluguel", "Material"]
+FORMAS_PGTO = ["Pix", "Cartão", "Dinheiro", "Boleto"]
+STATUS_RESERVA = ["Pendente", "Concluído", "Confirmada"]
+
+
+def _datas_sujas(rng: np.random.Generator, datas: pd.DatetimeIndex, vazias: float = 0.01) -> np.ndarray:
+    """Mistura de formatos como vem do Supabase/planilhas antigas."""
+    iso = datas.strftime("%Y-%m-%d").to_numpy(dtype=object)
+    br = datas.strftime("%d/%m/%Y").to_numpy(dtype=object)
+    hif = datas.strftime("%d-%m-%Y").to_numpy(dtype=object)
+    sorteio = rng.random(len(datas))
+    out = np.where(sorteio < 0.70, iso, np.where(sorteio < 0.95, br, hif))
+    out[rng.random(len(datas)) < vazias] = ""
+    return out
+
+
+def _datas(rng: np.random.Generator, n: int, inicio: pd.Timestamp, fim: pd.Timestamp) -> pd.DatetimeIndex:
+    dias = (fim - inicio).days
+    return pd.DatetimeIndex(inicio + pd.to_timedelta(rng.integers(0, dias + 1, n), unit="D"))
+
+
+def _nomes(rng: np.random.Generator, n: int) -> np.ndarray:
+    a = rng.choice(NOMES, n)
+    b = rng.choice(SOBRENOMES, n)
+    c = rng.choice(SOBRENOMES, n)
+    # sufixo garante nomes únicos (o app casa reservas por nome do cliente)
+    return np.array([f"{x} {y} {z} {i}" for i, (x, y, z) in enumerate(zip(a, b, c), start=1)], dtype=object)
+
+
+def gerar(escala: float = 1.0, semente: int = 42, hoje: pd.Timestamp = None) -> Dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(semente)
+    hoje = (hoje or pd.Timestamp.today()).normalize()
+    inicio = hoje - pd.DateOffset(years=ANOS)
+    fim = hoje + pd.DateOffset(months=6)
+    n = {k: max(1, int(v * escala)) for k, v in BASE.items()}
+    t: Dict[str, pd.DataFrame] = {}
+
+    # ---------- brinquedos / peças ----------
+    nomes_b = BRINQUEDOS_TRAD + BRINQUEDOS_MONT
+    extras = int(10 * max(0.0, np.log10(max(escala, 1.0))) * 2)
+    nomes_b = nomes_b + [f"{nomes_b[i % len(nomes_b)]} {i // len(nomes_b) + 2}" for i in range(extras)]
+    cat_b = ["Montessori" if any(nm.startswith(m) for m in BRINQUEDOS_MONT) else "Tradicional" for nm in nomes_b]
+    nb = len(nomes_b)
+    compra = _datas(rng, nb, inicio, hoje)
+    t["brinquedos"] = pd.DataFrame({
+        "id_brinquedo": np.arange(1, nb + 1),
+        "nome": nomes_b,
+        "valor": rng.choice([150.0, 200.0, 250.0, 300.0, 350.0, 450.0], nb),
+        "valor_compra": rng.integers(800, 6000, nb).astype(float),
+        "data_compra": compra.strftime("%Y-%m-%d"),
+        "status": rng.choice(["Disponível", "Disponível", "Disponível", "Manutenção"], nb),
+        "categoria": cat_b,
+    })
+    pecas = [(b, p) for b in nomes_b for p in rng.choice(PECAS, rng.integers(2, 7), replace=False)]
+    t["pecas_brinquedos"] = pd.DataFrame(pecas, columns=["Brinquedo", "Item"])
+
+    # ---------- clientes ----------
+    nc = n["clientes"]
+    cid = rng.integers(0, len(CIDADES), nc)
+    prefixo = np.array([CIDADES[i][1] for i in cid], dtype=object)
+    cep = [f"{p}{rng.integers(0, 10 ** (5 - len(p) + 3)):0{8 - len(p)}d}" for p in prefixo]
+    cep = np.array([f"{c[:5]}-{c[5:]}" if rng.random() < 0.7 else c for c in cep], dtype=object)
+    nomes_c = _nomes(rng, nc)
+    tipo = rng.choice(["Pessoa Física", "Pessoa Jurídica"], nc, p=[0.9, 0.1])
+    t["clientes"] = pd.DataFrame({
+        "id_cliente": np.arange(1, nc + 1),
+        "nome": nomes_c,
+        "telefone": [f"(11) 9{rng.integers(1000, 9999)}-{rng.integers(1000, 9999)}" for _ in range(nc)],
+        "email": [f"cliente{i}@exemplo.com" for i in range(1, nc + 1)],
+        "tipo_cliente": tipo,
+        "cpf": [f"{rng.integers(0, 10 ** 11):011d}" if tp == "Pessoa Física" else "" for tp in tipo],
+        "cnpj": [f"{rng.integers(0, 10 ** 14):014d}" if tp != "Pessoa Física" else "" for tp in tipo],
+        "rg": [f"{rng.integers(10 ** 8, 10 ** 9)}" for _ in range(nc)],
+        "como_conseguiu": rng.choice(["Instagram", "Indicação", "Google", "WhatsApp", ""], nc),
+        "logradouro": rng.choice(RUAS, nc),
+        "numero": rng.integers(1, 3000, nc).astype(str),
+        "complemento": rng.choice(["", "", "Apto 12", "Casa 2", "Bloco B"], nc),
+        "bairro": rng.choice(BAIRROS, nc),
+        "cidade": [CIDADES[i][0] for i in cid],
+        "cep": cep,
+        "observacao": rng.choice(["", "", "Cliente recorrente", "Portão azul"], nc),
+        # sql/clientes_geocodificacao.sql: todos pendentes (geocodificacao.geocodificar_clientes)
+        "cep_geocodificado": None, "latitude": None, "longitude": None, "distancia_km": None,
+        "frete_tradicional": None, "frete_montessori": None, "geocodificado_em": None,
+    })
+
+    # ---------- reservas ----------
+    nr = n["reservas"]
+    datas_r = _datas(rng, nr, inicio, fim)
+    qtd = rng.integers(1, 5, nr)
+    idx = rng.integers(0, nb, int(qtd.sum()))
+    listas, pos = [], 0
+    for q in qtd:
+        itens = [nomes_b[i] for i in idx[pos:pos + q]]
+        pos += q
+        sep = ", " if rng.random() < 0.8 else ","
+        listas.append(sep.join(itens))
+    valor = np.round(rng.integers(2, 12, nr) * 50.0, 2)
+    extra = np.where(rng.random(nr) < 0.2, rng.integers(1, 6, nr) * 20.0, 0.0)
+    frete = np.round(rng.uniform(0, 120, nr), 2)
+    desconto = np.where(rng.random(nr) < 0.15, rng.integers(1, 5, nr) * 10.0, 0.0)
+    total = valor + extra + frete - desconto
+    sinal = np.round(np.where(datas_r < hoje, total, total * rng.choice([0.0, 0.3, 0.5], nr)), 2)
+    entrega = rng.choice(["07:00", "08:00", "09:00", "10:00"], nr)
+    inicio_f = rng.choice(["12:00", "13:00", "14:00", "15:00"], nr)
+    t["reservas"] = pd.DataFrame({
+        "id": np.arange(1, nr + 1),
+        "cliente": rng.choice(nomes_c, nr),
+        "brinquedos": listas,
+        "data": _datas_sujas(rng, datas_r),
+        "horario_entrega": entrega,
+        "horario_retirada": rng.choice(["18:00", "19:00", "20:00"], nr),
+        "inicio_festa": inicio_f,
+        "fim_festa": rng.choice(["17:00", "18:00"], nr),
+        "valor_total": np.round(total, 2),
+        "valor_extra": extra,
+        "frete": frete,
+        "desconto": desconto,
+        "sinal": sinal,
+        "falta": np.round(np.maximum(total - sinal, 0), 2),
+        "observacao": rng.choice(["", "", "", "Levar extensão", "Festa no salão"], nr),
+        "status": np.where(datas_r < hoje, "Concluído", rng.choice(STATUS_RESERVA, nr)),
+        "pagamentos": rng.choice(["", "Pix", "Pix; Dinheiro", "Cartão"], nr),
+        "contrato_gerado": np.where(rng.random(nr) < 0.6, "Sim", "Não"),
+    })
+
+    # ---------- pré-reservas (≈10% das reservas, mesmos cliente/data) ----------
+    amostra = t["reservas"].sample(frac=0.1, random_state=semente)
+    npr = len(amostra)
+    t["pre_reservas"] = pd.DataFrame({
+        "id": np.arange(1, npr + 1),
+        "nome": amostra["cliente"].to_numpy(),
+        "telefone": rng.choice(t["clientes"]["telefone"], npr),
+        "email": "",
+        "rg": "",
+        "cpf": "",
+        "como_conheceu": rng.choice(["Instagram", "Indicação", "Google"], npr),
+        "cep": rng.choice(cep, npr),
+        "logradouro": rng.choice(RUAS, npr),
+        "numero": rng.integers(1, 3000, npr).astype(str),
+        "complemento": "",
+        "bairro": rng.choice(BAIRROS, npr),
+        "cidade": rng.choice([c[0] for c in CIDADES], npr),
+        "observacao": "",
+        "data": amostra["data"].to_numpy(),
+        "hora_inicio": amostra["inicio_festa"].to_numpy(),
+        "hora_fim": amostra["fim_festa"].to_numpy(),
+        "brinquedos": amostra["brinquedos"].to_numpy(),
+        "status": rng.choice(["Pendente", "Aprovada", "Recusada"], npr, p=[0.2, 0.7, 0.1]),
+        "ocasiao": rng.choice(["Aniversário", "Batizado", "Chá revelação", "Festa escolar"], npr),
+        "tema": rng.choice(["Dinossauros", "Princesas", "Safari", "Fundo do mar", "Super-heróis"], npr),
+    })
+
+    # ---------- check-list (histórico Modelo B) ----------
+    nk = n["checklist"]
+    pecas_map = t["pecas_brinquedos"].groupby("Brinquedo")["Item"].apply(list).to_dict()
+    passadas = t["reservas"][datas_r < hoje]
+    linhas_k: List[tuple] = []
+    etapas = ["Montagem", "Entrega", "Retirada"]
+    for rid, cli, lst, dt in zip(passadas["id"], passadas["cliente"], passadas["brinquedos"], datas_r[datas_r < hoje]):
+        if len(linhas_k) >= nk:
+            break
+        quando = dt.strftime("%Y-%m-%d")
+        for b in [x.strip() for x in lst.split(",") if x.strip()]:
+            for etapa in etapas:
+                for item in pecas_map.get(b, ["No carro"]):
+                    linhas_k.append((int(rid), cli, b, etapa, item, quando))
+    linhas_k = linhas_k[:nk]
+    k = pd.DataFrame(linhas_k, columns=["reserva_id", "cliente", "brinquedo", "tipo", "item", "dia"])
+    nk = len(k)
+    ok = rng.random(nk) < 0.93
+    hora = rng.integers(7, 20, nk)
+    k["ok"] = np.where(ok, "✅", "❌")
+    k["data"] = k["dia"] + " " + pd.Series(hora).map("{:02d}:00".format).to_numpy()
+    k["observacao"] = np.where(rng.random(nk) < 0.05, "Peça com desgaste", "")
+    k["conferido_por"] = rng.choice(["admin", "bruno", "operacao"], nk)
+    k["completo"] = np.where(ok, "✅", "❌")
+    k["executado_em"] = pd.to_datetime(k["data"]).dt.strftime("%Y-%m-%dT%H:%M:%S-03:00")
+    t["checklist"] = k.drop(columns=["dia"])
+
+    # ---------- custos (5 anos) ----------
+    ncu = n["custos_por_mes"] * 12 * ANOS
+    datas_c = _datas(rng, ncu, inicio, hoje)
+    t["custos"] = pd.DataFrame({
+        "descricao": rng.choice(["Gasolina", "Troca de lona", "Anúncio Instagram", "Diária ajudante",
+                                 "DAS", "Galpão", "Fita/abraçadeiras"], ncu),
+        "categoria": rng.choice(CATEGORIAS_CUSTO, ncu),
+        "valor": np.round(rng.gamma(2.0, 90.0, ncu), 2),
+        "data": _datas_sujas(rng, datas_c, vazias=0.005),
+        "forma_de_pagamento": rng.choice(FORMAS_PGTO, ncu),
+        "observacao": rng.choice(["", "", "", "Nota fiscal pendente"], ncu),
+    })
+
+    # ---------- empréstimos ----------
+    ne = n["emprestimos"]
+    recebido = rng.integers(5, 50, ne) * 1000.0
+    a_pagar = np.round(recebido * rng.uniform(1.05, 1.4, ne), 2)
+    t["emprestimos"] = pd.DataFrame({
+        "id_emprestimo": np.arange(1, ne + 1),
+        "descricao": [f"Empréstimo {i}" for i in range(1, ne + 1)],
+        "observacao": "",
+        "valor_recebido": recebido,
+        "valor_a_pagar": a_pagar,
+        "juros": np.round(a_pagar / recebido * 100 - 100, 2),
+        "parcelas": rng.integers(6, 36, ne),
+        "valor_pendente": a_pagar,
+        "data": _datas(rng, ne, inicio, hoje).strftime("%Y-%m-%d"),
+        "status": "🟡 Pendente",
+        "criado_em": str(hoje),
+        "atualizado_em": str(hoje),
+    })
+    pag = []
+    for e in t["emprestimos"].itertuples():
+        for j in range(int(rng.integers(0, e.parcelas))):
+            pag.append((e.id_emprestimo, e.descricao, round(e.valor_a_pagar / e.parcelas, 2),
+                        (pd.Timestamp(e.data) + pd.DateOffset(months=j + 1)).strftime("%Y-%m-%d")))
+    t["pagamentos_emprestimos"] = pd.DataFrame(pag, columns=["id_emprestimo", "descricao", "valor_pago", "data_pagamento"])
+    t["pagamentos_emprestimos"].insert(0, "id_pagamento", np.arange(1, len(pag) + 1))
+
+    # ---------- metas ----------
+    meses = pd.date_range(inicio.replace(day=1), fim, freq="MS")
+    t["metas"] = pd.DataFrame({"anomes": meses.strftime("%Y-%m"), "meta": rng.integers(20, 80, len(meses)) * 100.0})
+
+    # ---------- frota ----------
+    placas = ["FTT1A23", "GTM4B56", "TIM7C89"]
+    t["veiculos"] = pd.DataFrame({
+        "placa": placas,
+        "modelo": ["Fiorino", "Saveiro", "HR"],
+        "tipo": ["Utilitário", "Picape", "Caminhão leve"],
+        "ano": [2018, 2020, 2016],
+        "status": "Ativo",
+        "km_atual": [150000, 80000, 210000],
+        "valor_veiculo": [55000.0, 70000.0, 90000.0],
+        "data_ipva": (hoje + pd.DateOffset(months=2)).strftime("%Y-%m-%d"),
+        "data_licenciamento": (hoje + pd.DateOffset(months=4)).strftime("%Y-%m-%d"),
+        "data_seguro": (hoje + pd.DateOffset(months=8)).strftime("%Y-%m-%d"),
+        "ipva_pago": ["Sim", "Não", "Não"],
+        "licenciamento_pago": "Não",
+        "seguro_pago": "Sim",
+        "observacao": "",
+    })
+    nm = n["manutencoes"]
+    t["manutencoes"] = pd.DataFrame({
+        "placa": rng.choice(placas, nm),
+        "tipo": rng.choice(["Troca de óleo", "Pneus", "Freios", "Motor", "Elétrica", "Suspensão", "Outros"], nm),
+        "descricao": "",
+        "data": _datas(rng, nm, inicio, hoje).strftime("%Y-%m-%d"),
+        "km": rng.integers(10000, 200000, nm),
+        "valor": np.round(rng.gamma(2.0, 300.0, nm), 2),
+    })
+    nkm = n["km_log"]
+    t["km_log"] = pd.DataFrame({
+        "placa": rng.choice(placas, nkm),
+        "data": _datas(rng, nkm, inicio, hoje).strftime("%Y-%m-%d"),
+        "km": np.sort(rng.integers(10000, 200000, nkm)),
+    })
+
+    # ---------- funcionários ----------
+    nf = 8
+    t["funcionarios"] = pd.DataFrame({
+        "nome": _nomes(rng, nf),
+        "cpf": [f"{rng.integers(0, 10 ** 11):011d}" for _ in range(nf)],
+        "cargo": rng.choice(["Montador", "Motorista", "Atendimento"], nf),
+        "categoria": rng.choice(["CLT", "Freelancer"], nf),
+        "telefone": [f"(11) 9{rng.integers(1000, 9999)}-{rng.integers(1000, 9999)}" for _ in range(nf)],
+        "data_nascimento": _datas_sujas(rng, _datas(rng, nf, pd.Timestamp("1970-01-01"), pd.Timestamp("2003-12-31")), 0),
+        "data_admissao": _datas(rng, nf, inicio, hoje).strftime("%d/%m/%Y"),
+        "status": "Ativo",
+        "foto": "",
+        "observacao": "",
+    })
+    return t
+
+
+def _registros(df: pd.DataFrame) -> List[dict]:
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
+def para_sqlite(tabelas: Dict[str, pd.DataFrame], caminho: str, lote: int = 5000) -> None:
+    """Grava direto no banco SQLite do servidor_local (muito mais rápido que via REST)."""
+    import servidor_local
+    banco = servidor_local.Banco(caminho)
+    for nome, df in tabelas.items():
+        regs = _registros(df)
+        for i in range(0, len(regs), lote):
+            banco.inserir(nome, regs[i:i + lote], None, None)
+        print(f"  {nome:<24}{len(regs):>10} linhas")
+
+
+def para_rest(tabelas: Dict[str, pd.DataFrame], url: str, lote: int = 1000) -> None:
+    import supabase_rest
+    supabase_rest.SUPABASE_URL = url.rstrip("/")
+    for nome, df in tabelas.items():
+        regs = _registros(df)
+        for i in range(0, len(regs), lote):
+            supabase_rest.table_insert(nome, regs[i:i + lote])
+        print(f"  {nome:<24}{len(regs):>10} linhas")
+
+
+def para_csv(tabelas: Dict[str, pd.DataFrame], pasta: str) -> None:
+    os.makedirs(pasta, exist_ok=True)
+    for nome, df in tabelas.items():
+        df.to_csv(os.path.join(pasta, f"{nome}.csv"), index=False)
+        print(f"  {nome:<24}{len(df):>10} linhas")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Gerador de dados sintéticos do TimTim Festas")
+    ap.add_argument("--escala", type=float, default=1.0, help="1 ≈ volume atual; 100 = 200 mil reservas")
+    ap.add_argument("--semente", type=int, default=42)
+    destino = ap.add_mutually_exclusive_group(required=True)
+    destino.add_argument("--saida", help="pasta para os CSVs")
+    destino.add_argument("--sqlite", help="arquivo SQLite do servidor_local")
+    destino.add_argument("--url", help="SUPABASE_URL de um servidor (ex.: servidor_local)")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    tabelas = gerar(args.escala, args.semente)
+    print(f"Gerado em {time.perf_counter() - t0:.1f}s (escala {args.escala:g}):")
+    if args.saida:
+        para_csv(tabelas, args.saida)
+    elif args.sqlite:
+        para_sqlite(tabelas, args.sqlite)
+    else:
+        para_rest(tabelas, args.url)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Gera o índice offline de prefixos de CEP (dados/ceps_prefixos.npz) usado por
+geocodificacao.estimar para a estimativa instantânea do frete.
+
+Fontes, todas opcionais e somadas:
+  * CSVs de CEPs conhecidos com colunas cep, lat, lon (latitude/longitude
+    também servem); o padrão é dados/ceps_referencia.csv;
+  * o cache de geocodificação (cache/geocodificacao.sqlite), que guarda as
+    coordenadas dos CEPs de clientes já cotados.
+
+Para cada prefixo de 5 e de 3 dígitos guarda a média das coordenadas dos
+CEPs que começam com ele, em arrays ordenados (int32 + float32).
+
+Uso:
+    python ferramentas/gerar_indice_ceps.py
+    python ferramentas/gerar_indice_ceps.py --csv ceps_extra.csv --csv outro.csv
+    python ferramentas/gerar_indice_ceps.py --sem-cache --saida /tmp/indice.npz
+"""
+import argparse
+import os
+import sqlite3
+import sys
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import geocodificacao  # noqa: E402
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CSV_PADRAO = os.path.join(RAIZ, "dados", "ceps_referencia.csv")
+
+
+def ler_csv(caminho: str) -> pd.DataFrame:
+    df = pd.read_csv(caminho, dtype={"cep": str})
+    df = df.rename(columns={"latitude": "lat", "longitude": "lon"})
+    faltam = {"cep", "lat", "lon"} - set(df.columns)
+    if faltam:
+        raise SystemExit(f"{caminho}: faltam as colunas {sorted(faltam)}")
+    return df[["cep", "lat", "lon"]]
+
+
+def ler_cache(caminho: str) -> pd.DataFrame:
+    if not caminho or not os.path.exists(caminho):
+        return pd.DataFrame(columns=["cep", "lat", "lon"])
+    with sqlite3.connect(caminho) as con:
+        return pd.read_sql_query(
+            "SELECT cep, lat, lon FROM ceps WHERE situacao = ? AND lat IS NOT NULL",
+            con, params=(geocodificacao.OK,),
+        )
+
+
+def compilar(pontos: pd.DataFrame) -> dict:
+    pontos = pontos.assign(cep=pontos["cep"].map(geocodificacao.normalizar_cep))
+    pontos["lat"] = pd.to_numeric(pontos["lat"], errors="coerce")
+    pontos["lon"] = pd.to_numeric(pontos["lon"], errors="coerce")
+    pontos = pontos.dropna().drop_duplicates("cep", keep="last")   # o cache vem por último e prevalece
+
+    arrays = {}
+    for n in geocodificacao.TAMANHOS_PREFIXO:
+        centro = pontos.groupby(pontos["cep"].str[:n].astype("int32"))[["lat", "lon"]].mean().sort_index()
+        arrays[f"p{n}"] = centro.index.to_numpy(dtype=np.int32)
+        arrays[f"lat{n}"] = centro["lat"].to_numpy(dtype=np.float32)
+        arrays[f"lon{n}"] = centro["lon"].to_numpy(dtype=np.float32)
+    return arrays
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Compila o índice de prefixos de CEP")
+    ap.add_argument("--csv", action="append", help=f"CSV cep,lat,lon (padrão: {CSV_PADRAO}); repetível")
+    ap.add_argument("--cache", default=geocodificacao.GEO_ARQUIVO, help="cache de geocodificação (SQLite)")
+    ap.add_argument("--sem-cache", action="store_true", help="ignora o cache de geocodificação")
+    ap.add_argument("--saida", default=geocodificacao.GEO_INDICE)
+    args = ap.parse_args()
+
+    partes: List[pd.DataFrame] = [ler_csv(c) for c in (args.csv or [CSV_PADRAO])]
+    n_csv = sum(len(p) for p in partes)
+    if not args.sem_cache:
+        partes.append(ler_cache(args.cache))
+    arrays = compilar(pd.concat(partes, ignore_index=True))
+
+    pasta = os.path.dirname(args.saida)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    np.savez_compressed(args.saida, **arrays)
+    print(
+        f"{n_csv} CEPs de CSV + {sum(map(len, partes)) - n_csv} do cache -> "
+        + ", ".join(f"{len(arrays[f'p{n}'])} prefixos de {n} dígitos" for n in geocodificacao.TAMANHOS_PREFIXO)
+        + f" ({os.path.getsize(args.saida)} bytes) em {args.saida}"
+    )
+
+
+if __name__ == "__main__":
+    main()
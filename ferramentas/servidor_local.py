@@ -0,0 +1,750 @@
+"""
+Stand-in local do Supabase (subconjunto do PostgREST + Storage) sobre SQLite.
+
+Implementa o que o supabase_rest usa, para testar e medir banco.py sem rede:
+  GET    /rest/v1/<tabela>   select, filtros (eq, neq, gt, gte, lt, lte, like,
+                             ilike, in, is, not.<op>, or=(...)), order, limit,
+                             offset, Range/Range-Unit, Prefer: count=exact,
+                             Accept: text/csv
+  POST   /rest/v1/<tabela>   insert; upsert com Prefer: resolution=merge-duplicates
+                             (ou ignore-duplicates) e ?on_conflict=
+  PATCH  /rest/v1/<tabela>   update com filtros
+  DELETE /rest/v1/<tabela>   delete com filtros (count=exact -> Content-Range)
+  GET/POST /rest/v1/rpc/<funcao>   funções de sql/indicadores.sql (em Python)
+  POST/PUT /storage/v1/object/<bucket>/<caminho>            upload (x-upsert)
+  GET    /storage/v1/object[/public]/<bucket>/<caminho>     download
+
+As tabelas nascem no primeiro insert (tipo da coluna pelo primeiro valor não
+nulo) e ganham colunas novas conforme aparecem; com --estrito, colunas
+desconhecidas numa tabela existente dão erro 400 como no PostgREST. Toda
+tabela tem "id" (identity); a chave do banco.CHAVES_TABELAS, quando outra,
+vira UNIQUE e, nessas tabelas, "updated_at" é mantido como pelo
+sql/sincronizacao.sql. Respostas de erro seguem o formato do PostgREST (code/message).
+
+Uso:
+    python ferramentas/servidor_local.py [--porta 54321] [--banco local.sqlite]
+        [--latencia-ms 0] [--jitter-ms 0] [--taxa-erro 0] [--max-linhas 1000] [--estrito]
+    SUPABASE_URL=http://127.0.0.1:54321 streamlit run app.py
+
+Em código (benchs): url, srv = iniciar(latencia_ms=5); ...; srv.shutdown()
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import re
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from banco import CHAVES_TABELAS
+except Exception:   # sem pandas/numpy: o servidor funciona sem as chaves do app
+    CHAVES_TABELAS = {}
+
+_PARAMS_RESERVADOS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+_OPS_SQL = {"eq": "=", "neq": "<>", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+_NOME_OK = re.compile(r"^[A-Za-z_][A-Za-z0-9_ ]*$")
+_AGORA_SQL = "strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')"
+
+
+class ErroPostgrest(Exception):
+    def __init__(self, status: int, code: str, message: str):
+        super().__init__(message)
+        self.status, self.code, self.message = status, code, message
+
+    def corpo(self) -> bytes:
+        return json.dumps({"code": self.code, "details": None, "hint": None, "message": self.message}).encode()
+
+
+def _q(nome: str) -> str:
+    return '"' + nome.replace('"', '""') + '"'
+
+
+def _dividir(texto: str, sep: str = ",") -> List[str]:
+    """Divide respeitando parênteses e aspas: a.eq.1,b.in.(1,2) -> [a.eq.1, b.in.(1,2)]."""
+    partes, atual, nivel, aspas = [], [], 0, False
+    i = 0
+    while i < len(texto):
+        c = texto[i]
+        if c == "\\" and aspas and i + 1 < len(texto):
+            atual.append(texto[i + 1])
+            i += 2
+            continue
+        if c == '"':
+            aspas = not aspas
+        elif not aspas and c == "(":
+            nivel += 1
+        elif not aspas and c == ")":
+            nivel -= 1
+        if c == sep and nivel == 0 and not aspas:
+            partes.append("".join(atual))
+            atual = []
+        else:
+            atual.append(c)
+        i += 1
+    partes.append("".join(atual))
+    return partes
+
+
+def _sem_aspas(v: str) -> str:
+    return v[1:-1] if len(v) >= 2 and v[0] == v[-1] == '"' else v
+
+
+# public.data_segura / public.num_seguro de sql/indicadores.sql, com as
+# mesmas regras de calculos.FORMATOS_DATA / NUMERO_TEXTO (sem importar
+# pandas: o servidor roda sem ele).
+_DATAS_SEGURAS = (
+    (re.compile(r"\d{4}-\d{2}-\d{2}"), "%Y-%m-%d"),
+    (re.compile(r"\d{1,2}/\d{1,2}/\d{4}$"), "%d/%m/%Y"),
+    (re.compile(r"\d{1,2}-\d{1,2}-\d{4}$"), "%d-%m-%Y"),
+    (re.compile(r"\d{1,2}/\d{1,2}/\d{2}$"), "%d/%m/%y"),
+)
+_NUMERO_SEGURO = re.compile(r"[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?")
+
+
+def _data_segura(v: Any) -> Optional[str]:
+    s = str(v or "").strip(" \t\r\n").split(" ")[0]
+    for padrao, fmt in _DATAS_SEGURAS:
+        if not padrao.match(s):
+            continue
+        if fmt == "%Y-%m-%d":
+            s = s[:10]
+        elif fmt == "%d/%m/%y":   # século como o Postgres: aa < 70 -> 20aa
+            aa = int(s[-2:])
+            s, fmt = s[:-2] + str(aa + (1900 if aa >= 70 else 2000)), "%d/%m/%Y"
+        try:
+            return datetime.strptime(s, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            return None   # ex.: 31/02/2025
+    return None
+
+
+def _num_seguro(v: Any) -> float:
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return float(v) if v == v else 0.0
+    s = re.sub(r"^R\$\s*", "", str(v or "").strip(" \t\r\n"))
+    if "," in s:
+        s = s.replace(".", "").replace(",", ".")   # "1.200,50" -> "1200.50"
+    return float(s) if _NUMERO_SEGURO.fullmatch(s) else 0.0
+
+
+class Banco:
+    """SQLite + metadados de tipo (bool/json) das colunas. Acesso serializado."""
+
+    def __init__(self, caminho: str = ":memory:", estrito: bool = False):
+        self.con = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None)
+        self.lock = threading.Lock()
+        self.estrito = estrito
+        self.con.create_function("data_segura", 1, _data_segura, deterministic=True)
+        self.con.create_function("num_seguro", 1, _num_seguro, deterministic=True)
+        self.con.execute(
+            "CREATE TABLE IF NOT EXISTS _colunas (tabela TEXT, coluna TEXT, tipo TEXT, PRIMARY KEY (tabela, coluna))"
+        )
+        self.con.execute(
+            "CREATE TABLE IF NOT EXISTS _storage (bucket TEXT, caminho TEXT, mime TEXT, dados BLOB, "
+            "PRIMARY KEY (bucket, caminho))"
+        )
+
+    # ---------- esquema ----------
+    def colunas(self, tabela: str) -> Dict[str, str]:
+        """coluna -> tipo lógico (int, float, text, bool, json)."""
+        linhas = self.con.execute(f"PRAGMA table_info({_q(tabela)})").fetchall()
+        if not linhas:
+            return {}
+        extras = dict(self.con.execute("SELECT coluna, tipo FROM _colunas WHERE tabela = ?", (tabela,)).fetchall())
+        tipos = {"INTEGER": "int", "REAL": "float"}
+        return {l[1]: extras.get(l[1], tipos.get(l[2].upper(), "text")) for l in linhas}
+
+    @staticmethod
+    def _tipo(v: Any) -> Optional[str]:
+        if v is None:
+            return None
+        if isinstance(v, bool):
+            return "bool"
+        if isinstance(v, int):
+            return "int"
+        if isinstance(v, float):
+            return "float"
+        if isinstance(v, (dict, list)):
+            return "json"
+        return "text"
+
+    def _garantir(self, tabela: str, linhas: List[Dict[str, Any]]) -> Dict[str, str]:
+        if not _NOME_OK.match(tabela) or tabela.startswith(("_", "sqlite_")):
+            raise ErroPostgrest(404, "42P01", f'relation "public.{tabela}" does not exist')
+        existentes = self.colunas(tabela)
+        tipos: Dict[str, Optional[str]] = {}
+        for linha in linhas:
+            for k, v in linha.items():
+                if tipos.get(k) is None:
+                    tipos[k] = self._tipo(v)
+        novas = [c for c in tipos if c not in existentes]
+        if existentes and novas and self.estrito:
+            raise ErroPostgrest(400, "PGRST204", f"Could not find the '{novas[0]}' column of '{tabela}' in the schema cache")
+        sql_tipo = {"int": "INTEGER", "bool": "INTEGER", "float": "REAL"}
+        if not existentes:
+            chave = CHAVES_TABELAS.get(tabela, "id")
+            defs = ['"id" INTEGER PRIMARY KEY AUTOINCREMENT']
+            for c in novas:
+                if c == "id":
+                    continue
+                defs.append(f"{_q(c)} {sql_tipo.get(tipos[c] or '', 'TEXT')}" + (" UNIQUE" if c == chave else ""))
+            if chave != "id" and chave not in tipos:
+                defs.append(f"{_q(chave)} {'INTEGER' if chave.startswith('id_') else 'TEXT'} UNIQUE")
+            marca = tabela in CHAVES_TABELAS and "updated_at" not in tipos
+            if marca:
+                defs.append(f'"updated_at" TEXT DEFAULT ({_AGORA_SQL})')
+            self.con.execute(f"CREATE TABLE {_q(tabela)} ({', '.join(defs)})")
+            if marca:
+                # como sql/sincronizacao.sql: updated_at = now() em todo update
+                self.con.execute(
+                    f"CREATE TRIGGER {_q(tabela + '_updated_at')} AFTER UPDATE ON {_q(tabela)} "
+                    f"WHEN NEW.updated_at IS OLD.updated_at BEGIN "
+                    f"UPDATE {_q(tabela)} SET updated_at = {_AGORA_SQL} WHERE id = NEW.id; END"
+                )
+        else:
+            for c in novas:
+                self.con.execute(f"ALTER TABLE {_q(tabela)} ADD COLUMN {_q(c)} {sql_tipo.get(tipos[c] or '', 'TEXT')}")
+        for c, t in tipos.items():
+            if t in ("bool", "json") and c in novas:
+                self.con.execute("INSERT OR REPLACE INTO _colunas VALUES (?, ?, ?)", (tabela, c, t))
+        return self.colunas(tabela)
+
+    def _unicas(self, tabela: str) -> List[Tuple[str, ...]]:
+        grupos = [("id",)]
+        for idx in self.con.execute(f"PRAGMA index_list({_q(tabela)})").fetchall():
+            if idx[2]:   # unique
+                cols = [c[2] for c in self.con.execute(f"PRAGMA index_info({_q(idx[1])})").fetchall()]
+                grupos.append(tuple(cols))
+        return grupos
+
+    # ---------- valores ----------
+    @staticmethod
+    def _para_sql(v: Any) -> Any:
+        if isinstance(v, bool):
+            return int(v)
+        if isinstance(v, (dict, list)):
+            return json.dumps(v, ensure_ascii=False)
+        return v
+
+    @staticmethod
+    def _param(tipo: str, v: str) -> Any:
+        if tipo == "bool":
+            return {"true": 1, "false": 0}.get(v.lower(), v)
+        return v
+
+    @staticmethod
+    def _de_sql(linha: Dict[str, Any], cols: Dict[str, str]) -> Dict[str, Any]:
+        for c, t in cols.items():
+            v = linha.get(c)
+            if v is None:
+                continue
+            if t == "bool":
+                linha[c] = bool(v)
+            elif t == "float" and isinstance(v, int):
+                linha[c] = float(v)
+            elif t == "json":
+                try:
+                    linha[c] = json.loads(v)
+                except (TypeError, ValueError):
+                    pass
+        return linha
+
+    # ---------- filtros ----------
+    def _condicao(self, cols: Dict[str, str], tabela: str, col: str, expr: str) -> Tuple[str, List[Any]]:
+        if col not in cols:
+            raise ErroPostgrest(400, "42703", f"column {tabela}.{col} does not exist")
+        negar = expr.startswith("not.")
+        if negar:
+            expr = expr[4:]
+        op, _, val = expr.partition(".")
+        tipo = cols[col]
+        c = _q(col)
+        if op in _OPS_SQL:
+            sql, params = f"{c} {_OPS_SQL[op]} ?", [self._param(tipo, _sem_aspas(val))]
+        elif op in ("like", "ilike"):
+            padrao = _sem_aspas(val).replace("*", "%")
+            sql, params = (f"{c} LIKE ?" if op == "ilike" else f"{c} GLOB ?"), [padrao if op == "ilike" else _sem_aspas(val)]
+        elif op == "in":
+            itens = [self._param(tipo, _sem_aspas(x)) for x in _dividir(val.strip()[1:-1])] if val.strip() != "()" else []
+            sql, params = (f"{c} IN ({', '.join('?' * len(itens))})" if itens else "0"), itens
+        elif op == "is":
+            alvo = {"null": "IS NULL", "true": "= 1", "false": "= 0"}.get(val.lower())
+            if alvo is None:
+                raise ErroPostgrest(400, "PGRST100", f"failed to parse filter (is.{val})")
+            sql, params = f"{c} {alvo}", []
+        else:
+            raise ErroPostgrest(400, "PGRST100", f"failed to parse filter ({op}.{val})")
+        return (f"NOT ({sql})" if negar else sql), params
+
+    def _where(self, tabela: str, cols: Dict[str, str], filtros: List[Tuple[str, str]]) -> Tuple[str, List[Any]]:
+        partes, params = [], []
+        for chave, expr in filtros:
+            if chave in ("or", "and"):
+                sub, sub_params = [], []
+                for item in _dividir(expr.strip()[1:-1]):
+                    col, _, resto = item.partition(".")
+                    s, p = self._condicao(cols, tabela, col, resto)
+                    sub.append(s)
+                    sub_params += p
+                if sub:
+                    partes.append("(" + f" {chave.upper()} ".join(sub) + ")")
+                    params += sub_params
+            else:
+                s, p = self._condicao(cols, tabela, chave, expr)
+                partes.append(s)
+                params += p
+        return (" WHERE " + " AND ".join(partes)) if partes else "", params
+
+    # ---------- operações ----------
+    def select(self, tabela: str, query: List[Tuple[str, str]], inicio: int, limite: Optional[int],
+               contar: bool) -> Tuple[List[str], List[Dict[str, Any]], Optional[int]]:
+        with self.lock:
+            cols = self.colunas(tabela)
+            if not cols:
+                # tabela ainda não criada (nenhum insert): devolve vazio
+                return [], [], 0 if contar else None
+            q = dict(query)
+            pedidas = [c.strip() for c in q.get("select", "*").split(",") if c.strip()]
+            if pedidas == ["*"] or not pedidas:
+                pedidas = list(cols)
+            for c in pedidas:
+                if c not in cols:
+                    raise ErroPostgrest(400, "42703", f"column {tabela}.{c} does not exist")
+            where, params = self._where(tabela, cols, [(k, v) for k, v in query if k not in _PARAMS_RESERVADOS])
+            ordem = ""
+            if q.get("order"):
+                termos = []
+                for termo in q["order"].split(","):
+                    partes = termo.split(".")
+                    if partes[0] not in cols:
+                        raise ErroPostgrest(400, "42703", f"column {tabela}.{partes[0]} does not exist")
+                    direcao = "DESC" if "desc" in partes[1:] else "ASC"
+                    nulos = " NULLS FIRST" if "nullsfirst" in partes[1:] else " NULLS LAST" if "nullslast" in partes[1:] else ""
+                    termos.append(f"{_q(partes[0])} {direcao}{nulos}")
+                ordem = " ORDER BY " + ", ".join(termos)
+            sql = f"SELECT {', '.join(_q(c) for c in pedidas)} FROM {_q(tabela)}{where}{ordem}"
+            sql += f" LIMIT {int(limite) if limite is not None else -1} OFFSET {int(inicio)}"
+            cur = self.con.execute(sql, params)
+            linhas = [self._de_sql(dict(zip(pedidas, r)), cols) for r in cur.fetchall()]
+            total = None
+            if contar:
+                total = self.con.execute(f"SELECT COUNT(*) FROM {_q(tabela)}{where}", params).fetchone()[0]
+            return pedidas, linhas, total
+
+    def inserir(self, tabela: str, linhas: List[Dict[str, Any]], resolucao: Optional[str],
+                on_conflict: Optional[str]) -> List[Dict[str, Any]]:
+        with self.lock:
+            cols = self._garantir(tabela, linhas)
+            alvo: Tuple[str, ...] = ()
+            if resolucao:
+                alvo = tuple(c.strip() for c in (on_conflict or "id").split(","))
+                if alvo not in self._unicas(tabela):
+                    raise ErroPostgrest(
+                        400, "42P10",
+                        "there is no unique or exclusion constraint matching the ON CONFLICT specification",
+                    )
+            auto = CHAVES_TABELAS.get(tabela, "id")
+            auto = auto if auto != "id" and auto.startswith("id_") else None
+            self.con.execute("BEGIN")
+            try:
+                saida = []
+                for linha in linhas:
+                    linha = dict(linha)
+                    if auto and linha.get(auto) is None:
+                        linha[auto] = self.con.execute(
+                            f"SELECT COALESCE(MAX(CAST({_q(auto)} AS INTEGER)), 0) + 1 FROM {_q(tabela)}"
+                        ).fetchone()[0]
+                    if linha.get("id") is None:
+                        linha.pop("id", None)
+                    nomes = list(linha)
+                    sql = (
+                        f"INSERT INTO {_q(tabela)} ({', '.join(_q(c) for c in nomes)}) "
+                        f"VALUES ({', '.join('?' * len(nomes))})"
+                    ) if nomes else f"INSERT INTO {_q(tabela)} DEFAULT VALUES"
+                    if resolucao and all(c in linha for c in alvo):
+                        sets = [f"{_q(c)} = excluded.{_q(c)}" for c in nomes if c not in alvo]
+                        if resolucao == "ignore-duplicates" or not sets:
+                            sql += f" ON CONFLICT ({', '.join(_q(c) for c in alvo)}) DO NOTHING"
+                        else:
+                            sql += f" ON CONFLICT ({', '.join(_q(c) for c in alvo)}) DO UPDATE SET {', '.join(sets)}"
+                    cur = self.con.execute(sql + " RETURNING *", [self._para_sql(linha[c]) for c in nomes])
+                    nomes_saida = [d[0] for d in cur.description]
+                    saida += [self._de_sql(dict(zip(nomes_saida, r)), cols) for r in cur.fetchall()]
+                self.con.execute("COMMIT")
+            except sqlite3.IntegrityError as e:
+                self.con.execute("ROLLBACK")
+                if "UNIQUE" in str(e):
+                    raise ErroPostgrest(409, "23505", f"duplicate key value violates unique constraint ({e})")
+                raise ErroPostgrest(400, "23502", str(e))
+            except Exception:
+                self.con.execute("ROLLBACK")
+                raise
+            return saida
+
+    def atualizar(self, tabela: str, query: List[Tuple[str, str]], valores: Dict[str, Any]) -> List[Dict[str, Any]]:
+        with self.lock:
+            if not self.colunas(tabela):
+                raise ErroPostgrest(404, "42P01", f'relation "public.{tabela}" does not exist')
+            cols = self._garantir(tabela, [valores])
+            where, params = self._where(tabela, cols, [(k, v) for k, v in query if k not in _PARAMS_RESERVADOS])
+            if not valores:
+                return []
+            sets = ", ".join(f"{_q(c)} = ?" for c in valores)
+            try:
+                cur = self.con.execute(
+                    f"UPDATE {_q(tabela)} SET {sets}{where} RETURNING *",
+                    [self._para_sql(v) for v in valores.values()] + params,
+                )
+            except sqlite3.IntegrityError as e:
+                raise ErroPostgrest(409, "23505", f"duplicate key value violates unique constraint ({e})")
+            nomes = [d[0] for d in cur.description]
+            return [self._de_sql(dict(zip(nomes, r)), cols) for r in cur.fetchall()]
+
+    def remover(self, tabela: str, query: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        with self.lock:
+            cols = self.colunas(tabela)
+            if not cols:
+                raise ErroPostgrest(404, "42P01", f'relation "public.{tabela}" does not exist')
+            where, params = self._where(tabela, cols, [(k, v) for k, v in query if k not in _PARAMS_RESERVADOS])
+            cur = self.con.execute(f"DELETE FROM {_q(tabela)}{where} RETURNING *", params)
+            nomes = [d[0] for d in cur.description]
+            return [self._de_sql(dict(zip(nomes, r)), cols) for r in cur.fetchall()]
+
+    # ---------- rpc (funções de sql/indicadores.sql) ----------
+    def rpc(self, funcao: str, args: Dict[str, Any]) -> List[Dict[str, Any]]:
+        metodo = getattr(self, f"_rpc_{funcao}", None) if _NOME_OK.match(funcao) else None
+        if metodo is None:
+            raise ErroPostgrest(404, "PGRST202",
+                                f"Could not find the function public.{funcao} without parameters in the schema cache")
+        with self.lock:
+            return metodo(**args)
+
+    def _expr(self, tabela: str, coluna: str) -> str:
+        return _q(coluna) if coluna in self.colunas(tabela) else "NULL"
+
+    def _rpc_indicadores_mensais(self) -> List[Dict[str, Any]]:
+        partes = []
+        if self.colunas("reservas"):
+            e = lambda c: self._expr("reservas", c)  # noqa: E731
+            partes.append(
+                f"SELECT substr(data_segura({e('data')}), 1, 7) AS mes, sum(max(num_seguro({e('valor_total')}), 0)) "
+                f"AS bruto, 0.0 AS custo, count(*) AS qtd, sum(num_seguro({e('sinal')})) AS sinal "
+                f"FROM reservas WHERE mes IS NOT NULL GROUP BY mes"
+            )
+        if self.colunas("custos"):
+            e = lambda c: self._expr("custos", c)  # noqa: E731
+            partes.append(
+                f"SELECT substr(data_segura({e('data')}), 1, 7) AS mes, 0.0, sum(num_seguro({e('valor')})), 0, 0.0 "
+                f"FROM custos WHERE mes IS NOT NULL GROUP BY mes"
+            )
+        if not partes:
+            return []
+        cur = self.con.execute(
+            "SELECT mes AS anomes, sum(bruto) AS bruto, sum(custo) AS custo, max(sum(bruto) - sum(custo), 0) "
+            f"AS liquido, sum(qtd) AS qtd_reservas, sum(sinal) AS sinal FROM ({' UNION ALL '.join(partes)}) "
+            "GROUP BY mes ORDER BY mes"
+        )
+        nomes = [d[0] for d in cur.description]
+        return [dict(zip(nomes, l)) for l in cur.fetchall()]
+
+    def _rpc_desempenho_brinquedos(self) -> List[Dict[str, Any]]:
+        if not self.colunas("reservas"):
+            return []
+        e = lambda c: self._expr("reservas", c)  # noqa: E731
+        cur = self.con.execute(
+            f"SELECT {e('brinquedos')}, max(num_seguro({e('valor_total')}) + num_seguro({e('valor_extra')}) "
+            f"+ num_seguro({e('frete')}) - num_seguro({e('desconto')}), 0) FROM reservas "
+            f"WHERE data_segura({e('data')}) IS NOT NULL"
+        )
+        soma: Dict[str, List[float]] = {}
+        for lista, bruto in cur:
+            itens = [x.strip() for x in str(lista or "").split(",") if x.strip()]
+            for nome in itens:
+                acc = soma.setdefault(nome, [0.0, 0])
+                acc[0] += bruto / len(itens)
+                acc[1] += 1
+        linhas = [{"brinquedo": n, "valor_total": v, "locacoes": q} for n, (v, q) in soma.items()]
+        return sorted(linhas, key=lambda l: (-l["valor_total"], -l["locacoes"]))
+
+    # ---------- storage ----------
+    def gravar_objeto(self, bucket: str, caminho: str, mime: str, dados: bytes, substituir: bool) -> None:
+        with self.lock:
+            try:
+                self.con.execute(
+                    f"INSERT {'OR REPLACE ' if substituir else ''}INTO _storage VALUES (?, ?, ?, ?)",
+                    (bucket, caminho, mime, dados),
+                )
+            except sqlite3.IntegrityError:
+                raise ErroPostgrest(409, "Duplicate", "The resource already exists")
+
+    def ler_objeto(self, bucket: str, caminho: str) -> Optional[Tuple[str, bytes]]:
+        with self.lock:
+            r = self.con.execute("SELECT mime, dados FROM _storage WHERE bucket = ? AND caminho = ?", (bucket, caminho)).fetchone()
+        return (r[0], bytes(r[1])) if r else None
+
+
+class Servidor(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, endereco, banco: Banco, latencia_ms: float = 0.0, jitter_ms: float = 0.0,
+                 taxa_erro: float = 0.0, max_linhas: int = 1000, latencia_conexao_ms: float = 0.0):
+        super().__init__(endereco, _Handler)
+        self.banco = banco
+        self.latencia_ms = latencia_ms
+        self.jitter_ms = jitter_ms
+        self.taxa_erro = taxa_erro
+        self.max_linhas = max_linhas
+        self.latencia_conexao_ms = latencia_conexao_ms
+        self.conexoes = 0
+        self.requisicoes = 0
+        self._cont_lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: Servidor
+
+    def setup(self):
+        super().setup()
+        # sem Nagle: cabeçalho e corpo saem em writes separados
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server._cont_lock:
+            self.server.conexoes += 1
+        # simula o custo de abrir conexão (RTT do handshake TCP/TLS)
+        if self.server.latencia_conexao_ms:
+            time.sleep(self.server.latencia_conexao_ms / 1000.0)
+
+    def log_message(self, *args):
+        pass
+
+    # ---------- infraestrutura ----------
+    def _responder(self, status: int, corpo: bytes = b"", tipo: str = "application/json",
+                   extras: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        if corpo or status not in (204,):
+            self.send_header("Content-Type", tipo)
+        for k, v in (extras or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        if corpo and self.command != "HEAD":
+            self.wfile.write(corpo)
+
+    def _corpo(self) -> bytes:
+        n = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(n) if n else b""
+
+    def _prefer(self) -> Dict[str, str]:
+        out = {}
+        for item in (self.headers.get("Prefer") or "").split(","):
+            k, _, v = item.strip().partition("=")
+            if k:
+                out[k] = v
+        return out
+
+    def _atender(self, metodo) -> None:
+        srv = self.server
+        with srv._cont_lock:
+            srv.requisicoes += 1
+        atraso = srv.latencia_ms + (random.uniform(0, srv.jitter_ms) if srv.jitter_ms else 0.0)
+        if atraso:
+            time.sleep(atraso / 1000.0)
+        if srv.taxa_erro and random.random() < srv.taxa_erro:
+            self._corpo()
+            self._responder(503, b'{"message":"falha simulada"}')
+            return
+        url = urlparse(self.path)
+        try:
+            metodo(unquote(url.path), parse_qsl(url.query, keep_blank_values=True))
+        except ErroPostgrest as e:
+            self._responder(e.status, e.corpo())
+        except (ValueError, sqlite3.Error) as e:
+            self._responder(400, ErroPostgrest(400, "PGRST100", str(e)).corpo())
+
+    def do_GET(self):
+        self._atender(self._get)
+
+    def do_HEAD(self):
+        self._atender(self._get)
+
+    def do_POST(self):
+        self._atender(self._post)
+
+    def do_PUT(self):
+        self._atender(self._post)
+
+    def do_PATCH(self):
+        self._atender(self._patch)
+
+    def do_DELETE(self):
+        self._atender(self._delete)
+
+    # ---------- rotas ----------
+    @staticmethod
+    def _rota(caminho: str) -> Tuple[str, str]:
+        if caminho.startswith("/rest/v1/"):
+            return "rest", caminho[len("/rest/v1/"):].strip("/")
+        if caminho.startswith("/storage/v1/object/"):
+            return "storage", caminho[len("/storage/v1/object/"):]
+        raise ErroPostgrest(404, "PGRST125", f"Invalid path specified in request URL: {caminho}")
+
+    def _linhas_json(self, linhas: List[Dict[str, Any]], status: int, extras: Optional[Dict[str, str]] = None,
+                     colunas: Optional[List[str]] = None) -> None:
+        if "text/csv" in (self.headers.get("Accept") or ""):
+            buf = io.StringIO()
+            nomes = colunas or (list(linhas[0]) if linhas else [])
+            w = csv.writer(buf, lineterminator="\n")
+            if nomes:
+                w.writerow(nomes)
+            for l in linhas:
+                w.writerow(["" if l.get(c) is None else ("true" if l[c] is True else "false" if l[c] is False else l[c])
+                            for c in nomes])
+            self._responder(status, buf.getvalue().encode("utf-8"), "text/csv; charset=utf-8", extras)
+            return
+        self._responder(status, json.dumps(linhas, ensure_ascii=False, default=str).encode("utf-8"), extras=extras)
+
+    def _get(self, caminho: str, query: List[Tuple[str, str]]) -> None:
+        tipo, alvo = self._rota(caminho)
+        if tipo == "storage":
+            bucket, _, obj = (alvo[len("public/"):] if alvo.startswith("public/") else alvo).partition("/")
+            achado = self.server.banco.ler_objeto(bucket, obj)
+            if achado is None:
+                raise ErroPostgrest(404, "not_found", "Object not found")
+            self._responder(200, achado[1] if self.command == "GET" else b"", achado[0])
+            return
+
+        if alvo.startswith("rpc/"):
+            self._linhas_json(self.server.banco.rpc(alvo[4:], dict(query)), 200)
+            return
+
+        q = dict(query)
+        inicio = int(q.get("offset") or 0)
+        limite = int(q["limit"]) if q.get("limit") else None
+        faixa = self.headers.get("Range")
+        if faixa and "-" in faixa:
+            a, _, b = faixa.partition("-")
+            inicio += int(a)
+            if b:
+                limite = min(limite, int(b) - int(a) + 1) if limite is not None else int(b) - int(a) + 1
+        maximo = self.server.max_linhas
+        if maximo:
+            limite = min(limite, maximo) if limite is not None else maximo
+        contar = self._prefer().get("count") in ("exact", "planned", "estimated")
+
+        colunas, linhas, total = self.server.banco.select(alvo, query, inicio, limite, contar)
+        if total is not None and inicio > 0 and inicio >= total:
+            self._responder(416, ErroPostgrest(
+                416, "PGRST103", "Requested range not satisfiable").corpo(),
+                extras={"Content-Range": f"*/{total}"})
+            return
+        total_txt = "*" if total is None else str(total)
+        faixa_txt = f"{inicio}-{inicio + len(linhas) - 1}" if linhas else "*"
+        parcial = total is not None and len(linhas) < total
+        self._linhas_json(linhas, 206 if parcial else 200, {"Content-Range": f"{faixa_txt}/{total_txt}"}, colunas)
+
+    def _post(self, caminho: str, query: List[Tuple[str, str]]) -> None:
+        tipo, alvo = self._rota(caminho)
+        corpo = self._corpo()
+        if tipo == "storage":
+            bucket, _, obj = alvo.partition("/")
+            substituir = self.command == "PUT" or (self.headers.get("x-upsert") or "").lower() == "true"
+            mime = self.headers.get("Content-Type") or "application/octet-stream"
+            self.server.banco.gravar_objeto(bucket, obj, mime, corpo, substituir)
+            self._responder(200, json.dumps({"Key": f"{bucket}/{obj}"}).encode())
+            return
+
+        if alvo.startswith("rpc/"):
+            self._linhas_json(self.server.banco.rpc(alvo[4:], json.loads(corpo or b"{}")), 200)
+            return
+
+        dados = json.loads(corpo or b"[]")
+        linhas = dados if isinstance(dados, list) else [dados]
+        prefer = self._prefer()
+        resolucao = prefer.get("resolution")
+        saida = self.server.banco.inserir(alvo, linhas, resolucao, dict(query).get("on_conflict"))
+        extras = {"Content-Range": f"*/{len(saida)}"}
+        if prefer.get("return") == "representation":
+            self._linhas_json(saida, 201, extras)
+        else:
+            self._responder(201, b"", extras=extras)
+
+    def _patch(self, caminho: str, query: List[Tuple[str, str]]) -> None:
+        _, alvo = self._rota(caminho)
+        valores = json.loads(self._corpo() or b"{}")
+        saida = self.server.banco.atualizar(alvo, query, valores)
+        extras = {"Content-Range": f"0-{len(saida) - 1}/*" if saida else "*/*"}
+        if self._prefer().get("return") == "representation":
+            self._linhas_json(saida, 200, extras)
+        else:
+            self._responder(204, extras=extras)
+
+    def _delete(self, caminho: str, query: List[Tuple[str, str]]) -> None:
+        _, alvo = self._rota(caminho)
+        saida = self.server.banco.remover(alvo, query)
+        prefer = self._prefer()
+        total = str(len(saida)) if prefer.get("count") == "exact" else "*"
+        extras = {"Content-Range": f"*/{total}"}
+        if prefer.get("return") == "representation":
+            self._linhas_json(saida, 200, extras)
+        else:
+            self._responder(204, extras=extras)
+
+
+def iniciar(
+    banco: str = ":memory:",
+    porta: int = 0,
+    latencia_ms: float = 0.0,
+    jitter_ms: float = 0.0,
+    taxa_erro: float = 0.0,
+    max_linhas: int = 1000,
+    estrito: bool = False,
+    latencia_conexao_ms: float = 0.0,
+) -> Tuple[str, Servidor]:
+    """Sobe o servidor numa thread (daemon). Retorna (url, servidor); pare com servidor.shutdown()."""
+    srv = Servidor(("127.0.0.1", porta), Banco(banco, estrito), latencia_ms, jitter_ms, taxa_erro, max_linhas,
+                   latencia_conexao_ms)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv.url, srv
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Stand-in local do Supabase (PostgREST + Storage) sobre SQLite")
+    ap.add_argument("--porta", type=int, default=54321)
+    ap.add_argument("--banco", default="local.sqlite", help="arquivo SQLite (:memory: para volátil)")
+    ap.add_argument("--latencia-ms", type=float, default=0.0, help="atraso artificial por requisição")
+    ap.add_argument("--jitter-ms", type=float, default=0.0, help="atraso extra aleatório (0..jitter)")
+    ap.add_argument("--latencia-conexao-ms", type=float, default=0.0, help="atraso por conexão aceita (handshake)")
+    ap.add_argument("--taxa-erro", type=float, default=0.0, help="fração de requisições que devolvem 503")
+    ap.add_argument("--max-linhas", type=int, default=1000, help="max-rows do PostgREST (0 = sem limite)")
+    ap.add_argument("--estrito", action="store_true", help="recusa colunas desconhecidas em tabelas existentes")
+    args = ap.parse_args()
+
+    srv = Servidor(("127.0.0.1", args.porta), Banco(args.banco, args.estrito), args.latencia_ms, args.jitter_ms,
+                   args.taxa_erro, args.max_linhas, args.latencia_conexao_ms)
+    print(f"Servidor local em {srv.url}  (SUPABASE_URL={srv.url})  banco={args.banco}")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,707 @@
+# geocodificacao.py
+# CEP -> endereço e coordenadas, com cache persistente (SQLite).
+# A chave é o CEP normalizado (8 dígitos). Cada CEP guarda o endereço do
+# ViaCEP e a lat/lon do Nominatim (centro da cidade, como o frete sempre
+# usou). Entradas boas valem GEO_VALIDADE dias; CEP inexistente ou sem
+# coordenadas também fica guardado (cache negativo, GEO_VALIDADE_NEGATIVA)
+# para não ir à rede em toda cotação. Falha de rede (timeout, 5xx) não é
+# guardada. Na frente do arquivo fica um LRU em memória: orçar de novo para
+# o mesmo cliente não faz nenhuma chamada de rede. As coordenadas são da
+# cidade, então ficam guardadas também por (cidade, UF): um CEP novo de uma
+# cidade já vista só consulta o ViaCEP.
+# CEP ainda fora do cache não trava a cotação: o índice de prefixos
+# (dados/ceps_prefixos.npz, gerado por ferramentas/gerar_indice_ceps.py) dá
+# na hora um centróide aproximado e a rede refina em segundo plano.
+# A rede é disciplinada para o processo todo: o Nominatim passa por um
+# limitador (balde de fichas, ~1 req/s como pede a política de uso), pedidos
+# simultâneos do mesmo CEP compartilham uma única consulta, e a geocodificação
+# em segundo plano sai de uma fila drenada por poucos trabalhadores.
+# Os clientes guardam a distância do depósito e os fretes já calculados
+# (geocodificar_clientes, ferramentas/geocodificar_clientes.py e o painel admin).
+import itertools
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, wait
+from math import radians, sin, cos, sqrt, atan2
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+import requests
+
+import calculos
+
+GEO_ARQUIVO = os.getenv("GEO_CACHE", os.path.join("cache", "geocodificacao.sqlite"))   # "" = só memória
+GEO_VALIDADE = float(os.getenv("GEO_VALIDADE", "180")) * 86400                # dias -> segundos
+GEO_VALIDADE_NEGATIVA = float(os.getenv("GEO_VALIDADE_NEGATIVA", "7")) * 86400
+GEO_MEMORIA_MAX = int(os.getenv("GEO_MEMORIA_MAX", "1024"))                   # entradas (LRU)
+GEO_TIMEOUT = float(os.getenv("GEO_TIMEOUT", "4"))                            # segundos por requisição
+GEO_INDICE = os.getenv(
+    "GEO_INDICE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "dados", "ceps_prefixos.npz")
+)                                                                             # "" desliga a estimativa
+GEO_REFINAR = os.getenv("GEO_REFINAR", "1") == "1"                            # refina estimativas pela rede
+GEO_PRAZO = float(os.getenv("GEO_PRAZO", "2.5"))                              # espera máxima por cotação (s)
+CEP_DEPOSITO = os.getenv("GEO_DEPOSITO", "09060-390")                          # origem das entregas
+GEO_NOMINATIM_TAXA = float(os.getenv("GEO_NOMINATIM_TAXA", "1"))              # req/s no processo (0 = livre)
+GEO_TRABALHADORES = int(os.getenv("GEO_TRABALHADORES", "2"))                  # threads da fila
+
+VIACEP_URL = "https://viacep.com.br/ws/{cep}/json/"
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+USER_AGENT = "TimTimFestas"
+
+# situação de cada CEP guardado
+OK = "ok"                          # endereço + coordenadas
+ENDERECO = "endereco"              # só o endereço (coordenadas ainda não buscadas)
+SEM_COORDENADAS = "sem_coordenadas"  # endereço ok, Nominatim não achou a cidade
+INVALIDO = "invalido"              # ViaCEP não conhece o CEP
+
+_CAMPOS = ("cep", "situacao", "logradouro", "bairro", "cidade", "uf", "lat", "lon", "atualizado_em")
+
+_con: Optional[sqlite3.Connection] = None
+_con_lock = threading.Lock()
+_memoria: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_memoria_lock = threading.Lock()
+_sessao = requests.Session()
+_sessao.headers["User-Agent"] = USER_AGENT
+_stats = {"memoria": 0, "disco": 0, "cidades": 0, "viacep": 0, "nominatim": 0, "falhas": 0, "estimados": 0,
+          "compartilhadas": 0, "espera_limite_s": 0.0}
+_cidades: Dict[Tuple[str, str], Dict[str, Any]] = {}   # (cidade, UF) -> coordenadas (poucas: sem LRU)
+_cidades_lock = threading.Lock()
+_indice: Optional[Dict[int, Tuple[np.ndarray, np.ndarray, np.ndarray]]] = None
+_indice_lock = threading.Lock()
+_voos: Dict[tuple, Future] = {}          # (CEP, coordenadas) -> consulta de rede em andamento
+_voos_lock = threading.Lock()
+_pendentes: Dict[str, Future] = {}       # CEP -> geocodificação na fila (ou em andamento)
+_pendentes_lock = threading.Lock()
+_fila: "queue.PriorityQueue[Tuple[int, int, str]]" = queue.PriorityQueue()
+_ordem = itertools.count()
+_trabalhadores: list = []
+_origens: Dict[str, Tuple[float, float]] = {}   # pontos de origem já resolvidos (vale o processo)
+
+
+def normalizar_cep(cep: Any) -> Optional[str]:
+    """'09060-390', '9060390' (perdeu o zero numa planilha) -> '09060390'; lixo -> None."""
+    digitos = re.sub(r"\D", "", str(cep or ""))
+    if len(digitos) == 7:
+        digitos = "0" + digitos
+    return digitos if len(digitos) == 8 else None
+
+
+def _conexao() -> Optional[sqlite3.Connection]:
+    global _con
+    if not GEO_ARQUIVO:
+        return None
+    if _con is None:
+        pasta = os.path.dirname(GEO_ARQUIVO)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        con = sqlite3.connect(GEO_ARQUIVO, check_same_thread=False)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS ceps (cep TEXT PRIMARY KEY, situacao TEXT, logradouro TEXT, "
+            "bairro TEXT, cidade TEXT, uf TEXT, lat REAL, lon REAL, atualizado_em REAL)"
+        )
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS cidades (cidade TEXT, uf TEXT, lat REAL, lon REAL, "
+            "atualizado_em REAL, PRIMARY KEY (cidade, uf))"
+        )
+        con.commit()
+        _con = con
+    return _con
+
+
+def _validade(entrada: Dict[str, Any]) -> float:
+    negativa = entrada["situacao"] in (INVALIDO, SEM_COORDENADAS)
+    return GEO_VALIDADE_NEGATIVA if negativa else GEO_VALIDADE
+
+
+def _vigente(entrada: Dict[str, Any]) -> bool:
+    return time.time() - entrada["atualizado_em"] < _validade(entrada)
+
+
+def _ler(cep: str) -> Optional[Dict[str, Any]]:
+    """Entrada guardada (mesmo vencida): memória primeiro, depois o arquivo."""
+    with _memoria_lock:
+        entrada = _memoria.get(cep)
+        if entrada is not None:
+            _memoria.move_to_end(cep)
+            _stats["memoria"] += 1
+            return entrada
+    with _con_lock:
+        con = _conexao()
+        if con is None:
+            return None
+        linha = con.execute(f"SELECT {', '.join(_CAMPOS)} FROM ceps WHERE cep = ?", (cep,)).fetchone()
+    if linha is None:
+        return None
+    entrada = dict(zip(_CAMPOS, linha))
+    _stats["disco"] += 1
+    _lembrar(entrada)
+    return entrada
+
+
+def _lembrar(entrada: Dict[str, Any]) -> None:
+    if GEO_MEMORIA_MAX <= 0:
+        return
+    with _memoria_lock:
+        _memoria[entrada["cep"]] = entrada
+        _memoria.move_to_end(entrada["cep"])
+        while len(_memoria) > GEO_MEMORIA_MAX:
+            _memoria.popitem(last=False)
+
+
+def _gravar(entrada: Dict[str, Any]) -> None:
+    _lembrar(entrada)
+    with _con_lock:
+        con = _conexao()
+        if con is None:
+            return
+        con.execute(
+            f"INSERT OR REPLACE INTO ceps VALUES ({', '.join('?' * len(_CAMPOS))})",
+            tuple(entrada[c] for c in _CAMPOS),
+        )
+        con.commit()
+
+
+class _Balde:
+    """Balde de fichas: `taxa` fichas por segundo, no máximo `capacidade`
+    acumuladas. Quem chega sem ficha reserva a próxima e dorme até ela; a
+    ordem de chegada é a ordem de saída."""
+
+    def __init__(self, taxa: float, capacidade: float = 1.0):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self._fichas = capacidade
+        self._em = time.monotonic()
+        self._lock = threading.Lock()
+
+    def retirar(self) -> float:
+        """Consome uma ficha (esperando se preciso); devolve os segundos esperados."""
+        if self.taxa <= 0:
+            return 0.0
+        with self._lock:
+            agora = time.monotonic()
+            self._fichas = min(self.capacidade, self._fichas + (agora - self._em) * self.taxa)
+            self._em = agora
+            self._fichas -= 1
+            espera = -self._fichas / self.taxa if self._fichas < 0 else 0.0
+        if espera:
+            time.sleep(espera)
+        return espera
+
+
+_limite_nominatim = _Balde(GEO_NOMINATIM_TAXA)
+
+
+def _voo_unico(chave: tuple, fn):
+    """Roda fn() uma vez por chave: quem chega com a mesma consulta em
+    andamento espera por ela e recebe o mesmo resultado (ou exceção)."""
+    with _voos_lock:
+        fut = _voos.get(chave)
+        dono = fut is None
+        if dono:
+            fut = _voos[chave] = Future()
+    if not dono:
+        _stats["compartilhadas"] += 1
+        return fut.result()
+    try:
+        resultado = fn()
+    except BaseException as e:
+        fut.set_exception(e)
+        raise
+    else:
+        fut.set_result(resultado)
+        return resultado
+    finally:
+        with _voos_lock:
+            _voos.pop(chave, None)
+
+
+def _viacep(cep: str) -> Optional[Dict[str, str]]:
+    """Endereço do CEP; None se o ViaCEP não conhece. Falha de rede propaga."""
+    _stats["viacep"] += 1
+    r = _sessao.get(VIACEP_URL.format(cep=cep), timeout=GEO_TIMEOUT)
+    if r.status_code == 400:        # formato rejeitado
+        return None
+    r.raise_for_status()
+    dados = r.json()
+    if "erro" in dados:
+        return None
+    return {
+        "logradouro": dados.get("logradouro", ""),
+        "bairro": dados.get("bairro", ""),
+        "cidade": dados.get("localidade", ""),
+        "uf": dados.get("uf", ""),
+    }
+
+
+def _nominatim(cidade: str, uf: str) -> Optional[Tuple[float, float]]:
+    """(lat, lon) do centro da cidade; None se o Nominatim não acha. Falha de rede propaga."""
+    _stats["espera_limite_s"] += _limite_nominatim.retirar()
+    _stats["nominatim"] += 1
+    r = _sessao.get(
+        NOMINATIM_URL,
+        params={"city": cidade, "state": uf, "country": "Brazil", "format": "json", "limit": 1},
+        timeout=GEO_TIMEOUT,
+    )
+    r.raise_for_status()
+    resp = r.json()
+    if not resp:
+        return None
+    return float(resp[0]["lat"]), float(resp[0]["lon"])
+
+
+def _coordenadas_cidade(cidade: str, uf: str) -> Optional[Tuple[float, float]]:
+    """
+    _nominatim com cache por (cidade, UF) na memória e no arquivo, inclusive
+    o "não achou" (validade negativa). Consultas simultâneas da mesma cidade
+    compartilham a chamada. Falha de rede propaga e não é guardada.
+    """
+    chave = (calculos.normalizar_nome(cidade), str(uf or "").strip().upper())
+    with _cidades_lock:
+        entrada = _cidades.get(chave)
+    if entrada is None:
+        with _con_lock:
+            con = _conexao()
+            linha = None if con is None else con.execute(
+                "SELECT lat, lon, atualizado_em FROM cidades WHERE cidade = ? AND uf = ?", chave
+            ).fetchone()
+        if linha is not None:
+            entrada = dict(zip(("lat", "lon", "atualizado_em"), linha))
+            with _cidades_lock:
+                _cidades[chave] = entrada
+    if entrada is not None:
+        validade = GEO_VALIDADE if entrada["lat"] is not None else GEO_VALIDADE_NEGATIVA
+        if time.time() - entrada["atualizado_em"] < validade:
+            _stats["cidades"] += 1
+            return None if entrada["lat"] is None else (entrada["lat"], entrada["lon"])
+    return _voo_unico(("cidade",) + chave, lambda: _consultar_cidade(chave, cidade, uf))
+
+
+def _consultar_cidade(chave: Tuple[str, str], cidade: str, uf: str) -> Optional[Tuple[float, float]]:
+    coord = _nominatim(cidade, uf)
+    entrada = {"lat": None, "lon": None, "atualizado_em": time.time()}
+    if coord is not None:
+        entrada.update(lat=coord[0], lon=coord[1])
+    with _cidades_lock:
+        _cidades[chave] = entrada
+    with _con_lock:
+        con = _conexao()
+        if con is not None:
+            con.execute("INSERT OR REPLACE INTO cidades VALUES (?, ?, ?, ?, ?)",
+                        (*chave, entrada["lat"], entrada["lon"], entrada["atualizado_em"]))
+            con.commit()
+    return coord
+
+
+def consultar(cep: Any, coordenadas: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Endereço (e, com coordenadas=True, lat/lon) do CEP: dict com os campos de
+    _CAMPOS, ou None se o CEP é inválido/inexistente. Só vai à rede quando o
+    CEP não está guardado, venceu, ou faltam as coordenadas pedidas.
+    Falha de rede (requests.RequestException) propaga quando não há nem uma
+    entrada vencida para servir no lugar.
+    """
+    chave = normalizar_cep(cep)
+    if chave is None:
+        return None
+    guardada = _ler(chave)
+    if _atende(guardada, coordenadas):
+        return None if guardada["situacao"] == INVALIDO else guardada
+    return _voo_unico((chave, coordenadas), lambda: _consultar_rede(chave, coordenadas))
+
+
+def _atende(guardada: Optional[Dict[str, Any]], coordenadas: bool) -> bool:
+    return (guardada is not None and _vigente(guardada)
+            and (not coordenadas or guardada["situacao"] != ENDERECO))
+
+
+def _consultar_rede(chave: str, coordenadas: bool) -> Optional[Dict[str, Any]]:
+    guardada = _ler(chave)
+    if _atende(guardada, coordenadas):      # outra consulta acabou de gravar
+        return None if guardada["situacao"] == INVALIDO else guardada
+    try:
+        if guardada is not None and _vigente(guardada):
+            endereco = {c: guardada[c] for c in ("logradouro", "bairro", "cidade", "uf")}
+        else:
+            endereco = _viacep(chave)
+        entrada = {"cep": chave, "situacao": INVALIDO, "logradouro": "", "bairro": "", "cidade": "",
+                   "uf": "", "lat": None, "lon": None, "atualizado_em": time.time()}
+        if endereco is not None:
+            entrada.update(endereco, situacao=ENDERECO)
+            if coordenadas:
+                coord = _coordenadas_cidade(endereco["cidade"], endereco["uf"]) if endereco["cidade"] else None
+                if coord is None:
+                    entrada["situacao"] = SEM_COORDENADAS
+                else:
+                    entrada.update(situacao=OK, lat=coord[0], lon=coord[1])
+    except (requests.RequestException, ValueError) as e:
+        _stats["falhas"] += 1
+        if guardada is None:
+            raise
+        logging.warning("Geocodificação do CEP %s falhou; usando a entrada vencida: %s", chave, e)
+        return None if guardada["situacao"] == INVALIDO else guardada
+
+    _gravar(entrada)
+    return None if entrada["situacao"] == INVALIDO else entrada
+
+
+def coordenadas(cep: Any) -> Optional[Tuple[float, float]]:
+    """(lat, lon) do CEP ou None (inválido, sem coordenadas ou rede fora)."""
+    try:
+        entrada = consultar(cep)
+    except (requests.RequestException, ValueError) as e:
+        logging.warning("Erro ao obter coordenadas do CEP %s: %s", cep, e)
+        return None
+    if entrada is None or entrada["lat"] is None:
+        return None
+    return entrada["lat"], entrada["lon"]
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(radians, (lat1, lon1, lat2, lon2))
+    a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    return 6371.0 * 2 * atan2(sqrt(a), sqrt(1 - a))
+
+
+# ==============================
+# ÍNDICE DE PREFIXOS (offline)
+# ==============================
+# Para cada tamanho de prefixo (5 e 3 dígitos), três arrays alinhados:
+# prefixos (int32, ordenado), lat e lon (float32) do centróide. A busca é
+# binária (np.searchsorted); o arquivo inteiro tem poucos KB.
+TAMANHOS_PREFIXO = (5, 3)
+
+
+def _carregar_indice() -> Dict[int, Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    global _indice
+    if _indice is None:
+        with _indice_lock:
+            if _indice is None:
+                indice = {}
+                if GEO_INDICE and os.path.exists(GEO_INDICE):
+                    try:
+                        with np.load(GEO_INDICE) as arq:
+                            for n in TAMANHOS_PREFIXO:
+                                indice[n] = (arq[f"p{n}"], arq[f"lat{n}"], arq[f"lon{n}"])
+                    except (OSError, KeyError, ValueError):
+                        logging.exception("Índice de CEPs ilegível: %s", GEO_INDICE)
+                        indice = {}
+                _indice = indice
+    return _indice
+
+
+def estimar(cep: Any) -> Optional[Tuple[float, float]]:
+    """(lat, lon) aproximados pelo prefixo do CEP (5 dígitos, senão 3), sem rede."""
+    chave = normalizar_cep(cep)
+    if chave is None:
+        return None
+    for n, (prefixos, lat, lon) in _carregar_indice().items():
+        alvo = int(chave[:n])
+        i = int(np.searchsorted(prefixos, alvo))
+        if i < len(prefixos) and prefixos[i] == alvo:
+            return float(lat[i]), float(lon[i])
+    return None
+
+
+# ==============================
+# FILA DE GEOCODIFICAÇÃO
+# ==============================
+URGENTE, FUNDO = 0, 1      # prioridade na fila: cotação aberta x pré-geocodificação
+
+
+def _trabalhar() -> None:
+    while True:
+        _, _, chave = _fila.get()
+        with _pendentes_lock:
+            fut = _pendentes.get(chave)
+            if fut is None or fut.running() or fut.done():
+                continue            # entrada repetida (re-enfileirada como URGENTE)
+            fut.set_running_or_notify_cancel()
+        try:
+            fut.set_result(coordenadas(chave))
+        except BaseException as e:
+            fut.set_exception(e)
+        finally:
+            with _pendentes_lock:
+                _pendentes.pop(chave, None)
+
+
+def _garantir_trabalhadores() -> None:
+    with _pendentes_lock:
+        _trabalhadores[:] = [t for t in _trabalhadores if t.is_alive()]
+        while len(_trabalhadores) < max(1, GEO_TRABALHADORES):
+            t = threading.Thread(target=_trabalhar, name=f"geo-fila-{len(_trabalhadores)}", daemon=True)
+            t.start()
+            _trabalhadores.append(t)
+
+
+def refinar(cep: Any, prioridade: int = URGENTE) -> Optional[Future]:
+    """Põe o CEP na fila de geocodificação pela rede. Pedidos repetidos do
+    mesmo CEP enquanto o primeiro não termina recebem o mesmo Future; um
+    pedido URGENTE passa na frente do que estava só em FUNDO."""
+    chave = normalizar_cep(cep)
+    if chave is None:
+        return None
+    with _pendentes_lock:
+        fut = _pendentes.get(chave)
+        novo = fut is None
+        if novo:
+            fut = _pendentes[chave] = Future()
+    if novo or (prioridade == URGENTE and not (fut.running() or fut.done())):
+        _fila.put((prioridade, next(_ordem), chave))
+    _garantir_trabalhadores()
+    return fut
+
+
+def pendentes() -> int:
+    """CEPs na fila ou sendo geocodificados agora."""
+    with _pendentes_lock:
+        return len(_pendentes)
+
+
+def _guardado(chave: str) -> Tuple[bool, Optional[Tuple[float, float]]]:
+    """(conhecido, ponto) sem rede: conhecido=True quando o cache já responde,
+    mesmo que negativamente (ponto None)."""
+    guardada = _ler(chave)
+    if guardada is None or not _vigente(guardada) or guardada["situacao"] == ENDERECO:
+        return False, None
+    return True, None if guardada["lat"] is None else (guardada["lat"], guardada["lon"])
+
+
+class Distancia(NamedTuple):
+    km: Optional[float]     # None: prazo estourou sem nem uma estimativa
+    estimado: bool          # algum ponto veio do índice de prefixos (ou ainda falta)
+
+
+def distancia(cep_origem: Any, cep_destino: Any, prazo: Optional[float] = None,
+              usar_indice: bool = True) -> Optional[Distancia]:
+    """
+    Distância em linha reta (km, 1 casa) entre os dois CEPs; None se algum
+    CEP é inválido ou não tem coordenadas.
+    Ponto no cache entra direto (a origem fica resolvida para o processo
+    todo). Os que faltam vão à rede em paralelo; quem tem estimativa no
+    índice de prefixos não espera e sai estimado (a rede refina para a
+    próxima cotação), quem não tem espera no máximo `prazo` segundos
+    (GEO_PRAZO) no total. Estourado o prazo, o resultado volta marcado como
+    estimado, com km=None se faltou um ponto; a consulta segue em segundo
+    plano e a próxima cotação já a encontra no cache.
+    usar_indice=False: todo ponto que falta espera a rede (até o prazo).
+    """
+    chaves = (normalizar_cep(cep_origem), normalizar_cep(cep_destino))
+    if None in chaves:
+        return None
+    prazo = GEO_PRAZO if prazo is None else prazo
+    pontos = [_origens.get(chaves[0]), None]
+    exatos = [pontos[0] is not None, False]
+    aguardar: Dict[int, Future] = {}
+    for i, chave in enumerate(chaves):
+        if exatos[i]:
+            continue
+        conhecido, ponto = _guardado(chave)
+        if conhecido:
+            if ponto is None:
+                return None
+            pontos[i], exatos[i] = ponto, True
+            continue
+        pontos[i] = estimar(chave) if usar_indice else None
+        if pontos[i] is None:
+            aguardar[i] = refinar(chave)
+        else:
+            _stats["estimados"] += 1
+            if GEO_REFINAR:
+                refinar(chave)
+
+    if aguardar:
+        wait(aguardar.values(), timeout=prazo)
+        for i, fut in aguardar.items():
+            if not fut.done():
+                continue
+            if fut.result() is not None:
+                pontos[i], exatos[i] = fut.result(), True
+            elif _guardado(chaves[i])[0]:
+                return None     # CEP inexistente ou sem coordenadas (agora no cache)
+            # senão a rede falhou: segue sem o ponto, como no prazo estourado
+    if exatos[0]:
+        _origens.setdefault(chaves[0], pontos[0])
+    if None in pontos:
+        return Distancia(None, True)
+    return Distancia(round(haversine_km(*pontos[0], *pontos[1]), 1), not all(exatos))
+
+
+def calcular_distancia_km(cep_origem: Any, cep_destino: Any) -> Optional[float]:
+    """Só os km de distancia(): None também quando o prazo estourou sem estimativa."""
+    d = distancia(cep_origem, cep_destino)
+    return d.km if d else None
+
+
+def obter_coordenadas(cep: Any) -> Tuple[Optional[float], Optional[float]]:
+    """Compatibilidade: (lon, lat) do CEP ou (None, None)."""
+    c = coordenadas(cep)
+    return (c[1], c[0]) if c else (None, None)
+
+
+def estatisticas() -> Dict[str, float]:
+    """Acertos (memória/disco/cidades), chamadas de rede, consultas
+    compartilhadas e espera no limitador do Nominatim, acumulados no processo."""
+    return dict(_stats)
+
+
+def esquecer(cep: Any = None) -> None:
+    """Descarta um CEP (ou tudo, cidades inclusive, sem argumento) da memória e do arquivo."""
+    chave = None
+    if cep is not None:
+        chave = normalizar_cep(cep)
+        if chave is None:
+            return
+    with _memoria_lock:
+        if chave is None:
+            _memoria.clear()
+        else:
+            _memoria.pop(chave, None)
+    if chave is None:
+        with _cidades_lock:
+            _cidades.clear()
+    with _con_lock:
+        con = _conexao()
+        if con is None:
+            return
+        if chave is None:
+            con.execute("DELETE FROM ceps")
+            con.execute("DELETE FROM cidades")
+        else:
+            con.execute("DELETE FROM ceps WHERE cep = ?", (chave,))
+        con.commit()
+
+
+# ==============================
+# CLIENTES (pré-geocodificação)
+# ==============================
+# Colunas do clientes preenchidas a partir do CEP (sql/clientes_geocodificacao.sql).
+# cep_geocodificado é o CEP (8 dígitos) para o qual as outras foram calculadas:
+# diferente do cep atual = cliente novo ou editado, ainda a geocodificar.
+COLUNAS_CLIENTE = (
+    "cep_geocodificado", "latitude", "longitude", "distancia_km",
+    "frete_tradicional", "frete_montessori", "geocodificado_em",
+)
+
+_lote: Dict[str, Any] = {"rodando": False, "feitos": 0, "total": 0, "resumo": None, "erro": None}
+_lote_lock = threading.Lock()
+
+
+def _campos(chave: str, ponto: Optional[Tuple[float, float]], origem: Tuple[float, float]) -> Dict[str, Any]:
+    campos = dict.fromkeys(COLUNAS_CLIENTE)
+    campos["cep_geocodificado"] = chave
+    campos["geocodificado_em"] = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    if ponto is not None:
+        km = round(haversine_km(*origem, *ponto), 1)
+        campos.update(
+            latitude=ponto[0], longitude=ponto[1], distancia_km=km,
+            frete_tradicional=calculos.calcular_frete(km, calculos.FRETE_POR_KM["tradicional"]),
+            frete_montessori=calculos.calcular_frete(km, calculos.FRETE_POR_KM["montessori"]),
+        )
+    return campos
+
+
+def campos_cliente(cep: Any, prazo: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Colunas de COLUNAS_CLIENTE para gravar junto com o cliente (cadastro ou
+    edição). Dentro do `prazo` (GEO_PRAZO) sai o cálculo exato; se a rede não
+    respondeu a tempo, volta {} e o cliente fica pendente para
+    geocodificar_clientes (o CEP segue na fila de fundo e chega ao cache).
+    """
+    chave = normalizar_cep(cep)
+    if chave is None:
+        return {**dict.fromkeys(COLUNAS_CLIENTE), "cep_geocodificado": ""}    # sem CEP: limpa
+    d = distancia(CEP_DEPOSITO, chave, prazo, usar_indice=False)
+    origem = _origens.get(normalizar_cep(CEP_DEPOSITO))
+    if origem is None or (d is not None and d.estimado):
+        return {}
+    return _campos(chave, _guardado(chave)[1], origem)
+
+
+def geocodificar_clientes(todos: bool = False, progresso=None) -> Dict[str, int]:
+    """
+    Geocodifica os CEPs dos clientes pendentes (todos=True: recalcula todos,
+    p.ex. depois de mudar o depósito ou o valor do km) pelo cache + fila e
+    grava distância do depósito e fretes só nas linhas que mudaram: um PATCH
+    das colunas de COLUNAS_CLIENTE por CEP, filtrado por id_cliente (o resto
+    da linha, inclusive o cep, não é regravado; se o cep foi editado no meio,
+    cep_geocodificado não bate e a próxima rodada refaz).
+    `progresso(feitos, total)` é chamado a cada CEP resolvido.
+    CEP cuja consulta falhou na rede fica pendente para a próxima rodada.
+    """
+    import banco     # banco importa este módulo
+
+    faltam = [c for c in COLUNAS_CLIENTE if not banco.coluna_existe("clientes", c)]
+    if faltam:
+        raise RuntimeError(f"[geocodificar] clientes sem as colunas {faltam}: rode sql/clientes_geocodificacao.sql")
+    original = banco.carregar_dados("clientes", ["id_cliente", "cep", *COLUNAS_CLIENTE])
+    resumo = {"clientes": 0, "ceps": 0, "resolvidos": 0, "sem_coordenadas": 0, "falhas": 0, "atualizados": 0}
+    if original.empty:
+        return resumo
+
+    origem = coordenadas(CEP_DEPOSITO)
+    if origem is None:
+        raise RuntimeError(f"[geocodificar] não foi possível geocodificar o depósito {CEP_DEPOSITO}")
+
+    # sem id_cliente não há como filtrar o PATCH
+    original = original[original["id_cliente"].notna()]
+    ceps = original["cep"].map(normalizar_cep)
+    alvo = ceps.notna()
+    if not todos:
+        alvo &= original["cep_geocodificado"].fillna("").astype(str) != ceps.fillna("")
+    unicos = list(dict.fromkeys(ceps[alvo]))
+    resumo["clientes"], resumo["ceps"] = int(alvo.sum()), len(unicos)
+
+    futuros = {c: refinar(c, FUNDO) for c in unicos}
+    resolvidos: Dict[str, Dict[str, Any]] = {}
+    for n, (chave, fut) in enumerate(futuros.items(), start=1):
+        fut.result()
+        conhecido, ponto = _guardado(chave)
+        if not conhecido:
+            resumo["falhas"] += 1
+        else:
+            resumo["resolvidos" if ponto else "sem_coordenadas"] += 1
+            resolvidos[chave] = _campos(chave, ponto, origem)
+        if progresso is not None:
+            progresso(n, len(futuros))
+
+    linhas = alvo & ceps.isin(resolvidos.keys())
+    for chave, ids in original.loc[linhas, "id_cliente"].groupby(ceps[linhas]):
+        ids = ids.tolist()
+        for i in range(0, len(ids), 200):
+            banco.atualizar_um("clientes", {"id_cliente": ("in", ids[i:i + 200])}, resolvidos[chave])
+        resumo["atualizados"] += len(ids)
+    return resumo
+
+
+def _rodar_lote(todos: bool) -> None:
+    def progresso(feitos: int, total: int) -> None:
+        _lote.update(feitos=feitos, total=total)
+    try:
+        _lote["resumo"] = geocodificar_clientes(todos, progresso)
+    except Exception as e:
+        logging.exception("Pré-geocodificação dos clientes falhou")
+        _lote["erro"] = str(e)
+    finally:
+        _lote["rodando"] = False
+
+
+def iniciar_lote(todos: bool = False) -> bool:
+    """Roda geocodificar_clientes numa thread; False se já há uma rodando."""
+    with _lote_lock:
+        if _lote["rodando"]:
+            return False
+        _lote.update(rodando=True, feitos=0, total=0, resumo=None, erro=None)
+    threading.Thread(target=_rodar_lote, args=(todos,), name="geo-clientes", daemon=True).start()
+    return True
+
+
+def estado_lote() -> Dict[str, Any]:
+    return dict(_lote)
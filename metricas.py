@@ -0,0 +1,149 @@
+# metricas.py
+# Registro em memória das chamadas ao Supabase (REST/Storage):
+# contagem, status, bytes, linhas e histogramas de latência por
+# página x tabela x verbo. Exposto no painel admin do app e em texto
+# no formato do Prometheus.
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# Limites (segundos) dos baldes do histograma de latência
+BALDES = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_series: Dict[Tuple[str, str, str], Dict[str, Any]] = {}   # (pagina, tabela, verbo) -> série
+_local = threading.local()
+
+
+def definir_pagina(pagina: Optional[str]) -> None:
+    """Rotula as próximas chamadas desta thread com a página em renderização."""
+    _local.pagina = pagina
+
+
+def pagina_atual() -> Optional[str]:
+    return getattr(_local, "pagina", None)
+
+
+def _nova_serie() -> Dict[str, Any]:
+    return {
+        "chamadas": 0,
+        "status": {},
+        "bytes_enviados": 0,
+        "bytes_recebidos": 0,
+        "linhas": 0,
+        "tempo_total": 0.0,
+        "tempo_max": 0.0,
+        "baldes": [0] * (len(BALDES) + 1),   # último = +Inf
+    }
+
+
+def registrar(
+    tabela: str,
+    verbo: str,
+    status: str,
+    duracao: float,
+    bytes_enviados: int = 0,
+    bytes_recebidos: int = 0,
+    linhas: int = 0,
+) -> None:
+    chave = (pagina_atual() or "-", tabela or "-", verbo.upper())
+    i = next((n for n, limite in enumerate(BALDES) if duracao <= limite), len(BALDES))
+    with _lock:
+        s = _series.get(chave)
+        if s is None:
+            s = _series[chave] = _nova_serie()
+        s["chamadas"] += 1
+        s["status"][status] = s["status"].get(status, 0) + 1
+        s["bytes_enviados"] += bytes_enviados
+        s["bytes_recebidos"] += bytes_recebidos
+        s["linhas"] += linhas
+        s["tempo_total"] += duracao
+        s["tempo_max"] = max(s["tempo_max"], duracao)
+        s["baldes"][i] += 1
+
+
+def zerar() -> None:
+    with _lock:
+        _series.clear()
+
+
+def _quantil(baldes: List[int], total: int, q: float) -> float:
+    """Estimativa pelo histograma: limite superior do balde que contém o quantil."""
+    alvo = q * total
+    acumulado = 0
+    for limite, n in zip(BALDES + (float("inf"),), baldes):
+        acumulado += n
+        if acumulado >= alvo:
+            return limite
+    return float("inf")
+
+
+def resumo() -> List[Dict[str, Any]]:
+    """Uma linha por página x tabela x verbo, da que mais somou tempo para a que menos."""
+    with _lock:
+        itens = [(k, dict(v, status=dict(v["status"]), baldes=list(v["baldes"]))) for k, v in _series.items()]
+    linhas = []
+    for (pagina, tabela, verbo), s in itens:
+        n = s["chamadas"]
+        linhas.append({
+            "pagina": pagina,
+            "tabela": tabela,
+            "verbo": verbo,
+            "chamadas": n,
+            "erros": sum(v for k, v in s["status"].items() if not k.startswith(("2", "3"))),
+            "tempo_total_s": round(s["tempo_total"], 3),
+            "media_ms": round(1000 * s["tempo_total"] / n, 1) if n else 0.0,
+            "p50_ms": 1000 * _quantil(s["baldes"], n, 0.50),
+            "p95_ms": 1000 * _quantil(s["baldes"], n, 0.95),
+            "max_ms": round(1000 * s["tempo_max"], 1),
+            "linhas": s["linhas"],
+            "kb_enviados": round(s["bytes_enviados"] / 1024, 1),
+            "kb_recebidos": round(s["bytes_recebidos"] / 1024, 1),
+            "status": ", ".join(f"{k}×{v}" for k, v in sorted(s["status"].items())),
+        })
+    linhas.sort(key=lambda r: r["tempo_total_s"], reverse=True)
+    return linhas
+
+
+def _rotulos(**kw: str) -> str:
+    def esc(v: str) -> str:
+        return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in kw.items()) + "}"
+
+
+def exportar_prometheus(prefixo: str = "timtim_supabase") -> str:
+    """Texto no formato de exposição do Prometheus (text/plain; version=0.0.4)."""
+    with _lock:
+        itens = [(k, dict(v, status=dict(v["status"]), baldes=list(v["baldes"]))) for k, v in _series.items()]
+
+    out: List[str] = []
+    out.append(f"# HELP {prefixo}_requisicoes_total Chamadas ao Supabase por status.")
+    out.append(f"# TYPE {prefixo}_requisicoes_total counter")
+    for (pagina, tabela, verbo), s in itens:
+        for status, n in sorted(s["status"].items()):
+            out.append(f"{prefixo}_requisicoes_total{_rotulos(pagina=pagina, tabela=tabela, verbo=verbo, status=status)} {n}")
+
+    for nome, campo, ajuda in (
+        ("bytes_enviados_total", "bytes_enviados", "Bytes enviados no corpo das requisições."),
+        ("bytes_recebidos_total", "bytes_recebidos", "Bytes recebidos no corpo das respostas."),
+        ("linhas_total", "linhas", "Linhas devolvidas (Content-Range)."),
+    ):
+        out.append(f"# HELP {prefixo}_{nome} {ajuda}")
+        out.append(f"# TYPE {prefixo}_{nome} counter")
+        for (pagina, tabela, verbo), s in itens:
+            out.append(f"{prefixo}_{nome}{_rotulos(pagina=pagina, tabela=tabela, verbo=verbo)} {s[campo]}")
+
+    out.append(f"# HELP {prefixo}_duracao_segundos Latência das chamadas ao Supabase.")
+    out.append(f"# TYPE {prefixo}_duracao_segundos histogram")
+    for (pagina, tabela, verbo), s in itens:
+        acumulado = 0
+        for limite, n in zip(BALDES + (float("inf"),), s["baldes"]):
+            acumulado += n
+            le = "+Inf" if limite == float("inf") else repr(limite)
+            out.append(
+                f"{prefixo}_duracao_segundos_bucket"
+                f"{_rotulos(pagina=pagina, tabela=tabela, verbo=verbo, le=le)} {acumulado}"
+            )
+        rot = _rotulos(pagina=pagina, tabela=tabela, verbo=verbo)
+        out.append(f"{prefixo}_duracao_segundos_sum{rot} {s['tempo_total']:.6f}")
+        out.append(f"{prefixo}_duracao_segundos_count{rot} {s['chamadas']}")
+    return "\n".join(out) + "\n"
@@ -0,0 +1,172 @@
+# perfil.py
+# Tempo de renderização por página, quebrado em fases:
+#   dados          -> carregar_dados / carregar_varios (marcado pelo banco)
+#   transformacao  -> parsing de datas, merges, agregações
+#   graficos       -> matplotlib (st.pyplot)
+#   widgets        -> o restante (emissão de widgets/markdown)
+# As páginas marcam as fases com perfil.etapa("..."), estilo cronômetro de
+# voltas: o tempo até a próxima marca conta para a fase marcada.
+# Cada renderização vira uma linha JSON num log rotativo (PERFIL_LOG), para
+# comparar versões com ferramentas/comparar_perfil.py.
+import io
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional
+
+FASES = ("dados", "transformacao", "graficos", "widgets")
+FASE_PADRAO = "widgets"
+
+PERFIL_LOG = os.getenv("PERFIL_LOG", os.path.join("logs", "perfil_paginas.jsonl"))
+PERFIL_LOG_MAX = int(os.getenv("PERFIL_LOG_MAX", str(5 * 1024 * 1024)))   # bytes por arquivo
+PERFIL_LOG_COPIAS = int(os.getenv("PERFIL_LOG_COPIAS", "3"))             # .1, .2, .3
+
+_local = threading.local()
+_log_lock = threading.Lock()
+_versao: Optional[str] = None
+
+
+class _Medicao:
+    def __init__(self, pagina: str):
+        self.pagina = pagina
+        self.inicio = time.perf_counter()
+        self.fases: Dict[str, float] = {f: 0.0 for f in FASES}
+        self.atual = FASE_PADRAO
+        self.desde = self.inicio
+
+    def trocar(self, fase: str) -> str:
+        agora = time.perf_counter()
+        self.fases[self.atual] = self.fases.get(self.atual, 0.0) + (agora - self.desde)
+        anterior, self.atual, self.desde = self.atual, fase, agora
+        return anterior
+
+
+def _medicao() -> Optional[_Medicao]:
+    return getattr(_local, "medicao", None)
+
+
+def etapa(fase: str) -> None:
+    """A partir daqui, o tempo conta para `fase` (sem medição ativa: não faz nada)."""
+    m = _medicao()
+    if m is not None:
+        m.trocar(fase)
+
+
+@contextmanager
+def fase(nome: str) -> Iterator[None]:
+    """Conta o bloco para `nome` e volta para a fase anterior ao sair."""
+    m = _medicao()
+    if m is None:
+        yield
+        return
+    anterior = m.trocar(nome)
+    try:
+        yield
+    finally:
+        m.trocar(anterior)
+
+
+def versao() -> str:
+    """APP_VERSAO ou o commit atual do git (para comparar releases no log)."""
+    global _versao
+    if _versao is None:
+        _versao = os.getenv("APP_VERSAO", "")
+        if not _versao:
+            try:
+                _versao = subprocess.run(
+                    ["git", "rev-parse", "--short", "HEAD"],
+                    capture_output=True, text=True, timeout=2,
+                    cwd=os.path.dirname(os.path.abspath(__file__)),
+                ).stdout.strip() or "dev"
+            except Exception:
+                _versao = "dev"
+    return _versao
+
+
+def _rotacionar(caminho: str) -> None:
+    try:
+        if os.path.getsize(caminho) < PERFIL_LOG_MAX:
+            return
+    except OSError:
+        return
+    for n in range(PERFIL_LOG_COPIAS, 0, -1):
+        origem = caminho if n == 1 else f"{caminho}.{n - 1}"
+        if os.path.exists(origem):
+            os.replace(origem, f"{caminho}.{n}")
+
+
+def registrar(registro: Dict[str, Any]) -> None:
+    if not PERFIL_LOG:
+        return
+    try:
+        with _log_lock:
+            pasta = os.path.dirname(PERFIL_LOG)
+            if pasta:
+                os.makedirs(pasta, exist_ok=True)
+            _rotacionar(PERFIL_LOG)
+            with open(PERFIL_LOG, "a", encoding="utf-8") as f:
+                f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+    except OSError:
+        logging.exception("Falha ao gravar o log de perfil")
+
+
+def _capturador(modo: Optional[str]):
+    """(iniciar, parar->(nome_arquivo, bytes, mime)) para cProfile/pyinstrument."""
+    if modo == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            modo = "cprofile"
+        else:
+            prof = Profiler()
+            return prof.start, lambda: ("perfil.html", prof.stop().output_html().encode("utf-8"), "text/html")
+    if modo == "cprofile":
+        import cProfile
+        import pstats
+        prof = cProfile.Profile()
+
+        def parar():
+            prof.disable()
+            saida = io.StringIO()
+            pstats.Stats(prof, stream=saida).sort_stats("cumulative").print_stats(80)
+            return "perfil.txt", saida.getvalue().encode("utf-8"), "text/plain"
+
+        return prof.enable, parar
+    return None, None
+
+
+@contextmanager
+def pagina(nome: str, capturar: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Mede a renderização da página `nome`. O dict devolvido é preenchido ao
+    sair com o registro (total_ms, fases) e, se `capturar` for "cprofile" ou
+    "pyinstrument", com "captura": (nome_arquivo, bytes, mime).
+    """
+    resultado: Dict[str, Any] = {}
+    m = _Medicao(nome)
+    _local.medicao = m
+    iniciar, parar = _capturador(capturar)
+    if iniciar:
+        iniciar()
+    try:
+        yield resultado
+    finally:
+        if parar:
+            resultado["captura"] = parar()
+        m.trocar(m.atual)
+        _local.medicao = None
+        total = time.perf_counter() - m.inicio
+        resultado.update({
+            "ts": datetime.now().isoformat(timespec="seconds"),
+            "versao": versao(),
+            "pagina": nome,
+            "total_ms": round(1000 * total, 1),
+            "fases_ms": {f: round(1000 * s, 1) for f, s in m.fases.items()},
+            "perfilado": bool(parar),
+        })
+        registrar({k: v for k, v in resultado.items() if k != "captura"})
@@ -0,0 +1,18 @@
+-- Colunas da pré-geocodificação dos clientes (geocodificacao.geocodificar_clientes).
+-- cep_geocodificado guarda o CEP (8 dígitos) para o qual as demais foram
+-- calculadas; se o cep do cliente mudar, ele volta a ser pendente. Os fretes
+-- seguem a regra da aba de suporte do WhatsApp (calculos.calcular_frete):
+-- R$ 3/km Tradicional, R$ 5/km Montessori, isento abaixo de 5 km.
+--
+-- Rodar no SQL Editor do Supabase (idempotente).
+
+alter table public.clientes
+    add column if not exists cep_geocodificado text,
+    add column if not exists latitude double precision,
+    add column if not exists longitude double precision,
+    add column if not exists distancia_km numeric(8, 1),
+    add column if not exists frete_tradicional numeric(10, 2),
+    add column if not exists frete_montessori numeric(10, 2),
+    add column if not exists geocodificado_em timestamptz;
+
+notify pgrst, 'reload schema';
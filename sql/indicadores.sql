@@ -0,0 +1,134 @@
+-- Indicadores da página de Relatórios agrupados no banco.
+-- O app chama as funções via RPC (banco.carregar_agregado); sem elas, baixa
+-- reservas/custos inteiros e agrega em Python (calculos.agregar_no_app).
+-- As regras espelham calculos.indicadores_mensais / itens_por_brinquedo:
+--   * datas em texto "aaaa-mm-dd", "dd/mm/aaaa", "dd-mm-aaaa" ou "dd/mm/aa";
+--     linhas com data inválida ficam de fora
+--   * valores aceitam "R$" e formato brasileiro ("R$ 1.200,50"); o que não
+--     for número conta como 0
+--   * data_segura / num_seguro seguem calculos.FORMATOS_DATA / NUMERO_TEXTO
+--     (e o servidor_local): mudar aqui é mudar lá
+--   * bruto = valor_total (>= 0); liquido = bruto - custo (>= 0)
+--   * ranking: (valor_total + valor_extra + frete - desconto, >= 0) rateado
+--     entre os brinquedos da reserva (lista separada por vírgula)
+--
+-- Rodar no SQL Editor do Supabase. GET /rest/v1/rpc/<funcao> exige STABLE.
+
+create or replace function public.data_segura(v text)
+returns date
+language plpgsql
+immutable
+as $$
+declare
+    s text := split_part(btrim(coalesce(v, ''), E' \t\r\n'), ' ', 1);
+begin
+    if s ~ '^\d{4}-\d{2}-\d{2}' then
+        return to_date(left(s, 10), 'YYYY-MM-DD');
+    elsif s ~ '^\d{1,2}/\d{1,2}/\d{4}$' then
+        return to_date(s, 'DD/MM/YYYY');
+    elsif s ~ '^\d{1,2}-\d{1,2}-\d{4}$' then
+        return to_date(s, 'DD-MM-YYYY');
+    elsif s ~ '^\d{1,2}/\d{1,2}/\d{2}$' then
+        return to_date(s, 'DD/MM/YY');
+    end if;
+    return null;
+exception when others then
+    return null;   -- ex.: 31/02/2025
+end;
+$$;
+
+create or replace function public.num_seguro(v text)
+returns numeric
+language plpgsql
+immutable
+as $$
+declare
+    s text := regexp_replace(btrim(coalesce(v, ''), E' \t\r\n'), '^R\$\s*', '');
+begin
+    if position(',' in s) > 0 then
+        s := replace(replace(s, '.', ''), ',', '.');   -- "1.200,50" -> "1200.50"
+    end if;
+    if s ~ '^[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?$' then
+        return s::numeric;
+    end if;
+    return 0;
+exception when others then
+    return 0;
+end;
+$$;
+
+-- Um registro por mês (aaaa-mm) com reservas e/ou custos.
+create or replace function public.indicadores_mensais()
+returns table (
+    anomes text,
+    bruto numeric,
+    custo numeric,
+    liquido numeric,
+    qtd_reservas bigint,
+    sinal numeric
+)
+language sql
+stable
+as $$
+    with r as (
+        select to_char(public.data_segura(data::text), 'YYYY-MM') as mes,
+               greatest(public.num_seguro(valor_total::text), 0) as bruto,
+               public.num_seguro(sinal::text) as sinal
+        from public.reservas
+    ),
+    c as (
+        select to_char(public.data_segura(data::text), 'YYYY-MM') as mes,
+               public.num_seguro(valor::text) as valor
+        from public.custos
+    ),
+    m as (
+        select mes, sum(bruto) as bruto, 0::numeric as custo, count(*) as qtd, sum(sinal) as sinal
+        from r where mes is not null group by mes
+        union all
+        select mes, 0, sum(valor), 0, 0
+        from c where mes is not null group by mes
+    )
+    select mes,
+           sum(m.bruto),
+           sum(m.custo),
+           greatest(sum(m.bruto) - sum(m.custo), 0),
+           sum(m.qtd)::bigint,
+           sum(m.sinal)
+    from m
+    group by mes
+    order by mes;
+$$;
+
+-- Valor rateado e número de locações por brinquedo.
+create or replace function public.desempenho_brinquedos()
+returns table (
+    brinquedo text,
+    valor_total numeric,
+    locacoes bigint
+)
+language sql
+stable
+as $$
+    with r as (
+        select greatest(
+                   public.num_seguro(valor_total::text) + public.num_seguro(valor_extra::text)
+                   + public.num_seguro(frete::text) - public.num_seguro(desconto::text), 0) as bruto,
+               array(
+                   select trim(x)
+                   from unnest(string_to_array(coalesce(brinquedos::text, ''), ',')) as x
+                   where trim(x) <> ''
+               ) as itens
+        from public.reservas
+        where public.data_segura(data::text) is not null
+    )
+    select i.nome, sum(r.bruto / cardinality(r.itens)), count(*)
+    from r cross join lateral unnest(r.itens) as i(nome)
+    where cardinality(r.itens) > 0
+    group by i.nome
+    order by 2 desc, 3 desc;
+$$;
+
+grant execute on function public.indicadores_mensais() to anon, authenticated;
+grant execute on function public.desempenho_brinquedos() to anon, authenticated;
+
+notify pgrst, 'reload schema';
@@ -0,0 +1,40 @@
+-- Coluna updated_at para a sincronização incremental do app (espelho.py).
+-- O app busca só as linhas com updated_at >= última marca vista e confere
+-- remoções lendo só a chave; tabelas sem a coluna continuam sendo lidas
+-- inteiras. Aplica nas tabelas de banco.CHAVES_TABELAS.
+--
+-- Rodar no SQL Editor do Supabase (idempotente).
+
+create or replace function public.tocar_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at := now();
+    return new;
+end;
+$$;
+
+do $$
+declare
+    t text;
+begin
+    foreach t in array array[
+        'reservas', 'pre_reservas', 'clientes', 'brinquedos',
+        'emprestimos', 'pagamentos_emprestimos', 'metas', 'veiculos',
+        'custos', 'funcionarios', 'manutencoes', 'km_log'
+    ]
+    loop
+        execute format(
+            'alter table public.%I add column if not exists updated_at timestamptz not null default now()', t);
+        execute format(
+            'create index if not exists %I on public.%I (updated_at)', t || '_updated_at_idx', t);
+        execute format('drop trigger if exists tocar_updated_at on public.%I', t);
+        execute format(
+            'create trigger tocar_updated_at before update on public.%I '
+            'for each row execute function public.tocar_updated_at()', t);
+    end loop;
+end;
+$$;
+
+notify pgrst, 'reload schema';
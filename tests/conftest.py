@@ -0,0 +1,54 @@
+# Testes rodam contra o stand-in local do Supabase (ferramentas/servidor_local.py),
+# sem rede: cada teste ganha um servidor novo sobre SQLite em memória.
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "ferramentas"))
+
+os.environ.setdefault("BANCO_ESPELHO", "")   # sem espelho em disco
+os.environ.setdefault("GEO_CACHE", "")       # geocodificação só em memória
+
+import banco            # noqa: E402
+import servidor_local   # noqa: E402
+import supabase_rest    # noqa: E402
+
+
+def _fechar_circuito() -> None:
+    with supabase_rest._circuito_lock:
+        supabase_rest._circuito.update(
+            estado="fechado", falhas_consecutivas=0, aberto_ate=0.0,
+            aberturas=0, bloqueadas=0, retentativas=0, ultimo_erro=None,
+        )
+
+
+@pytest.fixture
+def servidor(monkeypatch):
+    """Servidor local vazio; supabase_rest/banco apontados para ele, sem estado herdado."""
+    url, srv = servidor_local.iniciar(max_linhas=300)
+    monkeypatch.setattr(supabase_rest, "SUPABASE_URL", url)
+    monkeypatch.setattr(supabase_rest, "RETRY_BASE", 0.0)   # retentativas sem dormir
+    supabase_rest.reset_session()
+    supabase_rest.definir_prazo(None)
+    _fechar_circuito()
+    banco.invalidar_cache()
+    banco._COLUNAS_AUSENTES.clear()
+    banco._COLUNAS_PRESENTES.clear()
+    banco._SEM_ON_CONFLICT.clear()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+    _fechar_circuito()
+
+
+@pytest.fixture
+def custos(servidor):
+    """Tabela custos com 5 linhas (id 1..5)."""
+    supabase_rest.table_insert("custos", [
+        {"descricao": f"gasto {i}", "categoria": "Frete", "valor": str(10 * i), "data": f"2025-03-0{i}"}
+        for i in range(1, 6)
+    ])
+    return servidor
@@ -0,0 +1,172 @@
+import pandas as pd
+import pytest
+
+import banco
+import supabase_rest
+
+COLS_CUSTOS = ["id", "descricao", "categoria", "valor", "data"]
+
+
+def _linhas(tabela, ordem="id"):
+    return sorted(supabase_rest.table_select(tabela), key=lambda r: r[ordem])
+
+
+def _carregar_custos():
+    df = banco.carregar_dados("custos", COLS_CUSTOS)
+    return df, df.copy()
+
+
+# ==============================
+# salvar_alteracoes / _salvar_diff
+# ==============================
+
+def test_salvar_sem_mudanca_nao_grava(custos):
+    df, original = _carregar_custos()
+    antes = custos.requisicoes
+    assert banco.salvar_alteracoes(df, "custos", original) == {"inseridos": 0, "atualizados": 0, "removidos": 0}
+    assert custos.requisicoes == antes
+
+
+def test_salvar_insert_update_delete(custos):
+    df, original = _carregar_custos()
+    df.loc[df["id"] == 2, "valor"] = 99.5
+    df = df[df["id"] != 4]
+    df = pd.concat([df, pd.DataFrame([{"descricao": "novo", "categoria": "Frete", "valor": 7.0,
+                                       "data": pd.Timestamp("2025-04-01")}])], ignore_index=True)
+
+    resumo = banco.salvar_alteracoes(df, "custos", original)
+
+    assert resumo == {"inseridos": 1, "atualizados": 1, "removidos": 1}
+    linhas = _linhas("custos")
+    assert [r["id"] for r in linhas] == [1, 2, 3, 5, 6]
+    assert float(linhas[1]["valor"]) == 99.5
+    assert linhas[1]["descricao"] == "gasto 2"          # o resto da linha não mudou
+    assert linhas[-1]["descricao"] == "novo" and linhas[-1]["data"] == "2025-04-01"
+
+
+def test_salvar_snapshot_com_chave_nula_levanta(custos):
+    df, original = _carregar_custos()
+    original["id"] = original["id"].astype("Int64")
+    original.loc[0, "id"] = pd.NA
+    with pytest.raises(RuntimeError, match="snapshot sem 'id'"):
+        banco.salvar_alteracoes(df, "custos", original)
+
+
+def test_salvar_delete_de_linha_ja_apagada_levanta(custos):
+    df, original = _carregar_custos()
+    supabase_rest.table_delete("custos", {"id": 3})     # outra sessão apagou antes
+    with pytest.raises(RuntimeError, match="esperadas 1"):
+        banco.salvar_alteracoes(df[df["id"] != 3], "custos", original)
+
+
+def test_salvar_sem_chave_so_insere(servidor):
+    supabase_rest.table_insert("checklist", [{"reserva_id": 1, "item": "Lona", "ok": "✅"}])
+    cols = ["reserva_id", "item", "ok"]
+    df = banco.carregar_dados("checklist", cols)
+    original = df.copy()
+    df.loc[len(df)] = {"reserva_id": 1, "item": "Motor", "ok": "❌"}
+
+    assert banco.salvar_alteracoes(df, "checklist", original)["inseridos"] == 1
+    assert len(supabase_rest.table_select("checklist")) == 2
+
+
+def test_salvar_sem_chave_com_edicao_levanta_antes_de_gravar(servidor):
+    supabase_rest.table_insert("checklist", [{"reserva_id": 1, "item": "Lona", "ok": "✅"}])
+    cols = ["reserva_id", "item", "ok"]
+    df = banco.carregar_dados("checklist", cols)
+    original = df.copy()
+    df.loc[0, "ok"] = "❌"
+    df.loc[len(df)] = {"reserva_id": 2, "item": "Motor", "ok": "✅"}
+
+    with pytest.raises(RuntimeError, match="sem chave"):
+        banco.salvar_alteracoes(df, "checklist", original)
+    assert len(supabase_rest.table_select("checklist")) == 1   # nem o insert saiu
+
+
+# ==============================
+# _gravar_em_lotes
+# ==============================
+
+def test_gravar_em_lotes_divide_em_lotes(servidor):
+    registros = [{"descricao": f"c{i}", "valor": str(i)} for i in range(7)]
+    antes = servidor.requisicoes
+    assert banco._gravar_em_lotes("custos", registros, modo="insert", lote=3) == 7
+    assert servidor.requisicoes - antes == 3
+    assert len(supabase_rest.table_select("custos")) == 7
+
+
+def test_gravar_em_lotes_isola_linha_recusada(custos):
+    registros = [
+        {"id": 10, "descricao": "boa 1"},
+        {"id": 1, "descricao": "id repetido"},   # 409 derruba o lote inteiro
+        {"id": 11, "descricao": "boa 2"},
+    ]
+    with pytest.raises(RuntimeError, match="1 linha"):
+        banco._gravar_em_lotes("custos", registros, modo="insert", lote=10)
+    ids = [r["id"] for r in _linhas("custos")]
+    assert 10 in ids and 11 in ids
+    assert next(r for r in _linhas("custos") if r["id"] == 1)["descricao"] == "gasto 1"
+
+
+def test_gravar_em_lotes_falha_transitoria_nao_vai_linha_a_linha(custos, monkeypatch):
+    monkeypatch.setattr(supabase_rest, "RETRY_MAX", 0)
+    custos.taxa_erro = 1.0
+    antes = custos.requisicoes
+    with pytest.raises(RuntimeError, match="503"):
+        banco._gravar_em_lotes("custos", [{"descricao": "a"}, {"descricao": "b"}], modo="insert")
+    assert custos.requisicoes - antes == 1
+
+
+def test_salvar_dados_upsert_pela_chave(servidor):
+    df = pd.DataFrame([{"anomes": "2025-03", "meta": 100.0}, {"anomes": "2025-04", "meta": 200.0}])
+    banco.salvar_dados(df, "metas")
+    df.loc[0, "meta"] = 150.0
+    banco.salvar_dados(df, "metas")
+    metas = {r["anomes"]: float(r["meta"]) for r in supabase_rest.table_select("metas")}
+    assert metas == {"2025-03": 150.0, "2025-04": 200.0}
+
+
+# ==============================
+# CACHE
+# ==============================
+
+def test_cache_serve_segunda_leitura_sem_ir_ao_servidor(custos):
+    banco.carregar_dados("custos", COLS_CUSTOS)
+    antes = custos.requisicoes
+    df = banco.carregar_dados("custos", COLS_CUSTOS)
+    assert custos.requisicoes == antes
+    df.loc[0, "descricao"] = "alterado na página"     # cada leitura ganha uma cópia
+    assert banco.carregar_dados("custos", COLS_CUSTOS).loc[0, "descricao"] == "gasto 1"
+
+
+def test_escrita_invalida_cache_da_tabela(custos):
+    df, original = _carregar_custos()
+    banco.carregar_dados("metas", ["anomes", "meta"])
+    df.loc[0, "valor"] = 1.5
+    banco.salvar_alteracoes(df, "custos", original)
+
+    chaves = [k[0] for k in banco._cache]
+    assert "custos" not in chaves and "metas" in chaves
+    assert banco.carregar_dados("custos", COLS_CUSTOS).loc[0, "valor"] == 1.5
+
+
+def test_escrita_invalida_agregado_dependente(custos):
+    banco._cache_put(("rpc/indicadores_mensais", None, "[]"), pd.DataFrame({"anomes": ["2025-03"]}))
+    banco._cache_put(("rpc/desempenho_brinquedos", None, "[]"), pd.DataFrame({"brinquedo": ["x"]}))
+    banco.invalidar_cache("custos")
+    chaves = [k[0] for k in banco._cache]
+    assert "rpc/indicadores_mensais" not in chaves
+    assert "rpc/desempenho_brinquedos" in chaves      # não lê custos
+
+
+def test_memo_absorve_leitura_repetida_no_rerun(custos, monkeypatch):
+    monkeypatch.setattr(banco, "CACHE_TTL", 0)
+    banco.iniciar_execucao()
+    try:
+        banco.carregar_dados("custos", COLS_CUSTOS)
+        antes = custos.requisicoes
+        banco.carregar_dados("custos", COLS_CUSTOS)
+        assert custos.requisicoes == antes
+        assert banco.leituras_duplicadas() == 1
+    finally:
+        banco._execucao.memo = None
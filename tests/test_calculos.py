@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import calculos
+import servidor_local
+
+
+def _serie(*valores):
+    return pd.Series(list(valores), dtype=object)
+
+
+# ==============================
+# para_*
+# ==============================
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("2025-03-01", "2025-03-01"),
+    ("2025-03-01T18:30:00+00:00", "2025-03-01"),
+    ("01/03/2025", "2025-03-01"),
+    ("1/3/2025 14:00", "2025-03-01"),
+    ("01-03-2025", "2025-03-01"),
+    ("05/06/25", "2025-06-05"),
+    ("05/06/69", "2069-06-05"),     # século como o Postgres (to_date 'YY')
+    ("05/06/70", "1970-06-05"),
+    ("31/02/2025", None),
+    ("2025/03/01", None),
+    ("amanhã", None),
+    ("", None),
+    (None, None),
+])
+def test_para_data(texto, esperado):
+    r = calculos.para_data(_serie(texto))[0]
+    assert (pd.isna(r) if esperado is None else r == pd.Timestamp(esperado))
+
+
+def test_para_data_datetime_com_fuso():
+    s = pd.Series(pd.to_datetime(["2025-03-01T23:00:00Z"]))
+    assert calculos.para_data(s)[0] == pd.Timestamp("2025-03-01")
+
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("1200.50", 1200.5),
+    ("R$ 1.200,50", 1200.5),
+    ("1,5", 1.5),
+    ("-3", -3.0),
+    (".5", 0.5),
+    ("1e3", 1000.0),
+    ("1.2.3", None),
+    ("abc", None),
+    ("", None),
+    (None, None),
+    (7, 7.0),
+])
+def test_para_numero_e_dinheiro(texto, esperado):
+    numero = calculos.para_numero(_serie(texto))[0]
+    dinheiro = calculos.para_dinheiro(_serie(texto))[0]
+    if esperado is None:
+        assert np.isnan(numero) and dinheiro == 0.0
+    else:
+        assert numero == esperado and dinheiro == esperado
+
+
+def test_para_inteiro():
+    r = calculos.para_inteiro(_serie("3", "2,6", "x", None))
+    assert str(r.dtype) == "Int64"
+    assert r.tolist()[:2] == [3, 3] and r.isna().tolist()[2:] == [True, True]
+
+
+def test_para_bool():
+    assert calculos.para_bool(_serie("Sim", "PAGO", "não", None, 1)).tolist() == [True, True, False, False, True]
+
+
+def test_regras_iguais_as_do_servidor_local():
+    # servidor_local emula data_segura/num_seguro de sql/indicadores.sql
+    textos = ["2025-03-01", "1/3/2025", "01-03-2025", "05/06/69", "31/02/2025", "x",
+              "R$ 1.200,50", "1,5", ".5", "1e3", "1.2.3", ""]
+    datas = calculos.para_data(_serie(*textos))
+    numeros = calculos.para_dinheiro(_serie(*textos))
+    for t, d, n in zip(textos, datas, numeros):
+        assert servidor_local._data_segura(t) == (None if pd.isna(d) else d.strftime("%Y-%m-%d"))
+        assert servidor_local._num_seguro(t) == n
+
+
+# ==============================
+# disponibilidade / itens
+# ==============================
+
+def test_normalizar_nomes_igual_ao_escalar():
+    nomes = _serie("Pula-Pulá!", "  Cama Elástica ", None, 3, "")
+    assert calculos.normalizar_nomes(nomes).tolist() == [calculos.normalizar_nome(n) for n in nomes]
+
+
+def test_disponibilidade_por_data():
+    brinquedos = pd.DataFrame({"nome": ["Pula-pula", "Piscina de bolinhas", "Tobogã"],
+                               "categoria": ["Tradicional", "Montessori", "Tradicional"]})
+    reservas = pd.DataFrame({
+        "data": pd.to_datetime(["2025-03-01", "2025-03-01", "2025-03-02"]),
+        "brinquedos": ["Pula-Pula, Tobogã", "Tobogã", "Piscina de bolinhas"],
+        "cliente": ["Ana", "Bia", "Caio"], "inicio_festa": ["14:00", "16:00", "10:00"],
+        "fim_festa": ["18:00", "20:00", "12:00"],
+    })
+    df = calculos.disponibilidade_por_data(brinquedos, reservas, "2025-03-01")
+    assert df["disponivel"].tolist() == [False, True, False]
+    assert "Ana" in df.loc[2, "status"]       # a primeira reserva que contém o nome
+
+
+def test_itens_por_brinquedo_rateia_e_nao_altera_brinquedos():
+    reservas = pd.DataFrame({
+        "brinquedos": ["Pula-pula, Tobogã", "", "Tobogã"],
+        "data": pd.to_datetime(["2025-03-01", "2025-03-02", "2025-03-03"]),
+        "valor_total": [100.0, 50.0, 30.0], "valor_extra": [20.0, 0.0, 0.0],
+        "frete": [0.0, 0.0, 0.0], "desconto": [0.0, 0.0, 50.0],
+    }, index=[7, 3, 9])
+    brinquedos = pd.DataFrame({"nome": ["Pula-pula"], "categoria": pd.Categorical([None], categories=["Montessori"])})
+    itens = calculos.itens_por_brinquedo(reservas, brinquedos)
+
+    assert itens["Brinquedo"].tolist() == ["Pula-pula", "Tobogã", "Tobogã"]
+    assert itens["Valor_Item"].tolist() == [60.0, 60.0, 0.0]
+    assert itens["categoria"].tolist()[0] == "Tradicional"
+    assert isinstance(brinquedos["categoria"].dtype, pd.CategoricalDtype)
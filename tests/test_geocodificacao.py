@@ -0,0 +1,161 @@
+import threading
+import time
+
+import pytest
+import requests
+
+import geocodificacao as geo
+
+
+@pytest.fixture
+def rede(monkeypatch, tmp_path):
+    """Cache novo em arquivo temporário e ViaCEP/Nominatim falsos, que contam as chamadas."""
+    monkeypatch.setattr(geo, "GEO_ARQUIVO", str(tmp_path / "geo.sqlite"))
+    monkeypatch.setattr(geo, "_con", None)
+    monkeypatch.setattr(geo, "_memoria", geo.OrderedDict())
+    monkeypatch.setattr(geo, "_cidades", {})
+    monkeypatch.setattr(geo, "_origens", {})
+    chamadas = {"viacep": [], "nominatim": [], "falhar": False, "atraso": 0.0}
+
+    def viacep(cep):
+        chamadas["viacep"].append(cep)
+        time.sleep(chamadas["atraso"])
+        if chamadas["falhar"]:
+            raise requests.ConnectionError("fora do ar")
+        if cep.startswith("99"):
+            return None
+        cidade = {"01": "São Paulo", "09": "Santo André", "88": "Cidade Fantasma"}.get(cep[:2], "Outra")
+        return {"logradouro": "Rua", "bairro": "Centro", "cidade": cidade, "uf": "SP"}
+
+    def nominatim(cidade, uf):
+        chamadas["nominatim"].append(cidade)
+        time.sleep(chamadas["atraso"])
+        return None if cidade == "Cidade Fantasma" else (-23.5 - len(cidade) / 100, -46.6)
+
+    monkeypatch.setattr(geo, "_viacep", viacep)
+    monkeypatch.setattr(geo, "_nominatim", nominatim)
+    yield chamadas
+    if geo._con is not None:
+        geo._con.close()
+
+
+def test_normalizar_cep():
+    assert geo.normalizar_cep("09060-390") == "09060390"
+    assert geo.normalizar_cep(9060390) == "09060390"
+    assert geo.normalizar_cep("123") is None and geo.normalizar_cep(None) is None
+
+
+# ==============================
+# CACHE
+# ==============================
+
+def test_cache_em_memoria_e_em_disco(rede):
+    assert geo.coordenadas("01001-000") == (-23.59, -46.6)
+    assert geo.coordenadas("01001000") == (-23.59, -46.6)
+    assert len(rede["viacep"]) == 1
+
+    geo._memoria.clear()
+    geo._cidades.clear()
+    assert geo.coordenadas("01001000") == (-23.59, -46.6)    # do arquivo
+    assert len(rede["viacep"]) == 1
+
+
+def test_cache_negativo(rede):
+    assert geo.consultar("99999-999") is None
+    assert geo.consultar("99999-999") is None
+    assert geo.coordenadas("88000-000") is None
+    assert geo.coordenadas("88000-000") is None
+    assert len(rede["viacep"]) == 2 and rede["nominatim"] == ["Cidade Fantasma"]
+
+
+def test_cache_por_cidade(rede):
+    geo.coordenadas("01001000")
+    geo.coordenadas("01310100")          # outro CEP da mesma cidade
+    assert len(rede["viacep"]) == 2 and rede["nominatim"] == ["São Paulo"]
+
+
+def test_entrada_vencida_serve_quando_a_rede_falha(rede, monkeypatch):
+    geo.coordenadas("01001000")
+    monkeypatch.setattr(geo, "GEO_VALIDADE", -1)
+    rede["falhar"] = True
+    assert geo.coordenadas("01001000") == (-23.59, -46.6)
+    assert geo.coordenadas("09060390") is None            # sem nada guardado
+    with pytest.raises(requests.ConnectionError):
+        geo.consultar("09060390")
+
+
+def test_falha_de_rede_nao_fica_guardada(rede):
+    rede["falhar"] = True
+    with pytest.raises(requests.ConnectionError):
+        geo.consultar("01001000")
+    rede["falhar"] = False
+    assert geo.coordenadas("01001000") is not None
+
+
+# ==============================
+# LIMITADOR / VOO ÚNICO
+# ==============================
+
+def test_balde_limita_a_taxa():
+    balde = geo._Balde(taxa=20, capacidade=1)
+    inicio = time.monotonic()
+    esperas = [balde.retirar() for _ in range(5)]
+    assert esperas[0] == 0.0
+    assert time.monotonic() - inicio >= 4 / 20 * 0.9
+    assert geo._Balde(taxa=0).retirar() == 0.0
+
+
+def test_consultas_simultaneas_do_mesmo_cep_compartilham_a_rede(rede):
+    rede["atraso"] = 0.1
+    resultados = []
+    threads = [threading.Thread(target=lambda: resultados.append(geo.coordenadas("01001000"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(resultados)) == 1 and resultados[0] is not None
+    assert len(rede["viacep"]) == 1 and len(rede["nominatim"]) == 1
+
+
+def test_voo_unico_propaga_a_excecao_para_todos():
+    barreira = threading.Event()
+    erros = []
+
+    def falha():
+        barreira.wait(1)
+        raise ValueError("boom")
+
+    def chamar():
+        try:
+            geo._voo_unico(("teste",), falha)
+        except ValueError as e:
+            erros.append(str(e))
+
+    threads = [threading.Thread(target=chamar) for _ in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    barreira.set()
+    for t in threads:
+        t.join()
+    assert erros == ["boom"] * 4
+    assert ("teste",) not in geo._voos
+
+
+# ==============================
+# DISTÂNCIA / FILA
+# ==============================
+
+def test_distancia_com_pontos_no_cache(rede):
+    d = geo.distancia("01001000", "09060390", prazo=2, usar_indice=False)
+    assert d.km is not None and d.km > 0 and not d.estimado
+    assert geo.distancia("01001000", "99999999", prazo=2, usar_indice=False) is None
+    assert geo.distancia("123", "01001000") is None
+
+
+def test_refinar_devolve_o_mesmo_future(rede):
+    rede["atraso"] = 0.1
+    a = geo.refinar("01001000", geo.FUNDO)
+    b = geo.refinar("01001-000")
+    assert a is b
+    assert a.result(timeout=5) == (-23.59, -46.6)
@@ -0,0 +1,154 @@
+import time
+from datetime import date
+
+import pytest
+import requests
+
+import supabase_rest
+from supabase_rest import CircuitoAberto, _where_params
+
+
+# ==============================
+# FILTROS
+# ==============================
+
+@pytest.mark.parametrize("where, esperado", [
+    ({"status": "Pendente"}, [("status", "eq.Pendente")]),
+    ({"valor": ("gte", 10)}, [("valor", "gte.10")]),
+    ({"data": [("gte", date(2025, 3, 1)), ("lt", date(2025, 4, 1))]},
+     [("data", "gte.2025-03-01"), ("data", "lt.2025-04-01")]),
+    ({"id": ("in", [1, 2, 3])}, [("id", "in.(1,2,3)")]),
+    ({"nome": ("in", ["Ana, filha", 'Bia "B"'])}, [("nome", 'in.("Ana, filha","Bia \\"B\\"")')]),
+    ({"cliente": ("ilike", "*festa*")}, [("cliente", "ilike.*festa*")]),
+    ({"data": ("is", None)}, [("data", "is.null")]),
+    ({"pago": ("is", True)}, [("pago", "is.true")]),
+    ({"or": [("status", "eq", "Pendente"), ("data", "is", None)]},
+     [("or", "(status.eq.Pendente,data.is.null)")]),
+])
+def test_where_params(where, esperado):
+    assert _where_params(where) == esperado
+
+
+def test_where_params_operador_desconhecido():
+    with pytest.raises(ValueError, match="Operador"):
+        _where_params({"or": [("status", "contem", "x")]})
+
+
+def test_filtros_no_servidor_local(servidor):
+    supabase_rest.table_insert("custos", [
+        {"descricao": "a", "categoria": "Frete", "valor": 5},
+        {"descricao": "b", "categoria": "Frete", "valor": 50},
+        {"descricao": "c", "categoria": None, "valor": 500},
+    ])
+    sel = lambda where: sorted(r["descricao"] for r in supabase_rest.table_select("custos", where=where))
+    assert sel({"valor": [("gt", 5), ("lte", 500)]}) == ["b", "c"]
+    assert sel({"descricao": ("in", ["a", "c"])}) == ["a", "c"]
+    assert sel({"or": [("valor", "lt", 10), ("categoria", "is", None)]}) == ["a", "c"]
+
+
+# ==============================
+# PAGINAÇÃO POR CHAVE
+# ==============================
+
+def test_keyset_passa_do_max_linhas(servidor):
+    # servidor com max-rows 300: page_size maior é cortado e a leitura segue
+    supabase_rest.table_insert("custos", [{"descricao": f"c{i}"} for i in range(700)])
+    paginas = list(supabase_rest.table_select_iter("custos", select="descricao", page_size=1000, keyset="id"))
+    ids = [r["id"] for p in paginas for r in p]
+    assert ids == list(range(1, 701))
+    assert [len(p) for p in paginas] == [300, 300, 100]
+
+
+def test_keyset_estavel_com_delete_no_meio(servidor):
+    supabase_rest.table_insert("custos", [{"descricao": f"c{i}"} for i in range(10)])
+    it = supabase_rest.table_select_iter("custos", select="descricao", page_size=4, keyset="id")
+    primeira = next(it)
+    # linha já lida apagada no meio da leitura: com offset a página seguinte
+    # começaria uma linha adiante e pularia o id 5
+    supabase_rest.table_delete("custos", {"id": 1})
+    resto = [r["id"] for p in it for r in p]
+    assert [r["id"] for r in primeira] + resto == list(range(1, 11))
+
+
+def test_keyset_sem_a_coluna_levanta(servidor):
+    supabase_rest.table_insert("checklist", [{"item": "Lona"}, {"item": "Motor"}])
+    with pytest.raises(RuntimeError):
+        list(supabase_rest.table_select_iter("checklist", select="item", page_size=1, keyset="reserva_id"))
+
+
+# ==============================
+# RETENTATIVAS / CIRCUITO
+# ==============================
+
+def test_get_repete_503_e_conta_retentativas(servidor, monkeypatch):
+    supabase_rest.table_insert("custos", [{"descricao": "a"}])
+    respostas = iter([503, 503])
+    original = supabase_rest._tentativa
+
+    def tentativa(method, url, **kwargs):
+        status = next(respostas, None)
+        if status is None:
+            return original(method, url, **kwargs)
+        r = requests.Response()
+        r.status_code = status
+        return r
+
+    monkeypatch.setattr(supabase_rest, "_tentativa", tentativa)
+    assert [r["descricao"] for r in supabase_rest.table_select("custos")] == ["a"]
+    assert supabase_rest.estado_circuito()["retentativas"] == 2
+    assert supabase_rest.estado_circuito()["estado"] == "fechado"
+
+
+def test_post_simples_nao_repete(servidor, monkeypatch):
+    monkeypatch.setattr(supabase_rest, "RETRY_MAX", 3)
+    servidor.taxa_erro = 1.0
+    antes = servidor.requisicoes
+    with pytest.raises(RuntimeError, match="503"):
+        supabase_rest.table_insert("custos", [{"descricao": "a"}])
+    assert servidor.requisicoes - antes == 1       # insert não é idempotente
+
+
+def test_upsert_repete(servidor, monkeypatch):
+    monkeypatch.setattr(supabase_rest, "RETRY_MAX", 2)
+    servidor.taxa_erro = 1.0
+    antes = servidor.requisicoes
+    with pytest.raises(RuntimeError, match="503"):
+        supabase_rest.table_upsert("metas", [{"anomes": "2025-03", "meta": 1}], on_conflict="anomes")
+    assert servidor.requisicoes - antes == 3
+
+
+def test_circuito_abre_e_fecha(servidor, monkeypatch):
+    monkeypatch.setattr(supabase_rest, "RETRY_MAX", 0)
+    monkeypatch.setattr(supabase_rest, "CIRCUITO_FALHAS", 3)
+    monkeypatch.setattr(supabase_rest, "CIRCUITO_PAUSA", 0.2)
+    servidor.taxa_erro = 1.0
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            supabase_rest.table_select("custos")
+    assert supabase_rest.estado_circuito()["estado"] == "aberto"
+
+    antes = servidor.requisicoes
+    with pytest.raises(CircuitoAberto):
+        supabase_rest.table_select("custos")
+    assert servidor.requisicoes == antes          # nem chegou ao servidor
+    assert supabase_rest.erro_transitorio(CircuitoAberto("x"))
+
+    # pausa cumprida: a requisição de teste passa e fecha o circuito
+    servidor.taxa_erro = 0.0
+    time.sleep(0.25)
+    supabase_rest.table_select("custos")
+    assert supabase_rest.estado_circuito()["estado"] == "fechado"
+
+
+def test_circuito_reabre_se_teste_falha(servidor, monkeypatch):
+    monkeypatch.setattr(supabase_rest, "RETRY_MAX", 0)
+    monkeypatch.setattr(supabase_rest, "CIRCUITO_FALHAS", 1)
+    monkeypatch.setattr(supabase_rest, "CIRCUITO_PAUSA", 0.05)
+    servidor.taxa_erro = 1.0
+    with pytest.raises(RuntimeError):
+        supabase_rest.table_select("custos")
+    time.sleep(0.1)
+    with pytest.raises(RuntimeError, match="503"):
+        supabase_rest.table_select("custos")      # requisição de teste, falha
+    assert supabase_rest.estado_circuito()["estado"] == "aberto"
+    assert supabase_rest.estado_circuito()["aberturas"] == 2